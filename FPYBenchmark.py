@@ -0,0 +1,673 @@
+# -*- coding: utf-8 -*-
+# FPY计算引擎的性能基准：用固定随机种子生成模拟LC数据，不需要工厂数据库
+# 数据由进程内的模拟pymysql连接按查询逐批生成，计算走FPYEngine的正常流程（连接池、流式读取、两阶段读取等）
+# 每个用例在单独的子进程中运行，峰值内存互不影响；结果追加到fpy_benchmark_results.jsonl，与上次结果对比
+# 用法：python -m FPYBenchmark                      默认1万、100万、1000万行
+#       python -m FPYBenchmark --sizes 10000 100000 --cases python-stream process-stream
+from collections import Counter
+from datetime import date, datetime, timedelta
+import configparser
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import FPYEngine
+
+BENCH_PROJECT = "BENCH"
+BENCH_TWO_PHASE_PROJECT = "BENCH_TWO_PHASE"
+BENCH_LEGACY_PROJECT = "BENCH_LEGACY"
+BENCH_TABLE = "lc_bench"
+BENCH_START_DATE = "2026-01-05"
+BENCH_DAYS = 28
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+DEFAULT_SEED = 20260105
+DEFAULT_RESULTS_FILE = "fpy_benchmark_results.jsonl"
+# 旧接口按行一次性读取全部数据并扫描两遍，超过该行数不再运行
+LEGACY_MAX_ROWS = 1_000_000
+
+BENCH_STATIONS_CONFIG = f"""[{BENCH_PROJECT}]
+env_file = bench.env
+table_name = {BENCH_TABLE}
+fetch_mode = stream
+Function = 101,102
+Hipot = 201
+Burn = BURN
+Vis = 301
+
+[{BENCH_TWO_PHASE_PROJECT}]
+env_file = bench.env
+table_name = {BENCH_TABLE}
+fetch_mode = stream
+two_phase_fetch = true
+Function = 101,102
+Hipot = 201
+Burn = BURN
+Vis = 301
+
+[{BENCH_LEGACY_PROJECT}]
+env_file = bench.env
+table_name = {BENCH_TABLE}
+Function = 101,102
+Hipot = 201
+Burn = BURN
+Vis = 301
+"""
+
+BENCH_ENV = """DB_HOST=bench.invalid
+DB_PORT=3306
+DB_USER=bench
+DB_PASSWORD=bench
+DB_NAME=bench
+"""
+
+# ---------------------- 模拟LC数据 ----------------------
+# 每个产品依次经过的工站：(traceid, test, 首次测试不良率)
+BENCH_ROUTE = (
+    (101, 'PRE', 0.06),
+    (102, 'EOL', 0.04),
+    (201, 'HIPOT', 0.02),
+    (401, 'BURN', 0.05),
+    (301, 'VIS', 0.03),
+)
+BENCH_ARTNOS = ('A1001-01', 'A1001-02', 'A2040-01', 'B3300-05')
+# 失败步骤编号，按出现频率从高到低
+BENCH_STEPS = ('12.3.4.5', '99.88.77', '7.1.2.10', '3.3.1.1', '45.2.9.8', '1.0.0.1', '8.8.4.1', '20.1.5.3')
+RETEST_FAIL_RATE = 0.3    # 复测仍不良的比例
+
+def make_measurement_pool(rng, size=512):
+    """预先生成一批测量值文本，逐行生成浮点数格式化太慢，会掩盖引擎本身的耗时"""
+    return ["; ".join(f"M{i}={rng.uniform(0, 500):.3f}" for i in range(12)) for _ in range(size)]
+
+def make_os0(rng, passed, measurement_pool):
+    """生成测试日志：通过时只有测量值，失败时带'Test Step: '或'Fail Step: '失败步骤"""
+    measurements = rng.choice(measurement_pool)
+    if passed:
+        return f"Result: PASS; Operator: OP{rng.randint(1, 40):02d}; {measurements}"
+    step = BENCH_STEPS[min(int(rng.expovariate(0.6)), len(BENCH_STEPS) - 1)]
+    marker = 'Test Step: ' if rng.random() < 0.8 else 'Fail Step: '
+    return f"Result: FAIL; Operator: OP{rng.randint(1, 40):02d}; {marker}{step} limit exceeded; {measurements}"
+
+def generate_lc_rows(count, seed=DEFAULT_SEED, start_date=BENCH_START_DATE, days=BENCH_DAYS):
+    """按固定种子生成count行模拟LC数据，相同参数生成的数据完全相同
+    每个产品按BENCH_ROUTE依次测试，不良时复测，时间戳均匀分布在days天内"""
+    rng = random.Random(seed)
+    measurement_pool = make_measurement_pool(rng)
+    first_day = datetime.fromisoformat(start_date)
+    seconds_per_row = days * 86400 / max(count, 1)
+    produced = 0
+    unit = 0
+    while produced < count:
+        unit += 1
+        artno = BENCH_ARTNOS[unit % len(BENCH_ARTNOS)]
+        sno = f"SN{unit:09d}"
+        for traceid, test, fail_rate in BENCH_ROUTE:
+            fail_rate_now = fail_rate
+            while produced < count:
+                passed = rng.random() >= fail_rate_now
+                yield {
+                    'artno': artno,
+                    'sno': sno,
+                    'traceid': traceid,
+                    'test': test,
+                    'io': -1 if passed else rng.choice((1, 2, 3, 17)),
+                    'os0': make_os0(rng, passed, measurement_pool),
+                    'timestamp': first_day + timedelta(seconds=int(produced * seconds_per_row)),
+                }
+                produced += 1
+                if passed:
+                    break
+                fail_rate_now = RETEST_FAIL_RATE
+            if produced >= count:
+                return
+
+# ---------------------- 进程内模拟pymysql连接 ----------------------
+class BenchCursor:
+    """按FPYEngine发出的SQL从生成器返回数据；生成数据的耗时计入fetch_seconds
+    as_dict=True时（字典游标）每行返回{字段名: 值}"""
+
+    def __init__(self, connection, as_dict=False):
+        self.connection = connection
+        self.as_dict = as_dict
+        self._rows = iter(())
+
+    def execute(self, sql, params=None):
+        sql = sql.strip()
+        if sql.startswith("SHOW TABLES"):
+            self._rows = iter([{'Tables_in_bench': BENCH_TABLE}])
+        elif sql.startswith("SHOW INDEX"):
+            self._rows = iter([{'Column_name': 'timestamp', 'Seq_in_index': 1}])
+        elif sql.startswith("EXPLAIN"):
+            self._rows = iter([{'type': 'range'}])
+        else:
+            self._rows = self.connection.select(sql, params, self.as_dict)
+        return 0
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size):
+        start = time.perf_counter()
+        rows = []
+        for row in self._rows:
+            rows.append(row)
+            if len(rows) >= size:
+                break
+        self.connection.stats['fetch_seconds'] += time.perf_counter() - start
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(sys.maxsize)
+
+    def close(self):
+        self._rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BenchConnection:
+    """模拟的pymysql连接：SELECT按字段和日期范围从generate_lc_rows取数据，按SELECT字段顺序返回元组行"""
+
+    def __init__(self, row_count, seed, stats):
+        self.row_count = row_count
+        self.seed = seed
+        self.stats = stats
+        self.open = True
+
+    def cursor(self, cursor_class=None):
+        return BenchCursor(self, cursor_class is not None and 'Dict' in cursor_class.__name__)
+
+    def select(self, sql, params, as_dict=False):
+        start_date, end_date = params[0], params[1]
+        # 旧版实现按LEFT(timestamp, 10) BETWEEN查询，结束日期包含在内
+        end_inclusive = "BETWEEN" in sql
+        # engine=process的各子进程只查询自己分片的序列号
+        sample = tuple(params[2:4]) if "MOD(CRC32(sno)" in sql else None
+        # 只取纯字段名，第二阶段的失败步骤表达式在下面用解析器代替
+        select_list = sql.split("SELECT", 1)[1].split("FROM", 1)[0].split(",")
+        columns = [column.strip() for column in select_list if column.strip().isidentifier()]
+        step_query = " AS step" in sql
+        parse_step = FPYEngine.DEFAULT_STEP_PARSER
+        for row in generate_lc_rows(self.row_count, self.seed):
+            day = row['timestamp'].strftime('%Y-%m-%d')
+            if not (start_date <= day <= end_date if end_inclusive else start_date <= day < end_date):
+                continue
+            if sample and zlib.crc32(row['sno'].encode('utf-8')) % sample[0] != sample[1]:
+                continue
+            if step_query:
+                # 两阶段读取的第二阶段：只返回含失败步骤的行，步骤在“服务端”截取
+                step = parse_step(row['os0'])
+                if step is None:
+                    continue
+                yield tuple(row[column] for column in columns) + (step,)
+            elif as_dict:
+                yield {column: row[column] for column in columns}
+            else:
+                yield tuple(row[column] for column in columns)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def thread_id(self):
+        return 0
+
+    def close(self):
+        self.open = False
+
+# ---------------------- 旧版实现（基线24faa60） ----------------------
+# legacy用例的对比基准：逐字复制自改造前的FPYFromLC_V2.py，只把函数名加上legacy_前缀、弹窗换成标准错误输出、
+# pymysql和dotenv改在函数内导入
+# 字典游标一次性读取全部行，每行一个字典，FPY和失败信息各查询、遍历一遍
+class LegacyMessagebox:
+    """代替tkinter.messagebox，基准在无界面的子进程中运行"""
+
+    @staticmethod
+    def showwarning(title, message):
+        print(f"{title}：{message}", file=sys.stderr)
+
+messagebox = LegacyMessagebox()
+
+# 定义加载各产品数据库.env文件的函数用于配置不同产品的不同数据库信息
+def legacy_get_env_config(env_filename):
+    """读取指定.env文件,返回配置字典"""
+    from dotenv import dotenv_values
+    # dotenv_values直接读取文件为字典
+    env_dict = dotenv_values(env_filename)
+    # 转换并构建数据库配置
+    db_config = {
+        'host': env_dict.get('DB_HOST'),
+        'port': int(env_dict.get('DB_PORT', 3306)),
+        'user': env_dict.get('DB_USER'),
+        'password': env_dict.get('DB_PASSWORD'),
+        'database': env_dict.get('DB_NAME'),
+        'charset': 'utf8mb4'
+    }
+    return db_config
+
+def legacy_load_stations_config(config_file="stations_config.ini"):
+    """从.ini文件读取工站配置"""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(config_file, encoding='utf-8')
+    return config
+
+def legacy_parse_station_value(value):
+    """解析工站配置值，支持单个值和逗号分隔的多个值"""
+    if ',' in value:
+        return [int(v.strip()) for v in value.split(',')]   #多值处理：分割→去空格→转整数，返回整数列表
+    else:
+        try:
+            return int(value)   #单值处理：转整数，返回整数
+        except ValueError:
+            return value.strip()
+
+def legacy_query_lc_data(env_file,start_date, end_date):      #封装从数据库获取的数据
+    import pymysql
+    table_name="" 
+    # 获取数据库配置
+    db_config = legacy_get_env_config(env_file)
+    
+    # 从stations_config.ini中获取table_name
+    stations_config = legacy_load_stations_config()
+    table_name = None
+    for project_name in stations_config.sections():
+        project_config = stations_config[project_name]
+        if project_config.get('env_file') == env_file:
+            table_name = project_config.get('table_name')
+            break
+    
+    if not table_name:
+        messagebox.showwarning("警告", f"未找到{env_file}对应的table_name配置")
+        return
+
+    # 连接数据库并执行查询
+    connection = None
+    try:
+        # 建立数据库连接
+        connection = pymysql.connect(**db_config)
+        # 使用字典游标，结果以{字段名: 值}返回，更易读取
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+
+        # 先测试表是否存在
+        cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
+        table_exists = cursor.fetchone()
+        
+        if not table_exists:
+            messagebox.showwarning("警告", f"表 {table_name} 不存在")
+            return []
+        
+        # SQL数据读取：截取timestamp前10位（yyyy-mm-dd）做日期筛选，取出变种号artno，序列号sno，设备编号traceid，测试类型test，测试结果io
+        # 反引号包裹timestamp（MySQL关键字）和表名，避免语法错误
+        sql = """
+            SELECT artno,sno,traceid,test,io,os0        
+            FROM `{table}` 
+            WHERE LEFT(`timestamp`, 10) BETWEEN %s AND %s 
+        """.format(table=table_name)
+
+        # 执行参数化查询（避免SQL注入，安全规范）
+        cursor.execute(sql, (start_date, end_date))
+        
+        # 获取查询结果
+        results = cursor.fetchall()
+        return results
+
+    except pymysql.MySQLError as e:
+        # 捕获数据库错误并提示
+        if e.args[0] == 1049:
+            messagebox.showwarning("警告", f"找不到指定的数据库！请检查.env文件中的DB_NAME配置是否正确: {e}")
+        elif e.args[0] == 1146:
+            messagebox.showwarning("警告", f"找不到表{table_name}！请确认表名是否正确。详情：{e}")
+        else:
+            messagebox.showwarning("警告", f"数据库查询失败：{e}")
+        return []
+    finally:
+        # 确保连接关闭
+        if connection:
+            connection.close()
+
+#定义从LC取数据自动计算FPY的函数
+def legacy_calculate_each_project_FPY(project,startdate, enddate):
+    stations_config = legacy_load_stations_config()    # 从.ini文件加载工站配置
+    
+    # 检查项目是否在配置文件中
+    if project not in stations_config:
+        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的工站配置")
+        return
+    
+    # 从配置文件中获取env_file
+    env_file = stations_config[project].get('env_file')
+    if not env_file:
+        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的env_file配置")
+        return
+
+    data_list= legacy_query_lc_data(env_file, startdate, enddate)   #一次性从LC数据库获取符合条件的数据，避免多次从数据库取数据导致响应时间长
+
+    if not data_list:
+        messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
+        return
+    else:
+        result_dict = {}       
+        project_stations = stations_config[project]        # 获取该项目的所有工站配置        
+        # 构建工站列表
+        stations = []
+        for station_name in project_stations:
+            if station_name == 'env_file' or station_name == 'table_name':
+                continue
+            station_value = project_stations[station_name]
+            parsed_value = legacy_parse_station_value(station_value)
+            stations.append((station_name, parsed_value))
+
+        # 定义工站数据提取函数
+        def extract_station_data(station_value):
+            if isinstance(station_value, list):
+                return [data for data in data_list if data.get('traceid') in [int(v) for v in station_value]]
+            elif isinstance(station_value, int):
+                return [data for data in data_list if data.get('traceid') == station_value]
+            else:
+                return [data for data in data_list if data.get('test') == station_value]
+
+        # 定义判断测试是否通过的函数
+        def is_io_pass(io_value):
+            if io_value == "-1" or io_value == -1:
+                return True
+            elif isinstance(io_value, str) and io_value.strip() == "-1":
+                return True
+            return False
+
+        for station_name, station_name_LC in stations:        # 遍历每个工位计算通过率
+            if not station_name_LC:
+                result_dict[station_name] = 0.0
+                continue
+            
+            if station_name == 'Function':
+                if isinstance(station_name_LC, list):
+                    function_data = [data for data in data_list if data.get('traceid') in [int(v) for v in station_name_LC]]
+                elif isinstance(station_name_LC, int):
+                    function_data = [data for data in data_list if data.get('traceid') == station_name_LC]
+                else:
+                    function_data = [data for data in data_list if data.get('test') == station_name_LC]
+                
+                if not function_data:
+                    result_dict['PRE'] = 0.0
+                    result_dict['EOL'] = 0.0
+                    continue
+                
+                pre_data = [data for data in function_data if data.get('test') == 'PRE']
+                eol_data = [data for data in function_data if data.get('test') == 'EOL']
+                
+                for test_type, test_data in [('PRE', pre_data), ('EOL', eol_data)]:
+                    if not test_data:
+                        result_dict[test_type] = 0.0
+                        continue
+                    
+                    sno_count = Counter([data['sno'] for data in test_data])
+                    
+                    sno_list_firstpass = [data['sno'] for data in test_data if is_io_pass(data.get('io')) and sno_count[data['sno']] == 1]
+                    sno_unique_pass_count = len(set(sno_list_firstpass))
+                    
+                    sno_list_total = [data['sno'] for data in test_data]
+                    sno_unique_total_count = len(set(sno_list_total))
+                    
+                    if sno_unique_total_count == 0:
+                        result_dict[test_type] = 0.0
+                    else:
+                        result_dict[test_type] = sno_unique_pass_count / sno_unique_total_count
+            else:
+                station_data = extract_station_data(station_name_LC)
+                if not station_data:
+                    result_dict[station_name] = 0.0
+                    continue
+                
+                sno_count = Counter([data['sno'] for data in station_data])
+                
+                sno_list_firstpass = [data['sno'] for data in station_data if is_io_pass(data.get('io')) and sno_count[data['sno']] == 1]
+                sno_unique_pass_count = len(set(sno_list_firstpass))
+                
+                sno_list_total = [data['sno'] for data in extract_station_data(station_name_LC)]
+                sno_unique_total_count = len(set(sno_list_total))
+                
+                if sno_unique_total_count == 0:
+                    result_dict[station_name] = 0.0
+                else:
+                    result_dict[station_name] = sno_unique_pass_count / sno_unique_total_count        
+        return result_dict
+
+def legacy_extract_failure_info(project, startdate, enddate):
+    stations_config = legacy_load_stations_config()
+    
+    if project not in stations_config:
+        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的工站配置")
+        return
+    
+    env_file = stations_config[project].get('env_file')
+    if not env_file:
+        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的env_file配置")
+        return
+
+    data_list = legacy_query_lc_data(env_file, startdate, enddate)    
+    if not data_list:
+        return None
+    
+    project_stations = stations_config[project]
+    stations = []
+    for station_name in project_stations:
+        if station_name == 'env_file' or station_name == 'table_name':
+            continue
+        station_value = project_stations[station_name]
+        parsed_value = legacy_parse_station_value(station_value)
+        stations.append((station_name, parsed_value))
+    
+    def extract_station_data(station_value):
+        if isinstance(station_value, list):
+            return [data for data in data_list if data.get('traceid') in [int(v) for v in station_value]]
+        elif isinstance(station_value, int):
+            return [data for data in data_list if data.get('traceid') == station_value]
+        else:
+            return [data for data in data_list if data.get('test') == station_value]
+    failure_dict = {}
+    
+    for station_name, station_name_LC in stations:
+        if station_name == 'Function':
+            if isinstance(station_name_LC, list):
+                function_data = [data for data in data_list if data.get('traceid') in [int(v) for v in station_name_LC]]
+            elif isinstance(station_name_LC, int):
+                function_data = [data for data in data_list if data.get('traceid') == station_name_LC]
+            else:
+                function_data = [data for data in data_list if data.get('test') == station_name_LC]
+            
+            pre_data = [data for data in function_data if data.get('test') == 'PRE']
+            eol_data = [data for data in function_data if data.get('test') == 'EOL']
+            
+            for test_type, test_data in [('PRE', pre_data), ('EOL', eol_data)]:
+                failure_dict[test_type] = {}
+                for data in test_data:
+                    os0_value = data.get('os0', '')
+                    if os0_value and isinstance(os0_value, str):
+                        if 'Test Step: ' in os0_value:
+                            idx = os0_value.index('Test Step: ')
+                            if idx + 10 <= len(os0_value):
+                                step_info = os0_value[idx+10:idx+19]
+                                if step_info in failure_dict[test_type]:
+                                    failure_dict[test_type][step_info] += 1
+                                else:
+                                    failure_dict[test_type][step_info] = 1
+                        elif 'Fail Step: ' in os0_value:
+                            idx = os0_value.index('Fail Step: ')
+                            if idx + 10 <= len(os0_value):
+                                step_info = os0_value[idx+10:idx+19]
+                                if step_info in failure_dict[test_type]:
+                                    failure_dict[test_type][step_info] += 1
+                                else:
+                                    failure_dict[test_type][step_info] = 1
+        else:
+            station_data = extract_station_data(station_name_LC)
+            failure_dict[station_name] = {}
+            for data in station_data:
+                os0_value = data.get('os0', '')
+                if os0_value and isinstance(os0_value, str):
+                    if 'Test Step: ' in os0_value:
+                        idx = os0_value.index('Test Step: ')
+                        if idx + 10 <= len(os0_value):
+                            step_info = os0_value[idx+10:idx+19]
+                            if step_info in failure_dict[station_name]:
+                                failure_dict[station_name][step_info] += 1
+                            else:
+                                failure_dict[station_name][step_info] = 1
+                    elif 'Fail Step: ' in os0_value:
+                        idx = os0_value.index('Fail Step: ')
+                        if idx + 10 <= len(os0_value):
+                            step_info = os0_value[idx+10:idx+19]
+                            if step_info in failure_dict[station_name]:
+                                failure_dict[station_name][step_info] += 1
+                            else:
+                                failure_dict[station_name][step_info] = 1
+    return failure_dict
+
+'''通过TKinter创建FPY_LC类及按钮/输出框等各种控件并调用函数输出结果'''
+
+# ---------------------- 单个用例（在子进程中运行） ----------------------
+BENCH_CASES = ('legacy', 'python-stream', 'process-stream', 'two-phase')
+
+def peak_rss_mb():
+    """进程峰值内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux为KB，macOS为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_case(case, row_count, seed=DEFAULT_SEED):
+    """在当前目录（已写好配置文件）运行一个用例，返回计时结果字典"""
+    import pymysql
+    stats = {'fetch_seconds': 0.0}
+    pymysql.connect = lambda **kwargs: BenchConnection(row_count, seed, stats)
+    end_date = (date.fromisoformat(BENCH_START_DATE) + timedelta(days=BENCH_DAYS - 1)).isoformat()
+    marks = []
+
+    def progress(rows_fetched):
+        marks.append((time.perf_counter(), stats['fetch_seconds']))
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    if case == 'legacy':
+        # 改造前界面的调用方式：FPY和失败信息分别调用，各读取计算一遍
+        legacy_calculate_each_project_FPY(BENCH_LEGACY_PROJECT, BENCH_START_DATE, end_date)
+        legacy_extract_failure_info(BENCH_LEGACY_PROJECT, BENCH_START_DATE, end_date)
+        rows = row_count * 2
+    else:
+        project = BENCH_TWO_PHASE_PROJECT if case == 'two-phase' else BENCH_PROJECT
+        engine = 'process' if case == 'process-stream' else 'python'
+        result = FPYEngine.analyze_project(project, BENCH_START_DATE, end_date, engine=engine, progress=progress)
+        rows = result.row_count
+    total = time.perf_counter() - start
+    # 本进程（含线程）的CPU时间；engine=process时查询和计算都在子进程中，这里只有主进程合并结果的开销
+    cpu_seconds = time.process_time() - cpu_start
+
+    engine_seconds = max(total - stats['fetch_seconds'], 1e-9)
+    phases = {'fetch': round(stats['fetch_seconds'], 3)}
+    if len(marks) >= 2:
+        # 最后一次进度回调在计算结果之后，之前一次在第一阶段最后一批数据处理完之后；
+        # 两者之间（扣除取数耗时）是两阶段读取的失败计数和结果计算
+        (last_time, last_fetch), (previous_time, previous_fetch) = marks[-1], marks[-2]
+        phases['finish'] = round((last_time - previous_time) - (last_fetch - previous_fetch), 3)
+        phases['feed'] = round(engine_seconds - phases['finish'], 3)
+    return {
+        'case': case,
+        'rows': row_count,
+        'seconds': round(total, 3),
+        'engine_seconds': round(engine_seconds, 3),
+        'cpu_seconds': round(cpu_seconds, 3),
+        'rows_per_sec': round(rows / engine_seconds),
+        'peak_rss_mb': peak_rss_mb(),
+        'phases': phases,
+    }
+
+def write_bench_config(directory):
+    with open(os.path.join(directory, "stations_config.ini"), "w", encoding="utf-8") as f:
+        f.write(BENCH_STATIONS_CONFIG)
+    with open(os.path.join(directory, "bench.env"), "w", encoding="utf-8") as f:
+        f.write(BENCH_ENV)
+
+# ---------------------- 基准套件 ----------------------
+def git_revision():
+    """当前代码的git提交号，不在git仓库中时返回None"""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+def load_previous_results(results_file):
+    """读取已保存的结果，返回{(主机, 用例, 行数): 最近一次结果}"""
+    previous = {}
+    if not os.path.exists(results_file):
+        return previous
+    with open(results_file, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                previous[(record.get('host'), record['case'], record['rows'])] = record
+    return previous
+
+def run_suite(sizes=DEFAULT_SIZES, cases=BENCH_CASES, seed=DEFAULT_SEED, results_file=DEFAULT_RESULTS_FILE):
+    """每个(用例, 行数)在单独的子进程中运行，结果追加到results_file并打印与上次结果的对比"""
+    results_file = os.path.abspath(results_file)
+    previous = load_previous_results(results_file)
+    revision = git_revision()
+    host = platform.node()
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'用例':<14}{'行数':>10}{'引擎耗时(s)':>12}{'行/秒':>12}{'峰值内存(MB)':>14}  对比上次")
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_bench_config(work_dir)
+        for row_count in sizes:
+            for case in cases:
+                if case == 'legacy' and row_count > LEGACY_MAX_ROWS:
+                    continue
+                env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [module_dir, os.environ.get('PYTHONPATH')])))
+                output = subprocess.run([sys.executable, "-m", "FPYBenchmark", "--worker", case, str(row_count),
+                                         "--seed", str(seed)], cwd=work_dir, env=env, capture_output=True, text=True)
+                if output.returncode != 0:
+                    print(f"{case:<14}{row_count:>10}  运行失败：{output.stderr.strip().splitlines()[-1:]}")
+                    continue
+                record = json.loads(output.stdout.strip().splitlines()[-1])
+                record.update({'time': datetime.now().isoformat(timespec='seconds'), 'revision': revision,
+                               'host': host, 'python': platform.python_version(), 'seed': seed})
+                last = previous.get((host, case, row_count))
+                change = ""
+                if last and last.get('rows_per_sec'):
+                    change = f"{(record['rows_per_sec'] / last['rows_per_sec'] - 1) * 100:+.1f}%（{last.get('revision')}）"
+                print(f"{case:<14}{row_count:>10}{record['engine_seconds']:>12}{record['rows_per_sec']:>12}"
+                      f"{str(record['peak_rss_mb']):>14}  {change}")
+                with open(results_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="FPYBenchmark", description="用模拟LC数据测量FPY计算引擎的性能")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="数据行数")
+    parser.add_argument('--cases', nargs='+', choices=BENCH_CASES, default=list(BENCH_CASES), help="用例")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE, help="结果文件（JSON lines，追加写入）")
+    parser.add_argument('--worker', nargs=2, metavar=('CASE', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        case, row_count = args.worker
+        print(json.dumps(run_case(case, int(row_count), args.seed)))
+        return 0
+    run_suite(args.sizes, args.cases, args.seed, args.results)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
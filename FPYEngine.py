@@ -0,0 +1,3010 @@
+# -*- coding: utf-8 -*-
+# FPY计算引擎：读取stations_config.ini和LC数据库，计算各工站一次通过率和失败步骤TOP5
+# 不依赖tkinter，界面（FPYFromLC_V2.py）和命令行共用；pymysql、dotenv等在用到时才导入
+# 命令行用法：python -m FPYEngine --project ICCU1 --from 2026-10-01 --to 2026-10-07 --format json
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice, repeat
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import base64
+import configparser
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+import warnings
+import zlib
+
+def file_mtime(filename):
+    """返回文件修改时间，文件不存在时返回None"""
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+# 已解析的.env配置，env文件名 -> (修改时间, 配置字典)
+_env_config_cache = {}
+
+# 定义加载各产品数据库.env文件的函数用于配置不同产品的不同数据库信息
+def get_env_config(env_filename):
+    """读取指定.env文件,返回配置字典；文件未修改时直接使用上次解析的结果"""
+    mtime = file_mtime(env_filename)
+    cached = _env_config_cache.get(env_filename)
+    if cached and cached[0] == mtime:
+        return dict(cached[1])
+    from dotenv import dotenv_values    # 延迟导入，加快命令行启动
+    # dotenv_values直接读取文件为字典
+    env_dict = dotenv_values(env_filename)
+    # 转换并构建数据库配置
+    db_config = {
+        'host': env_dict.get('DB_HOST'),
+        'port': int(env_dict.get('DB_PORT', 3306)),
+        'user': env_dict.get('DB_USER'),
+        'password': env_dict.get('DB_PASSWORD'),
+        'database': env_dict.get('DB_NAME'),
+        'charset': 'utf8mb4'
+    }
+    _env_config_cache[env_filename] = (mtime, db_config)
+    return dict(db_config)
+
+# 已解析的工站配置，配置文件名 -> (修改时间, ConfigParser, {项目: StationPlan})
+_stations_config_cache = {}
+
+def load_stations_config(config_file="stations_config.ini"):
+    """从.ini文件读取工站配置；文件未修改时直接返回上次解析的结果（调用方不要修改返回的配置）"""
+    mtime = file_mtime(config_file)
+    cached = _stations_config_cache.get(config_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(config_file, encoding='utf-8')
+    _stations_config_cache[config_file] = (mtime, config, {})
+    return config
+
+def get_station_plan(project, config_file="stations_config.ini"):
+    """返回项目预编译的工站计划，配置文件修改后重新构建"""
+    config = load_stations_config(config_file)
+    plans = _stations_config_cache[config_file][2]
+    station_plan = plans.get(project)
+    if station_plan is None:
+        station_plan = build_station_plan(config[project])
+        plans[project] = station_plan
+    return station_plan
+
+def parse_station_value(value):
+    """解析工站配置值，支持单个值和逗号分隔的多个值"""
+    if ',' in value:
+        return [int(v.strip()) for v in value.split(',')]   #多值处理：分割→去空格→转整数，返回整数列表
+    else:
+        try:
+            return int(value)   #单值处理：转整数，返回整数
+        except ValueError:
+            return value.strip()
+
+# 工站配置中不属于工站的键
+NON_STATION_KEYS = ('env_file', 'table_name', 'explain_check', 'engine', 'fetch_mode', 'batch_size', 'cache',
+                    'two_phase_fetch', 'step_patterns', 'partition', 'fetch_workers',
+                    'process_workers', 'live_id_column', 'live_refresh_seconds',
+                    'first_pass', 'rolled_max_serials', 'by_artno')
+
+def is_io_pass(io_value):
+    """判断测试是否通过，io为-1（数字或字符串）表示通过"""
+    if io_value == "-1" or io_value == -1:
+        return True
+    elif isinstance(io_value, str) and io_value.strip() == "-1":
+        return True
+    return False
+
+class StationAccumulator:
+    """单个工站的累加器：记录每个序列号的测试次数及是否有通过记录"""
+    __slots__ = ('attempts', 'passed')
+
+    def __init__(self):
+        self.attempts = Counter()   # sno -> 测试次数
+        self.passed = set()         # 有通过记录的sno
+
+    def add(self, sno, passed):
+        self.attempts[sno] += 1
+        if passed:
+            self.passed.add(sno)
+
+    def merge(self, other):
+        """合并另一段数据（如另一天）的累加结果"""
+        self.attempts.update(other.attempts)
+        self.passed |= other.passed
+
+    def total_count(self):
+        return len(self.attempts)
+
+    def firstpass_count(self):
+        # 一次通过：该序列号在本工站只测试过一次且结果为通过
+        attempts = self.attempts
+        return sum(1 for sno in self.passed if attempts[sno] == 1)
+
+    def fpy(self):
+        total = self.total_count()
+        if total == 0:
+            return 0.0
+        return self.firstpass_count() / total
+
+class StationPlan:
+    """项目工站计划：按配置顺序的工站名，以及traceid/test到工站的索引"""
+
+    def __init__(self, names, empty, by_traceid, by_test, function_traceids, function_tests, step_parser=None):
+        self.names = names                          # 输出工站名（Function拆分为PRE/EOL）
+        self.empty = empty                          # 配置值为空的工站，结果固定为0
+        self.by_traceid = by_traceid                # traceid -> 工站名元组
+        self.by_test = by_test                      # test -> 工站名元组
+        self.function_traceids = function_traceids  # 属于Function工站的traceid
+        self.function_tests = function_tests        # 属于Function工站的test
+        self.step_parser = step_parser or DEFAULT_STEP_PARSER   # 从os0截取失败步骤
+        self._routes = {}                           # (traceid, test) -> 工站名元组，查过一次即缓存
+
+    def route(self, traceid, test):
+        """返回一行数据所属的全部工站名"""
+        key = (traceid, test)
+        names = self._routes.get(key)
+        if names is None:
+            names = self.by_traceid.get(traceid, ()) + self.by_test.get(test, ())
+            # Function工站按test拆分为PRE和EOL
+            if (traceid in self.function_traceids or test in self.function_tests) and test in ('PRE', 'EOL'):
+                names = names + (test,)
+            self._routes[key] = names
+        return names
+
+def build_station_plan(project_stations):
+    """根据项目工站配置一次性构建工站索引"""
+    names = []
+    empty = set()
+    by_traceid = {}
+    by_test = {}
+    function_traceids = set()
+    function_tests = set()
+    for station_name in project_stations:
+        if station_name in NON_STATION_KEYS:
+            continue
+        station_value = parse_station_value(project_stations[station_name])
+        if not station_value:
+            names.append(station_name)
+            empty.add(station_name)
+            continue
+        if station_name == 'Function':
+            names.extend(['PRE', 'EOL'])
+            if isinstance(station_value, list):
+                function_traceids.update(station_value)
+            elif isinstance(station_value, int):
+                function_traceids.add(station_value)
+            else:
+                function_tests.add(station_value)
+            continue
+        names.append(station_name)
+        if isinstance(station_value, list):
+            for traceid in set(station_value):
+                by_traceid[traceid] = by_traceid.get(traceid, ()) + (station_name,)
+        elif isinstance(station_value, int):
+            by_traceid[station_value] = by_traceid.get(station_value, ()) + (station_name,)
+        else:
+            by_test[station_value] = by_test.get(station_value, ()) + (station_name,)
+    step_parser = make_step_parser(project_stations.get('step_patterns'))
+    return StationPlan(names, empty, by_traceid, by_test, function_traceids, function_tests, step_parser)
+
+# ---------------------- 运行计时：各阶段耗时写入JSON lines日志 ----------------------
+# 开启后每次分析记录连接、表检查、查询、取数、计算、界面显示各阶段的耗时、行数和估算的传输字节数
+# 关闭时每个阶段只多一次线程变量查询；也可用环境变量FPY_TRACE=1开启
+TRACE_LOG_FILE = "fpy_runs.log"
+TRACE_LOG_MAX_BYTES = 5 * 1024 * 1024    # 日志超过该大小时轮转
+TRACE_LOG_BACKUPS = 3
+
+_trace_settings = {'enabled': os.environ.get('FPY_TRACE', '') not in ('', '0'), 'last': None}
+_trace_context = threading.local()
+_trace_logger = None
+_trace_logger_lock = threading.Lock()
+
+def set_tracing(enabled):
+    _trace_settings['enabled'] = bool(enabled)
+
+def tracing_enabled():
+    return _trace_settings['enabled']
+
+def last_run_trace():
+    """最近一次结束的运行计时，没有时返回None"""
+    return _trace_settings['last']
+
+def estimate_bytes(batch):
+    """估算一批数据的传输字节数：字符串按长度，其它值按8字节"""
+    total = 0
+    for values in batch.data.values():
+        for value in values:
+            total += len(value) if isinstance(value, (str, bytes)) else 8
+    return total
+
+def get_trace_logger():
+    """运行计时日志，第一次写入时才创建轮转文件"""
+    global _trace_logger
+    with _trace_logger_lock:
+        if _trace_logger is None:
+            import logging
+            from logging.handlers import RotatingFileHandler
+            logger = logging.getLogger("FPYEngine.runs")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(TRACE_LOG_FILE, maxBytes=TRACE_LOG_MAX_BYTES,
+                                          backupCount=TRACE_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _trace_logger = logger
+        return _trace_logger
+
+class RunTrace:
+    """一次运行的计时记录：各阶段累计的耗时、次数、行数和字节数，多个线程可同时记录"""
+
+    def __init__(self, kind, **info):
+        self.kind = kind                  # 运行类型，如project、all_projects、trend
+        self.info = info                  # 项目、日期范围等
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans = {}                   # 阶段名 -> {'seconds', 'count', 'rows', 'bytes'}
+        self.total_seconds = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, rows=0, byte_count=0):
+        with self._lock:
+            record = self.spans.setdefault(name, {'seconds': 0.0, 'count': 0, 'rows': 0, 'bytes': 0})
+            record['seconds'] += seconds
+            record['count'] += 1
+            record['rows'] += rows
+            record['bytes'] += byte_count
+
+    def finish(self, **info):
+        """结束计时并写入日志"""
+        self.total_seconds = time.perf_counter() - self._start
+        self.info.update(info)
+        _trace_settings['last'] = self
+        try:
+            get_trace_logger().info(json.dumps(self.to_dict(), ensure_ascii=False, default=str))
+        except OSError as e:
+            show_warning(f"运行计时日志写入失败：{e}")
+
+    def to_dict(self):
+        with self._lock:
+            spans = {name: dict(record, seconds=round(record['seconds'], 4)) for name, record in self.spans.items()}
+        return {'time': self.started_at, 'kind': self.kind, **self.info,
+                'total_seconds': None if self.total_seconds is None else round(self.total_seconds, 4),
+                'spans': spans}
+
+    def breakdown_text(self):
+        """调试面板显示的各阶段耗时"""
+        data = self.to_dict()
+        lines = [f"{self.started_at}  {self.kind}  " + "  ".join(f"{key}={value}" for key, value in self.info.items()),
+                 f"总耗时: {data['total_seconds']} s", ""]
+        for name, record in sorted(data['spans'].items(), key=lambda item: -item[1]['seconds']):
+            line = f"{name:<16}{record['seconds']:>9.4f} s  {record['count']}次"
+            if record['rows']:
+                line += f"  {record['rows']}行"
+            if record['bytes']:
+                line += f"  约{record['bytes'] / 1024 / 1024:.2f} MB"
+            lines.append(line)
+        return "\n".join(lines)
+
+def start_run_trace(kind, **info):
+    """开启计时时返回新的RunTrace，否则返回None"""
+    if not _trace_settings['enabled']:
+        return None
+    return RunTrace(kind, **info)
+
+def current_trace():
+    return getattr(_trace_context, 'trace', None)
+
+@contextmanager
+def trace_activated(trace):
+    """在with块内把当前线程的阶段计时记录到trace；trace为None时不做任何事"""
+    previous = getattr(_trace_context, 'trace', None)
+    _trace_context.trace = trace
+    try:
+        yield trace
+    finally:
+        _trace_context.trace = previous
+
+@contextmanager
+def traced_run(kind, **info):
+    """开启计时时把with块内的一次运行记录到日志，未开启时不做任何事"""
+    trace = start_run_trace(kind, **info)
+    if trace is None:
+        yield None
+        return
+    status = 'error'
+    try:
+        with trace_activated(trace):
+            yield trace
+        status = 'ok'
+    finally:
+        trace.finish(status=status)
+
+@contextmanager
+def span(name):
+    """记录一个阶段的耗时；with块内可向返回的字典写入rows、bytes，未开启计时时返回None"""
+    trace = getattr(_trace_context, 'trace', None)
+    if trace is None:
+        yield None
+        return
+    record = {}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        trace.add(name, time.perf_counter() - start, record.get('rows', 0), record.get('bytes', 0))
+
+# ---------------------- 数据库连接池 ----------------------
+DEFAULT_POOL_SIZE = 4         # 每个.env数据库最多同时借出的连接数
+DEFAULT_IDLE_TIMEOUT = 300    # 空闲超过该秒数的连接不再复用
+DEFAULT_ACQUIRE_TIMEOUT = 120 # 等待借出连接的最长秒数，超时说明有连接未归还或查询卡住
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+class ConnectionPool:
+    """单个数据库的连接池：复用空闲连接，借出前ping做健康检查，空闲超时的连接直接关闭"""
+
+    def __init__(self, db_config, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        self.db_config = db_config
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = []                                      # [(连接, 归还时间)]
+        self._discarded = set()                              # 已发送KILL的连接，归还时关闭
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)   # 限制同时借出的连接数
+
+    def acquire(self):
+        """借出连接；acquire_timeout秒内没有空位时抛出FPYError，不无限等待"""
+        import pymysql
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise FPYError(f"等待数据库{self.db_config.get('host')}/{self.db_config.get('database')}的连接超时"
+                           f"（{self.acquire_timeout}秒）：{self.max_size}个连接都在使用中，"
+                           f"可能有查询未结束或连接未归还，请稍后重试或重启程序")
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, released_at = self._idle.pop()
+                if time.time() - released_at > self.idle_timeout:
+                    close_quietly(connection)
+                    continue
+                try:
+                    connection.ping(reconnect=False)
+                    return connection
+                except pymysql.MySQLError:
+                    close_quietly(connection)
+            # autocommit避免复用的连接停留在旧的一致性读快照上
+            return pymysql.connect(autocommit=True, **self.db_config)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def discard(self, connection):
+        """标记连接归还时关闭、不再复用（将对其发送KILL QUERY，不能让其它查询借到）"""
+        with self._lock:
+            self._discarded.add(connection)
+
+    def release(self, connection, reusable=True):
+        """归还连接；出错、结果集未读完或被KILL的连接不再复用"""
+        with self._lock:
+            if connection in self._discarded:
+                self._discarded.discard(connection)
+                reusable = False
+            elif reusable and connection.open:
+                self._idle.append((connection, time.time()))
+        if not reusable or not connection.open:
+            close_quietly(connection)
+        self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            close_quietly(connection)
+
+# env文件名 -> ConnectionPool
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+def get_connection_pool(env_file):
+    """按.env文件返回连接池，.env内容变化后重建"""
+    db_config = get_env_config(env_file)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(env_file)
+        if pool is None or pool.db_config != db_config:
+            if pool is not None:
+                pool.close_all()
+            pool = ConnectionPool(db_config)
+            _connection_pools[env_file] = pool
+        return pool
+
+@contextmanager
+def pooled_connection(env_file):
+    """从连接池借出连接，with块正常结束后归还，异常或提前结束时关闭"""
+    pool = get_connection_pool(env_file)
+    with span('connect'):
+        connection = pool.acquire()
+    reusable = False
+    try:
+        yield connection
+        reusable = True
+    finally:
+        pool.release(connection, reusable)
+
+def close_connection_pools():
+    """关闭所有连接池中的空闲连接"""
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.close_all()
+
+# ---------------------- 错误、警告提示与取消 ----------------------
+class FPYError(Exception):
+    """配置或数据库错误，消息可直接显示给用户"""
+
+# 不影响计算结果的提示（如缺少索引）按线程转交，界面在主线程中显示
+_warning_context = threading.local()
+
+def show_warning(message):
+    """提示警告信息：当前线程设置了转交函数时交给它处理，否则用warnings模块输出"""
+    handler = getattr(_warning_context, 'handler', None)
+    if handler is not None:
+        handler(message)
+    else:
+        warnings.warn(message, stacklevel=2)
+
+@contextmanager
+def warnings_to(handler):
+    """在with块内把当前线程的警告转交给handler"""
+    previous = getattr(_warning_context, 'handler', None)
+    _warning_context.handler = handler
+    try:
+        yield
+    finally:
+        _warning_context.handler = previous
+
+class AnalysisCancelled(Exception):
+    """分析被用户取消"""
+
+def kill_query(env_file, thread_id):
+    """用单独的连接终止指定连接上正在执行的查询"""
+    import pymysql
+    connection = pymysql.connect(**get_env_config(env_file))
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("KILL QUERY %s", (thread_id,))
+    finally:
+        connection.close()
+
+class CancelToken:
+    """取消标记：cancel()后分析在下一批数据前停止，正在执行的MySQL查询通过KILL QUERY终止"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._active = {}    # 正在查询的连接 -> env文件
+
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise AnalysisCancelled()
+
+    @contextmanager
+    def watch(self, env_file, connection):
+        """with块内的查询可被cancel()终止"""
+        self.check()
+        with self._lock:
+            self._active[connection] = env_file
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(connection, None)
+
+    def cancel(self):
+        import pymysql
+        self._event.set()
+        # 与watch退出时共用同一把锁：连接先标记为不可复用再KILL，
+        # 查询恰好结束、连接已归还的情况下KILL不会落到其它分析借到的同一连接上
+        with self._lock:
+            active = list(self._active.items())
+            for connection, env_file in active:
+                get_connection_pool(env_file).discard(connection)
+        for connection, env_file in active:
+            try:
+                kill_query(env_file, connection.thread_id())
+            except pymysql.MySQLError:
+                pass
+
+@contextmanager
+def watch_query(cancel_token, env_file, connection):
+    """cancel_token为None时不做任何事"""
+    if cancel_token is None:
+        yield
+    else:
+        with cancel_token.watch(env_file, connection):
+            yield
+
+# LC数据查询的字段：变种号artno，序列号sno，设备编号traceid，测试类型test，测试结果io，测试日志os0
+LC_COLUMNS = ('artno', 'sno', 'traceid', 'test', 'io', 'os0')
+# 两阶段读取（two_phase_fetch）第一阶段只读计算FPY需要的窄字段，os0长文本占传输量的绝大部分
+FPY_COLUMNS = ('artno', 'sno', 'traceid', 'test', 'io')
+# 第二阶段只读有失败步骤的行，os0在服务端截取为step字段
+STEP_COLUMNS = ('traceid', 'test')
+
+# 重复值很多的字段：同一批查询中相同的值共用同一个对象
+INTERNED_COLUMNS = ('artno', 'sno', 'traceid', 'test', 'io')
+
+class LCBatch:
+    """一批LC数据的列式表示：每个字段一个元组，替代每行一个字典
+    游标返回元组行，按列转置后丢弃；sno/test/artno等重复值在一次查询内去重共用"""
+    __slots__ = ('columns', 'data', 'size')
+
+    def __init__(self, columns, data, size):
+        self.columns = tuple(columns)   # 字段名
+        self.data = data                # 字段名 -> 该字段各行的值
+        self.size = size
+
+    @classmethod
+    def from_rows(cls, rows, columns, interned=None):
+        """由元组行构建；interned是跨批共用的去重字典"""
+        if not rows:
+            return cls(columns, {name: () for name in columns}, 0)
+        data = {}
+        for name, values in zip(columns, zip(*rows)):
+            if interned is not None and name in INTERNED_COLUMNS:
+                # setdefault在C层逐个查表，已出现的值换成第一次出现的对象
+                values = tuple(map(interned.setdefault, values, values))
+            data[name] = values
+        return cls(columns, data, len(rows))
+
+    @classmethod
+    def from_row_chunks(cls, chunks, columns, interned=None):
+        """由逐块读取的元组行构建一批，每块转置后即丢弃，不同时保留全部元组行"""
+        data = {name: [] for name in columns}
+        size = 0
+        for rows in chunks:
+            chunk = cls.from_rows(rows, columns, interned)
+            for name in columns:
+                data[name].extend(chunk.data[name])
+            size += len(chunk)
+        return cls(columns, data, size)
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """由字典行构建（兼容直接传入字典列表的调用方）"""
+        rows = list(rows)
+        columns = tuple(rows[0]) if rows else ()
+        return cls(columns, {name: tuple(data.get(name) for data in rows) for name in columns}, len(rows))
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def get(self, name):
+        """字段的全部值，没有该字段时返回None"""
+        return self.data.get(name)
+
+    def to_dicts(self):
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*(self.data[name] for name in columns))]
+
+    def take(self, indices):
+        """按行号取子批"""
+        return LCBatch(self.columns, {name: tuple(values[i] for i in indices) for name, values in self.data.items()},
+                       len(indices))
+
+    def split_by_day(self):
+        """按timestamp的日期(YYYY-MM-DD)拆分为子批，保持原有行序"""
+        day_indices = {}
+        for index, timestamp in enumerate(self.data['timestamp']):
+            day_indices.setdefault(str(timestamp)[:10], []).append(index)
+        return {day: self.take(indices) for day, indices in day_indices.items()}
+
+    def split_by(self, name):
+        """按字段值拆分为子批，保持原有行序；整批只有一个取值时直接返回本批"""
+        value_indices = {}
+        for index, value in enumerate(self.data[name]):
+            value_indices.setdefault(value, []).append(index)
+        if len(value_indices) == 1:
+            return {value: self for value in value_indices}
+        return {value: self.take(indices) for value, indices in value_indices.items()}
+
+def as_batch(rows):
+    return rows if isinstance(rows, LCBatch) else LCBatch.from_dicts(rows)
+
+# 已确认存在的表，(host, port, database, table) -> True，避免每次查询都执行SHOW TABLES
+_table_exists_cache = {}
+# 已做过EXPLAIN检查的表，每张表只提示一次
+_explain_checked_tables = set()
+
+def date_range_params(start_date, end_date):
+    """把闭区间[start_date, end_date]转换为半开区间[start_date, end_date+1天)的查询参数"""
+    end_next = date.fromisoformat(end_date) + timedelta(days=1)
+    return (start_date, end_next.isoformat())
+
+def build_lc_query(table_name, columns=LC_COLUMNS):
+    """生成按日期范围查询LC数据的SQL
+    timestamp列不套函数，直接做范围比较，MySQL才能使用timestamp上的索引"""
+    # 反引号包裹timestamp（MySQL关键字）和表名，避免语法错误
+    return """
+            SELECT {columns}
+            FROM `{table}` 
+            WHERE `timestamp` >= %s AND `timestamp` < %s 
+        """.format(columns=",".join(columns), table=table_name)
+
+def build_period_query(table_name, columns, period_count):
+    """生成一次查询多个日期范围的SQL：period列为行所属范围的序号（0起），WHERE只取这些范围内的行
+    各范围都是timestamp上的区间，MySQL按索引分别做范围扫描，范围之间的数据不读取"""
+    in_period = "(`timestamp` >= %s AND `timestamp` < %s)"
+    return """
+            SELECT {columns}, CASE {cases} END AS period
+            FROM `{table}`
+            WHERE `timestamp` >= %s AND `timestamp` < %s AND ({periods})
+        """.format(columns=",".join(columns), table=table_name,
+                   cases=" ".join(f"WHEN {in_period} THEN {index}" for index in range(period_count)),
+                   periods=" OR ".join([in_period] * period_count))
+
+def build_failure_step_query(table_name, columns=STEP_COLUMNS):
+    """生成第二阶段SQL：只返回os0中含失败步骤的行，失败步骤在服务端截取，不传输完整os0
+    columns中含os0时（自定义step_patterns无法写成SQL）返回非空的os0，由Python解析"""
+    if 'os0' in columns:
+        return """
+            SELECT {columns}
+            FROM `{table}`
+            WHERE `timestamp` >= %s AND `timestamp` < %s AND os0 <> ''
+        """.format(columns=",".join(columns), table=table_name)
+    return """
+            SELECT {columns}, {step} AS step
+            FROM `{table}`
+            WHERE `timestamp` >= %s AND `timestamp` < %s
+              AND ({test_step} > 0 OR {fail_step} > 0)
+        """.format(columns=",".join(columns), step=SQL_FAILURE_STEP, table=table_name, test_step=SQL_TEST_STEP_AT,
+                   fail_step=SQL_FAIL_STEP_AT)
+
+def table_exists(cursor, db_config, table_name):
+    """检查表是否存在，存在的结果按连接的库和表缓存"""
+    key = (db_config.get('host'), db_config.get('port'), db_config.get('database'), table_name)
+    if key in _table_exists_cache:
+        return True
+    with span('show_tables'):
+        cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
+        exists = cursor.fetchone()
+    if exists:
+        _table_exists_cache[key] = True
+        return True
+    return False
+
+def explain_lc_query(cursor, table_name, sql, params):
+    """查询前执行EXPLAIN，timestamp列没有可用索引时返回提示信息，否则返回None"""
+    cursor.execute(f"SHOW INDEX FROM `{table_name}`")
+    index_rows = cursor.fetchall()
+    # 只有以timestamp为首列的索引才能用于范围查询
+    if not any(row.get('Column_name') == 'timestamp' and row.get('Seq_in_index') == 1 for row in index_rows):
+        return (f"表 {table_name} 的timestamp列没有索引，查询将全表扫描。"
+                f"建议添加索引：ALTER TABLE `{table_name}` ADD INDEX idx_timestamp (`timestamp`)")
+    cursor.execute("EXPLAIN " + sql, params)
+    plan_rows = cursor.fetchall()
+    if any(row.get('type') == 'ALL' for row in plan_rows):
+        return f"表 {table_name} 的timestamp索引未被使用，EXPLAIN显示查询将全表扫描"
+    return None
+
+def resolve_table_name(env_file, table_name=None):
+    """未指定table_name时从stations_config.ini中按env_file查找"""
+    if not table_name:
+        stations_config = load_stations_config()
+        for project_name in stations_config.sections():
+            project_config = stations_config[project_name]
+            if project_config.get('env_file') == env_file:
+                table_name = project_config.get('table_name')
+                break
+    
+    if not table_name:
+        raise FPYError(f"未找到{env_file}对应的table_name配置")
+    return table_name
+
+class LCDataError(FPYError):
+    """LC数据读取错误（如表不存在）"""
+
+# 按二进制排序的字符串列：列的排序规则可能不区分大小写和尾部空格，
+# 按规则排序时'ab'、'AB'、'ab '会交错出现，而Python按值比较把它们当作不同的序列号
+BINARY_ORDER_COLUMNS = ('sno',)
+
+def sql_order_column(column):
+    return f"BINARY `{column}`" if column in BINARY_ORDER_COLUMNS else f"`{column}`"
+
+def prepare_lc_query(cursor, db_config, table_name, start_date, end_date, explain=False, columns=LC_COLUMNS,
+                     failure_steps=False, sample=None, since=None, order_by=None, periods=None):
+    """检查表并生成查询SQL及参数，表不存在时抛出LCDataError
+    failure_steps=True时生成两阶段读取的第二阶段SQL（只查失败步骤）
+    sample=(modulus, remainder)时只查CRC32(sno) % modulus == remainder的序列号
+    since=(字段, 高水位)时只查该字段超过高水位的新行（timestamp包含等于高水位的行）
+    order_by为字段元组时按这些字段排序返回，BINARY_ORDER_COLUMNS中的字段按二进制排序
+    periods为[start_date, end_date]内的多个日期范围[(开始, 结束)]时只查这些范围，period列返回所属范围的序号"""
+    # 先测试表是否存在
+    if not table_exists(cursor, db_config, table_name):
+        raise LCDataError(f"表 {table_name} 不存在")
+    
+    # SQL数据读取：timestamp按[开始日期, 结束日期+1天)做范围筛选，可走timestamp索引
+    if failure_steps:
+        sql = build_failure_step_query(table_name, columns)
+    elif periods:
+        sql = build_period_query(table_name, columns, len(periods))
+    else:
+        sql = build_lc_query(table_name, columns)
+    params = date_range_params(start_date, end_date)
+    if periods and not failure_steps:
+        # CASE中各范围的参数在WHERE之前，WHERE中再按顺序列出一次
+        period_params = sum((date_range_params(*period) for period in periods), ())
+        params = period_params + params + period_params
+    if sample:
+        # 按序列号抽样，同一序列号的记录全部在样本中或全部不在
+        sql += "  AND MOD(CRC32(sno), %s) = %s\n"
+        params += tuple(sample)
+    if since:
+        # timestamp可能有多行相同，等于高水位的行由调用方去重；自增id严格递增
+        column, mark = since
+        sql += f"  AND `{column}` {'>=' if column == 'timestamp' else '>'} %s\n"
+        params += (mark,)
+    if order_by:
+        sql += f"  ORDER BY {', '.join(sql_order_column(column) for column in order_by)}\n"
+
+    # 可选的查询计划检查，提示timestamp列缺少可用索引
+    if explain and table_name not in _explain_checked_tables:
+        _explain_checked_tables.add(table_name)
+        with span('explain'):
+            explain_warning = explain_lc_query(cursor, table_name, sql, params)
+        if explain_warning:
+            show_warning(explain_warning)
+    return sql, params
+
+# 每批（stream）或每次读取（buffered）的默认行数
+DEFAULT_BATCH_SIZE = 10000
+
+def fetch_chunks(cursor, size):
+    """逐块读取游标结果直到读完"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def read_lc_batches(env_file, start_date, end_date, table_name, fetch_mode='buffered',
+                    batch_size=DEFAULT_BATCH_SIZE, explain=False, columns=LC_COLUMNS, cancel_token=None,
+                    failure_steps=False, sample=None, since=None, order_by=None, periods=None):
+    """按fetch_mode读取LC数据，逐批返回LCBatch；数据库错误直接抛出，由调用方处理
+    buffered：读完全部结果后只返回一批
+    stream：按batch_size逐批返回
+    两种方式都用服务端游标按batch_size逐块读取元组行，转为列式LCBatch后即丢弃，不为每行创建字典
+    提前结束迭代时连接不归还连接池，服务端未读完的结果随连接关闭丢弃"""
+    import pymysql
+    db_config = get_env_config(env_file)
+    # 第二阶段的失败步骤表达式返回在最后一列
+    names = tuple(columns) + (('step',) if failure_steps and 'os0' not in columns else ())
+    # 多个日期范围的序号在最后一列
+    names += ('period',) if periods and not failure_steps else ()
+    interned = {}    # 本次查询内去重sno/test/artno等重复值
+    # 从连接池借用连接，避免每次查询重新建立连接
+    with pooled_connection(env_file) as connection:
+        # 表检查和EXPLAIN用字典游标，按字段名读取结果
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        query = prepare_lc_query(cursor, db_config, table_name, start_date, end_date, explain, columns, failure_steps,
+                                 sample, since, order_by, periods)
+        cursor.close()
+
+        # 执行参数化查询（避免SQL注入，安全规范）；服务端游标读取期间连接上不能执行其它语句
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        if fetch_mode == 'stream':
+            with watch_query(cancel_token, env_file, connection):
+                with span('query'):
+                    cursor.execute(*query)
+                while True:
+                    with span('fetch') as record:
+                        batch = LCBatch.from_rows(cursor.fetchmany(batch_size), names, interned)
+                        if record is not None:
+                            record.update(rows=len(batch), bytes=estimate_bytes(batch))
+                    if not len(batch):
+                        break
+                    yield batch
+            cursor.close()
+        else:
+            # 不用普通游标fetchall：它在execute中读取全部元组行，游标和连接到下一条语句前都保留引用，
+            # 整个分析期间元组行和列式数据同时占用内存；逐块读取时只多占一块元组行
+            with watch_query(cancel_token, env_file, connection):
+                with span('query'):
+                    cursor.execute(*query)
+                with span('fetch') as record:
+                    batch = LCBatch.from_row_chunks(fetch_chunks(cursor, batch_size), names, interned)
+                    if record is not None:
+                        record.update(rows=len(batch), bytes=estimate_bytes(batch))
+            cursor.close()
+            yield batch
+
+def iter_lc_rows(env_file, start_date, end_date, table_name=None, batch_size=DEFAULT_BATCH_SIZE, explain=False,
+                 fetch_mode='stream', columns=LC_COLUMNS, cancel_token=None, failure_steps=False, sample=None,
+                 since=None, order_by=None, periods=None):
+    """逐批读取LC数据；出错时抛出FPYError，取消时抛出AnalysisCancelled"""
+    import pymysql
+    table_name = resolve_table_name(env_file, table_name)
+    try:
+        yield from read_lc_batches(env_file, start_date, end_date, table_name, fetch_mode, batch_size, explain,
+                                   columns, cancel_token, failure_steps, sample, since, order_by, periods)
+    except pymysql.MySQLError as e:
+        raise_mysql_error(e, table_name, cancel_token)
+
+def query_lc_data(env_file,start_date, end_date, table_name=None, explain=False, columns=LC_COLUMNS):      #封装从数据库获取的数据
+    # 一次性读取全部结果；完整读完迭代器，连接才能归还连接池；旧接口仍返回字典列表
+    batches = list(iter_lc_rows(env_file, start_date, end_date, table_name, explain=explain,
+                                fetch_mode='buffered', columns=columns))
+    return batches[0].to_dicts() if batches else []
+
+def mysql_error_message(e, table_name):
+    """按MySQL错误码返回数据库错误的提示信息"""
+    if e.args[0] == 1049:
+        return f"找不到指定的数据库！请检查.env文件中的DB_NAME配置是否正确: {e}"
+    elif e.args[0] == 1146:
+        return f"找不到表{table_name}！请确认表名是否正确。详情：{e}"
+    else:
+        return f"数据库查询失败：{e}"
+
+def raise_mysql_error(e, table_name, cancel_token=None):
+    """把MySQL错误转换为FPYError；被KILL QUERY终止的查询按取消处理"""
+    if cancel_token is not None and cancel_token.cancelled():
+        raise AnalysisCancelled() from e
+    raise FPYError(mysql_error_message(e, table_name)) from e
+
+# ---------------------- 服务端聚合：FPY计算下推到MySQL ----------------------
+# str.strip()去掉的全部空白字符（str.isspace()为真的字符），服务端聚合的io判定去掉同一组字符
+STR_WHITESPACE = ('\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006'
+                  '\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000')
+
+def sql_char(char):
+    """MySQL中的单个字符：CHAR(n USING utf8mb4)的n是字符的UTF-8编码"""
+    return f"CHAR({int.from_bytes(char.encode('utf-8'), 'big')} USING utf8mb4)"
+
+def sql_io_stripped_is_pass(column='io'):
+    """与is_io_pass的str.strip()一致：去掉首尾空白字符后等于'-1'，即只含一个'-1'且其余字符都是空白字符
+    MySQL的TRIM只去空格；按各空白字符的出现次数求和判断，不用几十层嵌套的REPLACE"""
+    length = f"CHAR_LENGTH({column})"
+    whitespace_count = " + ".join(f"({length} - CHAR_LENGTH(REPLACE({column}, {sql_char(char)}, '')))"
+                                  for char in STR_WHITESPACE)
+    return f"({length} - CHAR_LENGTH(REPLACE({column}, '-1', '')) = 2 AND {length} - 2 = {whitespace_count})"
+
+# 与is_io_pass一致的通过判定（io为-1，字符串去首尾空白字符后比较）；大多数行的io就是-1，先直接比较
+SQL_IO_PASS = f"COALESCE(io = '-1' OR {sql_io_stripped_is_pass()}, 0)"
+# 与extract_failure_step一致的失败步骤截取：先找'Test Step: '，再找'Fail Step: '，取标记后第10个字符起的9个字符
+# 标记用utf8mb4_bin查找（区分大小写），位置和截取都按字符计算，os0含中文等多字节字符时与Python一致；
+# 不能用BINARY：LOCATE的参数含二进制串时返回字节位置，截取会落在多字节字符中间
+SQL_TEST_STEP_AT = "LOCATE(_utf8mb4'Test Step: ' COLLATE utf8mb4_bin, os0)"
+SQL_FAIL_STEP_AT = "LOCATE(_utf8mb4'Fail Step: ' COLLATE utf8mb4_bin, os0)"
+SQL_FAILURE_STEP = f"""CASE
+                WHEN {SQL_TEST_STEP_AT} > 0 THEN SUBSTRING(os0, {SQL_TEST_STEP_AT} + 10, 9)
+                WHEN {SQL_FAIL_STEP_AT} > 0 THEN SUBSTRING(os0, {SQL_FAIL_STEP_AT} + 10, 9)
+            END"""
+
+def station_sql_conditions(station_plan):
+    """把工站索引转换成每个工站的SQL筛选条件，返回[(工站名, 条件, 参数)]"""
+    station_traceids = {}
+    station_tests = {}
+    for traceid, names in station_plan.by_traceid.items():
+        for station_name in names:
+            station_traceids.setdefault(station_name, []).append(traceid)
+    for test, names in station_plan.by_test.items():
+        for station_name in names:
+            station_tests.setdefault(station_name, []).append(test)
+
+    def match_condition(traceids, tests):
+        parts = []
+        params = []
+        if traceids:
+            parts.append("traceid IN ({})".format(",".join(["%s"] * len(traceids))))
+            params.extend(sorted(traceids))
+        if tests:
+            # BINARY比较，与Python的==一致（区分大小写和尾部空格）
+            parts.append("BINARY test IN ({})".format(",".join(["%s"] * len(tests))))
+            params.extend(sorted(tests))
+        return "(" + " OR ".join(parts) + ")", params
+
+    conditions = []
+    for station_name in station_plan.names:
+        if station_name in station_plan.empty:
+            continue
+        if station_name in ('PRE', 'EOL') and (station_plan.function_traceids or station_plan.function_tests):
+            condition, params = match_condition(station_plan.function_traceids, station_plan.function_tests)
+            conditions.append((station_name, condition + " AND BINARY test = %s", params + [station_name]))
+        else:
+            condition, params = match_condition(station_traceids.get(station_name), station_tests.get(station_name))
+            conditions.append((station_name, condition, params))
+    return conditions
+
+def build_server_fpy_query(table_name, conditions, start_date, end_date):
+    """生成一次扫描的FPY聚合SQL，返回(sql, 参数)
+    内层按sno分组，每个工站一对字段：该sno在工站的测试次数和是否有通过记录（一行属于多个工站时各自计数）；
+    外层汇总为一行：日期范围内的行数row_count，各工站的sno数total_i和一次通过sno数firstpass_i（i为conditions中的序号）"""
+    inner = ["COUNT(*) AS row_count"]
+    outer = ["COALESCE(SUM(row_count), 0) AS row_count"]
+    params = []
+    for index, (_, condition, condition_params) in enumerate(conditions):
+        inner.append(f"COUNT(CASE WHEN {condition} THEN 1 END) AS attempts_{index}")
+        inner.append(f"MAX(CASE WHEN {condition} THEN {SQL_IO_PASS} END) AS passed_{index}")
+        outer.append(f"COALESCE(SUM(attempts_{index} > 0), 0) AS total_{index}")
+        outer.append(f"COALESCE(SUM(attempts_{index} = 1 AND passed_{index} = 1), 0) AS firstpass_{index}")
+        params.extend(condition_params * 2)
+    sql = """
+            SELECT {outer}
+            FROM (
+                SELECT {inner}
+                FROM `{table}`
+                WHERE `timestamp` >= %s AND `timestamp` < %s
+                GROUP BY BINARY sno
+            ) AS per_sno""".format(outer=",\n                   ".join(outer),
+                                   inner=",\n                       ".join(inner), table=table_name)
+    return sql, tuple(params) + date_range_params(start_date, end_date)
+
+def build_serial_count_query(table_name):
+    """日期范围内不同sno的数量，按二进制区分（与Python按值比较一致），用于预估逐件直通率的分片数"""
+    return """
+            SELECT COUNT(DISTINCT CAST(`sno` AS BINARY)) AS serial_count
+            FROM `{table}`
+            WHERE `timestamp` >= %s AND `timestamp` < %s
+        """.format(table=table_name)
+
+def build_server_failure_query(table_name, conditions, start_date, end_date):
+    """生成一次扫描的失败步骤计数SQL，返回(sql, 参数)
+    每个步骤一行：各工站的计数count_i和该步骤在工站第一次出现的时间first_i；
+    按二进制分组：大小写或尾部空格不同的步骤分别计数，与Python的Counter一致"""
+    inner = [f"{SQL_FAILURE_STEP} AS step", "`timestamp`"]
+    outer = ["MIN(step) AS step"]
+    params = []
+    any_station = []
+    for index, (_, condition, condition_params) in enumerate(conditions):
+        inner.append(f"COALESCE({condition}, 0) AS in_{index}")
+        outer.append(f"SUM(in_{index}) AS count_{index}")
+        outer.append(f"MIN(CASE WHEN in_{index} = 1 THEN `timestamp` END) AS first_{index}")
+        params.extend(condition_params)
+        any_station.append(condition)
+    sql = """
+            SELECT {outer}
+            FROM (
+                SELECT {inner}
+                FROM `{table}`
+                WHERE `timestamp` >= %s AND `timestamp` < %s AND os0 <> '' AND ({any_station})
+            ) AS steps
+            WHERE step IS NOT NULL
+            GROUP BY CAST(step AS BINARY)""".format(outer=",\n                   ".join(outer),
+                                                    inner=",\n                       ".join(inner),
+                                                    table=table_name, any_station=" OR ".join(any_station))
+    params = tuple(params) + date_range_params(start_date, end_date)
+    return sql, params + tuple(param for _, _, condition_params in conditions for param in condition_params)
+
+def query_lc_aggregates(env_file, start_date, end_date, table_name, station_plan, cancel_token=None):
+    """服务端聚合查询：返回(各工站(一次通过sno数, 总sno数), 各工站失败步骤Counter, 行数)，出错时抛出FPYError
+    FPY和失败步骤各一次扫描；失败步骤按在工站第一次出现的时间加入Counter，并列时的TOP5顺序与Python引擎
+    按读取顺序（timestamp）计数一致"""
+    import pymysql
+    db_config = get_env_config(env_file)
+    conditions = station_sql_conditions(station_plan)
+
+    try:
+        with pooled_connection(env_file) as connection:
+            cursor = connection.cursor(pymysql.cursors.DictCursor)
+            if not table_exists(cursor, db_config, table_name):
+                raise LCDataError(f"表 {table_name} 不存在")
+
+            station_totals = {}
+            failures = {}
+            with watch_query(cancel_token, env_file, connection), span('server_aggregate'):
+                cursor.execute(*build_server_fpy_query(table_name, conditions, start_date, end_date))
+                totals = cursor.fetchone()
+                row_count = int(totals['row_count'])
+                for index, (station_name, _, _) in enumerate(conditions):
+                    station_totals[station_name] = (int(totals[f'firstpass_{index}']), int(totals[f'total_{index}']))
+
+                if conditions and row_count:
+                    cursor.execute(*build_server_failure_query(table_name, conditions, start_date, end_date))
+                    step_rows = cursor.fetchall()
+                    for index, (station_name, _, _) in enumerate(conditions):
+                        station_steps = [(row[f'first_{index}'], row['step'], int(row[f'count_{index}']))
+                                         for row in step_rows if row[f'count_{index}']]
+                        station_steps.sort(key=lambda item: (item[0], item[1].encode('utf-8')))
+                        failures[station_name] = Counter({step: step_count for _, step, step_count in station_steps})
+            cursor.close()
+            return station_totals, failures, row_count
+
+    except pymysql.MySQLError as e:
+        raise_mysql_error(e, table_name, cancel_token)
+
+def count_lc_serials(env_file, start_date, end_date, table_name, cancel_token=None):
+    """日期范围内的sno数（含不属于任何工站的sno），出错时抛出FPYError"""
+    import pymysql
+    db_config = get_env_config(env_file)
+    try:
+        with pooled_connection(env_file) as connection:
+            cursor = connection.cursor(pymysql.cursors.DictCursor)
+            if not table_exists(cursor, db_config, table_name):
+                raise LCDataError(f"表 {table_name} 不存在")
+            with watch_query(cancel_token, env_file, connection), span('serial_count'):
+                cursor.execute(build_serial_count_query(table_name), date_range_params(start_date, end_date))
+                serial_count = int(cursor.fetchone()['serial_count'])
+            cursor.close()
+            return serial_count
+
+    except pymysql.MySQLError as e:
+        raise_mysql_error(e, table_name, cancel_token)
+
+# 默认失败步骤格式：从'Test Step: '/'Fail Step: '标记最后的空格起取9个字符，Test Step优先
+DEFAULT_STEP_PATTERNS = ('Test Step:( .{0,8})', 'Fail Step:( .{0,8})')
+_REGEX_SPECIAL = set('\\.^$*+?{}[]|()')
+
+def has_top_level_alternation(pattern):
+    """正则在括号和字符集之外是否有'|'，有时各分支的开头不同，没有必须出现的开头文本"""
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 1
+        elif char == '[':
+            # 跳过字符集，紧跟在'['或'[^'后的']'是普通字符
+            index += 1
+            if pattern[index:index + 1] == '^':
+                index += 1
+            if pattern[index:index + 1] == ']':
+                index += 1
+            while index < len(pattern) and pattern[index] != ']':
+                index += 2 if pattern[index] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        index += 1
+    return False
+
+def literal_prefix(pattern):
+    """正则开头的纯文本部分，用str.find定位比正则搜索快得多；有顶层'|'时返回空串"""
+    if has_top_level_alternation(pattern):
+        return ''
+    prefix = []
+    for char in pattern:
+        if char in _REGEX_SPECIAL:
+            if char in '*?{' and prefix:
+                prefix.pop()    # 量词作用于前一个字符，该字符不一定出现
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+class StepParser:
+    """编译后的失败步骤解析器
+    patterns是按优先级排列的正则，各含一个捕获组，捕获内容即失败步骤；
+    各格式开头的文本用str.find定位后再做正则匹配，所有格式共有的文本不在os0中时只扫描一遍即返回"""
+
+    def __init__(self, patterns=DEFAULT_STEP_PATTERNS):
+        self.patterns = tuple(patterns)
+        self._matchers = []
+        for pattern in self.patterns:
+            try:
+                regex = re.compile(pattern, re.DOTALL)
+            except re.error as e:
+                raise FPYError(f"失败步骤格式{pattern}不是有效的正则表达式：{e}") from e
+            if regex.groups != 1:
+                raise FPYError(f"失败步骤格式{pattern}必须有且只有一个捕获组")
+            self._matchers.append((literal_prefix(pattern), regex))
+        # 各格式开头文本的公共后缀，不在os0中时一定没有失败步骤（大多数通过的行）
+        literals = [literal for literal, _ in self._matchers]
+        common = os.path.commonprefix([literal[::-1] for literal in literals])[::-1] if all(literals) else ''
+        self._common = common
+        # 只有默认格式能在MySQL中截取（服务端引擎和两阶段读取使用）
+        self.sql = SQL_FAILURE_STEP if self.patterns == DEFAULT_STEP_PATTERNS else None
+
+    def __call__(self, os0_value):
+        """从os0测试日志中截取失败步骤信息，没有步骤信息时返回None"""
+        if not os0_value or not isinstance(os0_value, str):
+            return None
+        if self._common and self._common not in os0_value:
+            return None
+        for literal, regex in self._matchers:
+            if not literal:
+                match = regex.search(os0_value)
+                if match:
+                    return match.group(1)
+                continue
+            idx = os0_value.find(literal)
+            while idx >= 0:
+                match = regex.match(os0_value, idx)
+                if match:
+                    return match.group(1)
+                idx = os0_value.find(literal, idx + 1)
+        return None
+
+DEFAULT_STEP_PARSER = StepParser()
+
+def make_step_parser(step_patterns):
+    """按stations_config.ini中的step_patterns（每行一个正则）创建解析器，未配置时使用默认格式"""
+    patterns = [line.strip() for line in (step_patterns or '').splitlines() if line.strip()]
+    if not patterns:
+        return DEFAULT_STEP_PARSER
+    return StepParser(patterns)
+
+def extract_failure_step(os0_value):
+    """从os0测试日志中截取失败步骤信息，没有步骤信息时返回None"""
+    return DEFAULT_STEP_PARSER(os0_value)
+
+def step_columns(station_plans):
+    """两阶段读取第二阶段的字段：各项目都用默认格式时在服务端截取，否则读取os0"""
+    if all(station_plan.step_parser.sql for station_plan in station_plans):
+        return STEP_COLUMNS
+    return STEP_COLUMNS + ('os0',)
+
+class AnalysisResult:
+    """一次分析的结构化结果：各工站FPY及各工站失败步骤计数"""
+
+    def __init__(self, project, startdate, enddate, fpy, failures, row_count, error=None, sample_modulus=None,
+                 intervals=None, variants=None):
+        self.project = project
+        self.startdate = startdate
+        self.enddate = enddate
+        self.fpy = fpy              # 工站名 -> 一次通过率
+        self.failures = failures    # 工站名 -> Counter(失败步骤 -> 次数)
+        self.row_count = row_count  # 本次分析的LC数据行数
+        self.error = error          # 全部项目模式下该项目的错误信息
+        self.sample_modulus = sample_modulus   # 抽样预览时为抽样模数（1/N的序列号），精确结果为None
+        self.intervals = intervals or {}       # 抽样预览：工站名 -> FPY的95%置信区间(下限, 上限)
+        self.variants = variants or {}         # 按变种号细分时：artno -> 该变种号的AnalysisResult
+
+    def top_failures(self, station_name, n=5):
+        """返回指定工站出现次数最多的n个失败步骤（Counter.most_common(n)用堆选取，不对全部步骤排序）"""
+        return self.failures.get(station_name, Counter()).most_common(n)
+
+class ProjectAnalyzer:
+    """增量分析器：逐批接收LC数据行，更新各工站累加器和失败计数
+    内存只与各工站的序列号数量有关，与数据行数无关"""
+
+    def __init__(self, station_plan):
+        self.station_plan = station_plan
+        self.accumulators = {name: StationAccumulator() for name in station_plan.names}
+        self.failures = {name: Counter() for name in station_plan.names}
+        self.row_count = 0
+
+    def feed(self, rows):
+        # 按列逐行遍历，每行数据通过索引O(1)分发到所属工站的累加器和失败计数
+        batch = as_batch(rows)
+        count = len(batch)
+        route = self.station_plan.route
+        parse_step = self.station_plan.step_parser
+        accumulators = self.accumulators
+        failures = self.failures
+        self.row_count += count
+        # 两阶段读取时第一阶段没有os0
+        os0_values = batch.get('os0') or repeat(None, count)
+        for traceid, test, sno, io_value, os0_value in zip(batch.get('traceid'), batch.get('test'), batch.get('sno'),
+                                                           batch.get('io'), os0_values):
+            station_names = route(traceid, test)
+            if not station_names:
+                continue
+            passed = is_io_pass(io_value)
+            step_info = parse_step(os0_value)
+            for station_name in station_names:
+                accumulators[station_name].add(sno, passed)
+                if step_info is not None:
+                    failures[station_name][step_info] += 1
+
+    def feed_steps(self, rows):
+        """两阶段读取的第二阶段：接收(traceid, test, step)数据（或含os0的数据），只更新失败计数"""
+        batch = as_batch(rows)
+        route = self.station_plan.route
+        failures = self.failures
+        steps = batch.get('step')
+        if steps is None:
+            steps = map(self.station_plan.step_parser, batch.get('os0'))
+        for traceid, test, step_info in zip(batch.get('traceid'), batch.get('test'), steps):
+            if step_info is None:
+                continue
+            for station_name in route(traceid, test):
+                failures[station_name][step_info] += 1
+
+    def fpy(self):
+        result_dict = {}
+        for station_name in self.station_plan.names:        # 按配置顺序输出各工位通过率
+            if station_name in self.station_plan.empty:
+                result_dict[station_name] = 0.0
+            else:
+                result_dict[station_name] = self.accumulators[station_name].fpy()
+        return result_dict
+
+    def result(self, project, startdate, enddate):
+        return AnalysisResult(project, startdate, enddate, self.fpy(), self.failures, self.row_count)
+
+    def station_counts(self):
+        """工站 -> (一次通过sno数, sno总数)"""
+        return {name: (acc.firstpass_count(), acc.total_count()) for name, acc in self.accumulators.items()}
+
+    def merge(self, other):
+        """合并另一个分析器（同一工站计划）的部分结果"""
+        for station_name, accumulator in other.accumulators.items():
+            self.accumulators[station_name].merge(accumulator)
+        for station_name, step_counter in other.failures.items():
+            self.failures[station_name].update(step_counter)
+        self.row_count += other.row_count
+
+    def to_state(self):
+        """导出可序列化的部分结果，用于本地缓存"""
+        return {
+            'row_count': self.row_count,
+            'stations': {name: [[sno, count, sno in acc.passed] for sno, count in acc.attempts.items()]
+                         for name, acc in self.accumulators.items()},
+            'failures': {name: list(step_counter.items()) for name, step_counter in self.failures.items()},
+        }
+
+    def load_state(self, state):
+        """合并由to_state导出的部分结果"""
+        self.row_count += state['row_count']
+        for station_name, sno_items in state['stations'].items():
+            accumulator = self.accumulators.get(station_name)
+            if accumulator is None:
+                continue
+            for sno, count, passed in sno_items:
+                accumulator.attempts[sno] += count
+                if passed:
+                    accumulator.passed.add(sno)
+        for station_name, step_items in state['failures'].items():
+            if station_name in self.failures:
+                self.failures[station_name].update(dict(step_items))
+
+class FirstAttemptAnalyzer:
+    """按首次测试判断一次通过（first_pass = first_attempt）：sno在工站的第一次测试（按timestamp）通过即为一次通过，
+    之后的复测（如抽检）不影响结果；数据按sno, timestamp排序后流式读取，同一sno的记录连续出现，
+    只需记住当前sno已测过的工站，内存与数据量和序列号数量都无关"""
+
+    def __init__(self, station_plan):
+        self.station_plan = station_plan
+        self.totals = Counter()       # 工站 -> 测试过的sno数
+        self.firstpass = Counter()    # 工站 -> 首次测试通过的sno数
+        self.failures = {name: Counter() for name in station_plan.names}
+        self.row_count = 0
+        self._sno = None              # 当前sno
+        self._tested = set()          # 当前sno已出现过的工站，批与批之间保留
+
+    def feed(self, rows):
+        batch = as_batch(rows)
+        count = len(batch)
+        route = self.station_plan.route
+        parse_step = self.station_plan.step_parser
+        totals = self.totals
+        firstpass = self.firstpass
+        failures = self.failures
+        current, tested = self._sno, self._tested
+        self.row_count += count
+        os0_values = batch.get('os0') or repeat(None, count)
+        for traceid, test, sno, io_value, os0_value in zip(batch.get('traceid'), batch.get('test'), batch.get('sno'),
+                                                           batch.get('io'), os0_values):
+            station_names = route(traceid, test)
+            if not station_names:
+                continue
+            if sno != current:
+                current, tested = sno, set()
+            step_info = parse_step(os0_value)
+            for station_name in station_names:
+                if station_name not in tested:
+                    # 该sno在本工站的第一次测试
+                    tested.add(station_name)
+                    totals[station_name] += 1
+                    if is_io_pass(io_value):
+                        firstpass[station_name] += 1
+                if step_info is not None:
+                    failures[station_name][step_info] += 1
+        self._sno, self._tested = current, tested
+
+    # 两阶段读取的失败计数与行的顺序无关
+    feed_steps = ProjectAnalyzer.feed_steps
+
+    def station_counts(self):
+        """工站 -> (一次通过sno数, sno总数)"""
+        return {name: (self.firstpass[name], self.totals[name]) for name in self.station_plan.names}
+
+    def result(self, project, startdate, enddate):
+        fpy = {}
+        for station_name, (firstpass_count, total_count) in self.station_counts().items():
+            if station_name in self.station_plan.empty or not total_count:
+                fpy[station_name] = 0.0
+            else:
+                fpy[station_name] = firstpass_count / total_count
+        return AnalysisResult(project, startdate, enddate, fpy, self.failures, self.row_count)
+
+class EarliestAttemptAnalyzer:
+    """不要求数据有序的first_attempt分析器：记住每个工站每个sno最早一次测试的timestamp和是否通过，
+    新数据里更早的测试会替换已记住的结果；供实时监控增量合并，内存与序列号数量有关"""
+
+    def __init__(self, station_plan):
+        self.station_plan = station_plan
+        self.first = {name: {} for name in station_plan.names}    # 工站 -> sno -> (timestamp, 是否通过)
+        self.failures = {name: Counter() for name in station_plan.names}
+        self.row_count = 0
+
+    def feed(self, rows):
+        batch = as_batch(rows)
+        count = len(batch)
+        route = self.station_plan.route
+        parse_step = self.station_plan.step_parser
+        first = self.first
+        failures = self.failures
+        self.row_count += count
+        os0_values = batch.get('os0') or repeat(None, count)
+        for traceid, test, sno, io_value, os0_value, timestamp in zip(
+                batch.get('traceid'), batch.get('test'), batch.get('sno'), batch.get('io'), os0_values,
+                batch.get('timestamp')):
+            station_names = route(traceid, test)
+            if not station_names:
+                continue
+            step_info = parse_step(os0_value)
+            for station_name in station_names:
+                seen = first[station_name].get(sno)
+                if seen is None or timestamp < seen[0]:
+                    first[station_name][sno] = (timestamp, is_io_pass(io_value))
+                if step_info is not None:
+                    failures[station_name][step_info] += 1
+
+    feed_steps = ProjectAnalyzer.feed_steps
+
+    def merge(self, other):
+        """合并另一个分析器（同一工站计划）的部分结果"""
+        for station_name, attempts in other.first.items():
+            first = self.first[station_name]
+            for sno, attempt in attempts.items():
+                seen = first.get(sno)
+                if seen is None or attempt[0] < seen[0]:
+                    first[sno] = attempt
+        for station_name, step_counter in other.failures.items():
+            self.failures[station_name].update(step_counter)
+        self.row_count += other.row_count
+
+    def station_counts(self):
+        """工站 -> (一次通过sno数, sno总数)"""
+        return {name: (sum(passed for _, passed in attempts.values()), len(attempts))
+                for name, attempts in self.first.items()}
+
+    result = FirstAttemptAnalyzer.result
+
+# 一次通过的判定方式：single为在工站只测试过一次且通过；first_attempt为按timestamp的第一次测试通过
+FIRST_PASS_DEFINITIONS = ('single', 'first_attempt')
+# first_attempt按sno分组流式计算，需要数据按sno, timestamp排序；sno按二进制排序，与feed中的!=比较一致
+SNO_ORDER = ('sno', 'timestamp')
+
+def first_pass_definition(project_stations):
+    definition = project_stations.get('first_pass', 'single').strip() or 'single'
+    if definition not in FIRST_PASS_DEFINITIONS:
+        raise FPYError(f"first_pass必须为{'/'.join(FIRST_PASS_DEFINITIONS)}，当前为{definition}")
+    return definition
+
+class VariantAnalyzer:
+    """按变种号(artno)细分的分析器：与项目分析器在同一次扫描中接收数据，每批按artno拆分后交给各变种号的分析器
+    相当于工站×变种号的累加器，额外开销为每批一次拆分和一次累加，与变种号数量无关"""
+
+    def __init__(self, station_plan, analyzer_type=ProjectAnalyzer):
+        self.station_plan = station_plan
+        self.analyzer_type = analyzer_type    # 各变种号的分析器类型
+        self.analyzers = {}                   # artno -> 分析器
+        self.row_count = 0
+
+    def _analyzer(self, artno):
+        analyzer = self.analyzers.get(artno)
+        if analyzer is None:
+            analyzer = self.analyzers[artno] = self.analyzer_type(self.station_plan)
+        return analyzer
+
+    def feed(self, rows):
+        batch = as_batch(rows)
+        self.row_count += len(batch)
+        for artno, rows_of_artno in batch.split_by('artno').items():
+            self._analyzer(artno).feed(rows_of_artno)
+
+    def feed_steps(self, rows):
+        # 两阶段读取的第二阶段也读取artno
+        for artno, rows_of_artno in as_batch(rows).split_by('artno').items():
+            self._analyzer(artno).feed_steps(rows_of_artno)
+
+    def merge(self, other):
+        for artno, analyzer in other.analyzers.items():
+            self._analyzer(artno).merge(analyzer)
+        self.row_count += other.row_count
+
+    def results(self, project, startdate, enddate):
+        """artno -> AnalysisResult，按artno排序；变种号没有测试过的工站不在fpy中"""
+        results = {}
+        for artno in sorted(self.analyzers, key=str):
+            analyzer = self.analyzers[artno]
+            result = analyzer.result(project, startdate, enddate)
+            for station_name, (_, total_count) in analyzer.station_counts().items():
+                if not total_count and station_name not in self.station_plan.empty:
+                    del result.fpy[station_name]
+            results[artno] = result
+        return results
+
+def variant_table(result):
+    """工站×变种号的FPY表格行（表头、各工站FPY、数据行数），变种号未测试的工站显示为-"""
+    variants = result.variants
+    table = [["工站"] + [str(artno) for artno in variants]]
+    for station_name in result.fpy:
+        table.append([station_name] + [format_rate(variant.fpy[station_name]) if station_name in variant.fpy else "-"
+                                       for variant in variants.values()])
+    table.append(["数据行数"] + [str(variant.row_count) for variant in variants.values()])
+    return table
+
+def variant_failure_lines(result, n=5):
+    """各变种号有失败数据的工站的失败步骤TOP n"""
+    lines = []
+    for artno, variant in result.variants.items():
+        lines.append(f"{artno}:")
+        for station_name in variant.failures:
+            top_steps = variant.top_failures(station_name, n)
+            if top_steps:
+                lines.append(f"  {station_name}: {'; '.join(f'{step}, {count}' for step, count in top_steps)}")
+    return lines
+
+# ---------------------- 多进程分片引擎（engine=process） ----------------------
+class ShardAnalyzer(ProjectAnalyzer):
+    """分片子进程中的分析器：与Python引擎相同，另外记录每个失败步骤在各工站第一次出现时的timestamp，
+    主进程合并各分片的失败计数时按它排序，TOP5并列时与Python引擎、服务端聚合的顺序一致"""
+
+    def __init__(self, station_plan):
+        super().__init__(station_plan)
+        self.first_seen = {name: {} for name in station_plan.names}   # 工站 -> {失败步骤: 第一次出现的timestamp}
+
+    def feed(self, rows):
+        batch = as_batch(rows)
+        known = {name: len(step_counter) for name, step_counter in self.failures.items()}
+        super().feed(batch)
+        self._note_first_seen(batch, known)
+
+    def feed_steps(self, rows):
+        batch = as_batch(rows)
+        known = {name: len(step_counter) for name, step_counter in self.failures.items()}
+        super().feed_steps(batch)
+        self._note_first_seen(batch, known)
+
+    def _note_first_seen(self, batch, known):
+        """本批出现新的失败步骤时再扫描一遍本批，记下它们第一次出现的timestamp；多数批次没有新步骤，不扫描"""
+        new_steps = {name: set(islice(step_counter, known[name], None))
+                     for name, step_counter in self.failures.items() if len(step_counter) > known[name]}
+        if not new_steps:
+            return
+        route = self.station_plan.route
+        steps = batch.get('step')
+        if steps is None:
+            steps = map(self.station_plan.step_parser, batch.get('os0') or repeat(None, len(batch)))
+        for traceid, test, step_info, timestamp in zip(batch.get('traceid'), batch.get('test'), steps,
+                                                       batch.get('timestamp')):
+            if step_info is None:
+                continue
+            for station_name in route(traceid, test):
+                if step_info in new_steps.get(station_name, ()):
+                    self.first_seen[station_name].setdefault(step_info, timestamp)
+
+    def summary(self):
+        """发回主进程的部分结果：各工站(一次通过sno数, sno总数)和{失败步骤: (次数, 第一次出现的timestamp)}"""
+        return {
+            'row_count': self.row_count,
+            'stations': self.station_counts(),
+            'failures': {name: {step_info: (step_count, self.first_seen[name][step_info])
+                                for step_info, step_count in step_counter.items()}
+                         for name, step_counter in self.failures.items()},
+        }
+
+def shard_worker(station_plan, by_artno, shard, workers, query, results):
+    """分片子进程：用自己的连接只查询CRC32(sno) % workers == shard的序列号并计算部分结果
+    每个sno只落在一个分片，分片的sno数和一次通过数可直接相加；by_artno=True时同时按变种号细分
+    结果、进度和警告都通过results发回主进程"""
+    global _connection_pools_lock
+    # fork出的子进程继承了主进程连接池中的连接，套接字与主进程共用，不能关闭也不能复用，只丢弃引用
+    _connection_pools.clear()
+    _connection_pools_lock = threading.Lock()
+    try:
+        with warnings_to(lambda message: results.put(('warning', shard, message))):
+            analyzer = ShardAnalyzer(station_plan)
+            analyzers = [analyzer]
+            if by_artno:
+                variant_analyzer = VariantAnalyzer(station_plan, ShardAnalyzer)
+                analyzers.append(variant_analyzer)
+            feed_lc_data(analyzers, query['env_file'], query['startdate'], query['enddate'], query['table_name'],
+                         query['batch_size'], query['explain'] and shard == 0, query['fetch_mode'],
+                         query['two_phase'], lambda row_count: results.put(('rows', shard, row_count)),
+                         sample=(workers, shard), extra_columns=('timestamp',))
+        summary = analyzer.summary()
+        if by_artno:
+            summary['variants'] = {artno: variant.summary() for artno, variant in variant_analyzer.analyzers.items()}
+        results.put(('result', shard, summary))
+    except FPYError as e:
+        results.put(('error', shard, e))
+    except Exception as e:
+        results.put(('error', shard, FPYError(f"分片{shard}计算出错：{type(e).__name__}: {e}")))
+    finally:
+        close_connection_pools()
+
+DEFAULT_PROCESS_WORKERS = os.cpu_count() or 1
+SHARD_POLL_SECONDS = 0.5    # 主进程等待分片消息的间隔，每次超时检查取消和子进程是否还在运行
+
+def merge_shard_summaries(station_plan, summaries):
+    """合并各分片的部分结果，返回(fpy, failures, 各工站sno总数)
+    失败步骤按第一次出现的timestamp（相同时按步骤的UTF-8字节）依次填入Counter"""
+    fpy = {}
+    failures = {}
+    totals = {}
+    for station_name in station_plan.names:
+        firstpass_count = sum(summary['stations'][station_name][0] for summary in summaries)
+        totals[station_name] = total_count = sum(summary['stations'][station_name][1] for summary in summaries)
+        if station_name in station_plan.empty:
+            fpy[station_name] = 0.0
+        else:
+            fpy[station_name] = firstpass_count / total_count if total_count else 0.0
+        merged = {}
+        for summary in summaries:
+            for step_info, (step_count, first_seen) in summary['failures'][station_name].items():
+                if step_info in merged:
+                    merged[step_info] = (merged[step_info][0] + step_count, min(merged[step_info][1], first_seen))
+                else:
+                    merged[step_info] = (step_count, first_seen)
+        order = sorted(merged, key=lambda step: (merged[step][1], str(step).encode('utf-8')))
+        failures[station_name] = Counter({step_info: merged[step_info][0] for step_info in order})
+    return fpy, failures, totals
+
+class ShardedAnalyzer:
+    """多进程分析器（engine=process）：按CRC32(sno)分为workers片，每个子进程用自己的连接只查询本分片的序列号，
+    读取、解析和累加都在子进程中完成，主进程只合并各工站的汇总数，不接触数据行
+    by_artno=True时各子进程同时按变种号细分，主进程按变种号合并
+    子进程异常退出时抛出FPYError，不会一直等待；取消时结束子进程，其查询随连接断开由MySQL终止"""
+
+    def __init__(self, station_plan, workers=DEFAULT_PROCESS_WORKERS, by_artno=False):
+        self.station_plan = station_plan
+        self.workers = max(1, workers)
+        self.by_artno = by_artno
+        self.row_count = 0
+        self.summaries = []
+
+    def run(self, env_file, startdate, enddate, table_name, batch_size=DEFAULT_BATCH_SIZE, explain=False,
+            fetch_mode='buffered', two_phase=False, on_batch=None, cancel_token=None):
+        """启动子进程并等待全部分片完成，返回读取的行数"""
+        import multiprocessing
+        import queue
+        query = {'env_file': env_file, 'startdate': startdate, 'enddate': enddate, 'table_name': table_name,
+                 'batch_size': batch_size, 'explain': explain, 'fetch_mode': fetch_mode, 'two_phase': two_phase}
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=shard_worker,
+                                             args=(self.station_plan, self.by_artno, shard, self.workers, query,
+                                                   results),
+                                             daemon=True)
+                     for shard in range(self.workers)]
+        summaries = {}
+        rows_fetched = [0] * self.workers
+        try:
+            for process in processes:
+                process.start()
+            suspect = set()    # 上次等待超时时已退出但还没有结果的分片
+            while len(summaries) < self.workers:
+                try:
+                    kind, shard, payload = results.get(timeout=SHARD_POLL_SECONDS)
+                except queue.Empty:
+                    if cancel_token:
+                        cancel_token.check()
+                    # 子进程退出前会把消息写完，再等一轮仍没有结果说明它异常退出了
+                    dead = {shard for shard, process in enumerate(processes)
+                            if shard not in summaries and not process.is_alive()}
+                    if dead & suspect:
+                        shard = min(dead & suspect)
+                        raise FPYError(f"分片子进程{shard}异常退出（退出码{processes[shard].exitcode}），"
+                                       f"未返回计算结果")
+                    suspect = dead
+                    continue
+                if kind == 'rows':
+                    rows_fetched[shard] = payload
+                    if on_batch:
+                        on_batch(sum(rows_fetched))
+                elif kind == 'warning':
+                    show_warning(payload)
+                elif kind == 'error':
+                    raise payload
+                else:
+                    summaries[shard] = payload
+                if cancel_token:
+                    cancel_token.check()
+        finally:
+            # 正常结束时子进程已发回结果、即将退出；出错或取消时直接结束其余子进程
+            finished = len(summaries) == self.workers
+            for process in processes:
+                if finished and process.is_alive():
+                    process.join(SHARD_POLL_SECONDS)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            results.close()
+        self.summaries = [summaries[shard] for shard in range(self.workers)]
+        self.row_count = sum(summary['row_count'] for summary in self.summaries)
+        return self.row_count
+
+    def result(self, project, startdate, enddate):
+        fpy, failures, _ = merge_shard_summaries(self.station_plan, self.summaries)
+        return AnalysisResult(project, startdate, enddate, fpy, failures, self.row_count)
+
+    def variant_results(self, project, startdate, enddate):
+        """与VariantAnalyzer.results相同：artno -> AnalysisResult，按artno排序；变种号没有测试过的工站不在fpy中"""
+        variants = {}
+        for summary in self.summaries:
+            for artno, variant_summary in summary['variants'].items():
+                variants.setdefault(artno, []).append(variant_summary)
+        results = {}
+        for artno in sorted(variants, key=str):
+            fpy, failures, totals = merge_shard_summaries(self.station_plan, variants[artno])
+            for station_name, total_count in totals.items():
+                if not total_count and station_name not in self.station_plan.empty:
+                    del fpy[station_name]
+            results[artno] = AnalysisResult(project, startdate, enddate, fpy, failures,
+                                            sum(summary['row_count'] for summary in variants[artno]))
+        return results
+
+ENGINES = ('python', 'process', 'server')
+
+def analyzer_for(station_plan, project_stations, engine=None):
+    """按项目配置创建分析器"""
+    return make_analyzer(station_plan, engine or project_stations.get('engine', 'python'))
+
+def make_analyzer(station_plan, engine='python'):
+    """按引擎创建在本进程中逐批计算的分析器；engine=process由ShardedAnalyzer在子进程中查询和计算，不经过这里"""
+    if engine not in ENGINES:
+        show_warning(f"不支持的引擎{engine}，改用Python引擎计算")
+    return ProjectAnalyzer(station_plan)
+
+PARTITIONS = ('day', 'week')
+DEFAULT_FETCH_WORKERS = 4    # 分区并行查询时同时使用的连接数，同一数据库还受连接池大小限制
+
+def feed_lc_data(analyzers, env_file, startdate, enddate, table_name, batch_size=DEFAULT_BATCH_SIZE, explain=False,
+                 fetch_mode='buffered', two_phase=False, on_batch=None, cancel_token=None, partition=None,
+                 fetch_workers=DEFAULT_FETCH_WORKERS, sample=None, order_by=None, extra_columns=()):
+    """读取LC数据交给各分析器，返回读取的行数；每批后调用on_batch(已读取行数)
+    two_phase=True时第一阶段不读os0，第二阶段只读有失败步骤的行并在服务端截取步骤
+    partition为day/week时按天/周拆分日期范围，用fetch_workers个连接并行查询后合并
+    sample=(modulus, remainder)时只读取抽样的序列号；order_by为第一阶段数据的排序字段
+    extra_columns为两个阶段都额外读取的字段"""
+    ranges = partition_ranges(startdate, enddate, partition)
+    # 按sno排序的分析器依赖全局顺序，不能按分区合并，不拆分
+    if len(ranges) > 1 and fetch_workers > 1 and all(hasattr(analyzer, 'merge') for analyzer in analyzers):
+        return feed_lc_partitions(analyzers, env_file, ranges, table_name, batch_size, explain, fetch_mode,
+                                  two_phase, on_batch, cancel_token, fetch_workers, sample, extra_columns)
+    row_count = 0
+    columns = (FPY_COLUMNS if two_phase else LC_COLUMNS) + tuple(extra_columns)
+    for rows in iter_lc_rows(env_file, startdate, enddate, table_name, batch_size, explain, fetch_mode, columns,
+                             cancel_token, sample=sample, order_by=order_by):
+        with span('aggregate') as record:
+            for analyzer in analyzers:
+                analyzer.feed(rows)
+            if record is not None:
+                record['rows'] = len(rows)
+        row_count += len(rows)
+        if on_batch:
+            on_batch(row_count)
+        if cancel_token:
+            cancel_token.check()
+    if two_phase and row_count:
+        columns = step_columns([analyzer.station_plan for analyzer in analyzers])
+        if any(isinstance(analyzer, VariantAnalyzer) for analyzer in analyzers):
+            columns += ('artno',)
+        columns += tuple(extra_columns)
+        for rows in iter_lc_rows(env_file, startdate, enddate, table_name, batch_size, False, fetch_mode,
+                                 columns, cancel_token, failure_steps=True, sample=sample):
+            with span('aggregate_steps') as record:
+                for analyzer in analyzers:
+                    analyzer.feed_steps(rows)
+                if record is not None:
+                    record['rows'] = len(rows)
+            if cancel_token:
+                cancel_token.check()
+    return row_count
+
+def partition_ranges(startdate, enddate, partition=None):
+    """把[startdate, enddate]拆分为按天或按ISO周的闭区间列表；partition为空时不拆分"""
+    if not partition:
+        return [(startdate, enddate)]
+    if partition not in PARTITIONS:
+        raise FPYError(f"partition必须为{'/'.join(PARTITIONS)}，当前为{partition}")
+    ranges = {}
+    for day in iter_days(startdate, enddate):
+        label = bucket_label(day, partition)
+        ranges[label] = (ranges[label][0], day) if label in ranges else (day, day)
+    return list(ranges.values())
+
+def partition_options(project_stations):
+    """读取项目的分区并行查询配置：(partition, fetch_workers)"""
+    partition = project_stations.get('partition', '').strip() or None
+    return partition, max(1, project_stations.getint('fetch_workers', fallback=DEFAULT_FETCH_WORKERS))
+
+def feed_lc_partitions(analyzers, env_file, ranges, table_name, batch_size=DEFAULT_BATCH_SIZE, explain=False,
+                       fetch_mode='buffered', two_phase=False, on_batch=None, cancel_token=None,
+                       fetch_workers=DEFAULT_FETCH_WORKERS, sample=None, extra_columns=()):
+    """按日期分区并行读取：每个分区用各自的连接查询，交给各自的一组分析器，全部完成后按日期顺序合并
+    累加器按sno记录测试次数和是否通过，跨分区复测的序列号合并后次数相加，FPY与不分区时一致"""
+    warning_handler = getattr(_warning_context, 'handler', None)
+    trace = current_trace()
+    rows_fetched = [0] * len(ranges)
+    lock = threading.Lock()
+
+    def run_partition(index):
+        def partition_progress(row_count):
+            if on_batch:
+                with lock:
+                    rows_fetched[index] = row_count
+                    on_batch(sum(rows_fetched))
+        partial = [type(analyzer)(analyzer.station_plan) for analyzer in analyzers]
+        range_start, range_end = ranges[index]
+        with warnings_to(warning_handler), trace_activated(trace):
+            # 查询计划只需检查一次
+            row_count = feed_lc_data(partial, env_file, range_start, range_end, table_name, batch_size,
+                                     explain and index == 0, fetch_mode, two_phase, partition_progress, cancel_token,
+                                     sample=sample, extra_columns=extra_columns)
+        return partial, row_count
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(fetch_workers, len(ranges))) as executor:
+        futures = [executor.submit(run_partition, index) for index in range(len(ranges))]
+        try:
+            partials = [future.result() for future in futures]
+        except BaseException:
+            # 一个分区出错或被取消时，未开始的分区不再查询
+            for future in futures:
+                future.cancel()
+            raise
+    with span('merge'):
+        for partial, _ in partials:
+            for analyzer, partial_analyzer in zip(analyzers, partial):
+                analyzer.merge(partial_analyzer)
+    return sum(row_count for _, row_count in partials)
+
+def get_project_stations(project):
+    """返回项目的工站配置和env_file，配置缺失时抛出FPYError"""
+    stations_config = load_stations_config()    # 从.ini文件加载工站配置
+    
+    # 检查项目是否在配置文件中
+    if project not in stations_config:
+        raise FPYError(f"配置文件中未找到项目{project}的工站配置")
+    
+    # 从配置文件中获取env_file
+    project_stations = stations_config[project]        # 获取该项目的所有工站配置
+    env_file = project_stations.get('env_file')
+    if not env_file:
+        raise FPYError(f"配置文件中未找到项目{project}的env_file配置")
+    return project_stations, env_file
+
+#定义分析引擎：一次查询、一次遍历同时计算FPY和失败步骤
+def analyze_project(project, startdate, enddate, engine=None, fetch_mode=None, batch_size=None, use_cache=None,
+                    progress=None, cancel_token=None, by_artno=None):
+    """分析一个项目；progress(已读取行数)报告进度，cancel_token可取消分析
+    by_artno=True时在同一次扫描中按变种号细分，结果在AnalysisResult.variants中
+    配置或数据库错误抛出FPYError，取消时抛出AnalysisCancelled"""
+    project_stations, env_file = get_project_stations(project)
+
+    station_plan = get_station_plan(project)   # 预编译的traceid/test到工站的索引，配置文件未修改时直接复用
+
+    # engine=server时在MySQL端完成聚合，只取回各工站汇总数
+    engine = engine or project_stations.get('engine', 'python')
+    if use_cache is None:
+        use_cache = project_stations.getboolean('cache', fallback=False)
+    # first_attempt按sno排序流式计算，只用Python累加
+    first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+    if first_attempt and (engine != 'python' or use_cache):
+        show_warning(f"项目{project}按首次测试判断一次通过（first_pass=first_attempt），不使用engine={engine}和本地缓存")
+        engine, use_cache = 'python', False
+    if by_artno is None:
+        by_artno = project_stations.getboolean('by_artno', fallback=False)
+    # 服务端聚合和本地缓存只有工站汇总，按变种号细分需要逐行扫描；多进程分片在各子进程中细分
+    if by_artno and (engine == 'server' or use_cache):
+        show_warning(f"项目{project}按变种号细分，不使用engine=server和本地缓存")
+        engine = 'python' if engine == 'server' else engine
+        use_cache = False
+    if engine == 'server' and station_plan.step_parser.sql is None:
+        show_warning(f"项目{project}的step_patterns无法在MySQL中截取，改用Python引擎计算")
+        engine = 'python'
+    if engine == 'server':
+        return analyze_project_on_server(project, startdate, enddate, env_file, project_stations, station_plan,
+                                         progress, cancel_token)
+
+    if engine == 'process' and not use_cache:
+        workers = project_stations.getint('process_workers', fallback=DEFAULT_PROCESS_WORKERS)
+        analyzer = ShardedAnalyzer(station_plan, workers, by_artno)
+    elif first_attempt:
+        analyzer = FirstAttemptAnalyzer(station_plan)
+    else:
+        analyzer = analyzer_for(station_plan, project_stations, engine)
+    analyzers = [analyzer]
+    if by_artno and not isinstance(analyzer, ShardedAnalyzer):
+        variant_analyzer = VariantAnalyzer(station_plan, FirstAttemptAnalyzer if first_attempt else ProjectAnalyzer)
+        analyzers.append(variant_analyzer)
+    table_name = project_stations.get('table_name')
+    explain = project_stations.getboolean('explain_check', fallback=False)
+    # buffered：一次性从LC数据库获取符合条件的数据；stream：流式逐批更新累加器，不在内存中保留全部数据行
+    # first_attempt总是流式读取，内存不随数据量增长
+    fetch_mode = 'stream' if first_attempt else fetch_mode or project_stations.get('fetch_mode', 'buffered')
+    batch_size = batch_size or project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+    if use_cache:
+        # 按天缓存的部分聚合结果只支持Python引擎的累加器
+        analyzer = analyze_with_day_cache(project, project_stations, station_plan, startdate, enddate,
+                                          fetch_mode, batch_size, explain, progress=progress, cancel_token=cancel_token)
+    else:
+        two_phase = project_stations.getboolean('two_phase_fetch', fallback=False)
+        partition, fetch_workers = partition_options(project_stations)
+        def on_batch(row_count):
+            if progress:
+                progress(row_count)
+        if isinstance(analyzer, ShardedAnalyzer):
+            # 各子进程按CRC32(sno)分片各自查询，已经是并行查询，不再按日期分区
+            analyzer.run(env_file, startdate, enddate, table_name, batch_size, explain, fetch_mode, two_phase,
+                         on_batch, cancel_token)
+        else:
+            feed_lc_data(analyzers, env_file, startdate, enddate, table_name, batch_size, explain, fetch_mode,
+                         two_phase, on_batch, cancel_token, partition, fetch_workers,
+                         order_by=SNO_ORDER if first_attempt else None)
+
+    if not analyzer.row_count:
+        return AnalysisResult(project, startdate, enddate, {}, {}, 0)
+    with span('result'):
+        result = analyzer.result(project, startdate, enddate)
+        if isinstance(analyzer, ShardedAnalyzer) and by_artno:
+            result.variants = analyzer.variant_results(project, startdate, enddate)
+        elif by_artno:
+            result.variants = variant_analyzer.results(project, startdate, enddate)
+    if progress:
+        progress(analyzer.row_count)
+    return result
+
+# ---------------------- 本地按天缓存：历史日期的部分聚合结果 ----------------------
+DEFAULT_CACHE_FILE = "fpy_cache.sqlite"
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024   # 缓存数据超过该大小时淘汰最久未使用的天
+
+def encode_cache_value(value):
+    """缓存JSON中不能直接表示的sno/失败步骤取值：bytes和Decimal带类型标记保存，读回后与未缓存时相等
+    其它类型抛出TypeError，该次结果不写入缓存"""
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    raise TypeError(f"缓存不支持{type(value).__name__}类型的取值：{value!r}")
+
+def decode_cache_value(obj):
+    """json.loads的object_hook，还原encode_cache_value标记的取值"""
+    if len(obj) == 1:
+        if '$bytes' in obj:
+            return base64.b64decode(obj['$bytes'])
+        if '$decimal' in obj:
+            return Decimal(obj['$decimal'])
+    return obj
+
+class DayCache:
+    """SQLite缓存：按(项目, 表, 天)保存ProjectAnalyzer的部分结果
+    station_key记录工站配置，配置修改后旧缓存自动失效"""
+
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS day_aggregates (
+                    project TEXT, table_name TEXT, day TEXT, station_key TEXT,
+                    payload BLOB, size INTEGER, last_used REAL,
+                    PRIMARY KEY (project, table_name, day))""")
+
+    def _connect(self):
+        import sqlite3
+        return sqlite3.connect(self.cache_file)
+
+    def load(self, project, table_name, station_key, days):
+        """返回{天: 部分结果}，只包含配置一致的已缓存天"""
+        states = {}
+        with self._connect() as connection:
+            for day, payload in connection.execute(
+                    "SELECT day, payload FROM day_aggregates WHERE project = ? AND table_name = ? AND station_key = ?",
+                    (project, table_name, station_key)):
+                if day in days:
+                    states[day] = json.loads(zlib.decompress(payload), object_hook=decode_cache_value)
+            if states:
+                connection.executemany(
+                    "UPDATE day_aggregates SET last_used = ? WHERE project = ? AND table_name = ? AND day = ?",
+                    [(time.time(), project, table_name, day) for day in states])
+        return states
+
+    def store(self, project, table_name, station_key, day_states):
+        """保存各天的部分结果，并按大小淘汰；含无法原样还原的取值时不写入缓存，下次重新查询"""
+        now = time.time()
+        records = []
+        for day, state in day_states.items():
+            try:
+                data = json.dumps(state, ensure_ascii=False, default=encode_cache_value)
+            except TypeError as e:
+                show_warning(f"项目{project}的数据{e}，本次结果不写入本地缓存")
+                return
+            payload = zlib.compress(data.encode('utf-8'))
+            records.append((project, table_name, day, station_key, payload, len(payload), now))
+        with self._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO day_aggregates VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+        self.evict()
+
+    def evict(self):
+        """缓存总大小超过max_bytes时，按最近使用时间从旧到新删除"""
+        with self._connect() as connection:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM day_aggregates").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            stale = []
+            for project, table_name, day, size in connection.execute(
+                    "SELECT project, table_name, day, size FROM day_aggregates ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                stale.append((project, table_name, day))
+                total -= size
+            connection.executemany(
+                "DELETE FROM day_aggregates WHERE project = ? AND table_name = ? AND day = ?", stale)
+
+    def invalidate(self, project=None):
+        """清除指定项目（默认全部项目）的缓存"""
+        with self._connect() as connection:
+            if project is None:
+                connection.execute("DELETE FROM day_aggregates")
+            else:
+                connection.execute("DELETE FROM day_aggregates WHERE project = ?", (project,))
+
+def invalidate_cache(project=None, cache_file=DEFAULT_CACHE_FILE):
+    """清除本地FPY缓存"""
+    DayCache(cache_file).invalidate(project)
+
+def station_config_key(project_stations):
+    """工站配置的摘要，配置变化后缓存失效"""
+    items = [(name, project_stations[name]) for name in project_stations if name not in NON_STATION_KEYS]
+    # 失败步骤格式影响缓存的失败计数
+    if project_stations.get('step_patterns'):
+        items.append(('step_patterns', list(make_step_parser(project_stations.get('step_patterns')).patterns)))
+    return hashlib.sha1(json.dumps(items).encode('utf-8')).hexdigest()
+
+def iter_days(start_date, end_date):
+    """返回[start_date, end_date]内的每一天（yyyy-mm-dd）"""
+    day = date.fromisoformat(start_date)
+    last = date.fromisoformat(end_date)
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+def group_consecutive_days(days):
+    """把有序的天列表合并为连续区间[(开始, 结束)]，每个区间一次查询"""
+    ranges = []
+    for day in days:
+        if ranges and date.fromisoformat(ranges[-1][1]) + timedelta(days=1) == date.fromisoformat(day):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(day_range) for day_range in ranges]
+
+def analyze_with_day_cache(project, project_stations, station_plan, startdate, enddate,
+                           fetch_mode='buffered', batch_size=DEFAULT_BATCH_SIZE, explain=False, cache=None,
+                           progress=None, cancel_token=None):
+    """历史日期从本地缓存读取，只查询缺失的天和今天，返回合并后的ProjectAnalyzer"""
+    import pymysql
+    cache = cache or DayCache()
+    env_file = project_stations.get('env_file')
+    table_name = project_stations.get('table_name')
+    station_key = station_config_key(project_stations)
+    today = date.today().isoformat()
+    days = list(iter_days(startdate, enddate))
+
+    analyzer = ProjectAnalyzer(station_plan)
+    with span('cache'):
+        cached_states = cache.load(project, table_name, station_key, set(day for day in days if day < today))
+        for day in days:
+            if day in cached_states:
+                analyzer.load_state(cached_states[day])
+
+    # 缺失的天按连续区间查询，结果按天分桶，历史日期写入缓存（今天的数据仍在变化，不缓存）
+    two_phase = project_stations.getboolean('two_phase_fetch', fallback=False)
+    missing_days = [day for day in days if day not in cached_states]
+    for range_start, range_end in group_consecutive_days(missing_days):
+        day_analyzers = {day: ProjectAnalyzer(station_plan) for day in iter_days(range_start, range_end)}
+
+        def feed_by_day(columns, failure_steps=False):
+            for rows in read_lc_batches(env_file, range_start, range_end, table_name, fetch_mode, batch_size,
+                                        explain and not failure_steps, columns + ('timestamp',), cancel_token,
+                                        failure_steps):
+                with span('aggregate_steps' if failure_steps else 'aggregate') as record:
+                    for day, rows_of_day in rows.split_by_day().items():
+                        if day in day_analyzers:
+                            if failure_steps:
+                                day_analyzers[day].feed_steps(rows_of_day)
+                            else:
+                                day_analyzers[day].feed(rows_of_day)
+                    if record is not None:
+                        record['rows'] = len(rows)
+                if progress:
+                    progress(analyzer.row_count + sum(a.row_count for a in day_analyzers.values()))
+                if cancel_token:
+                    cancel_token.check()
+
+        try:
+            if two_phase:
+                feed_by_day(FPY_COLUMNS)
+                feed_by_day(step_columns([station_plan]), failure_steps=True)
+            else:
+                feed_by_day(LC_COLUMNS)
+        except pymysql.MySQLError as e:
+            # 查询失败的区间不写缓存
+            raise_mysql_error(e, table_name, cancel_token)
+        with span('cache'):
+            cache.store(project, table_name, station_key,
+                        {day: day_analyzer.to_state() for day, day_analyzer in day_analyzers.items() if day < today})
+        for day_analyzer in day_analyzers.values():
+            analyzer.merge(day_analyzer)
+    return analyzer
+
+def analyze_project_on_server(project, startdate, enddate, env_file, project_stations, station_plan,
+                              progress=None, cancel_token=None):
+    """服务端聚合引擎：结果与Python引擎一致"""
+    aggregates = query_lc_aggregates(env_file, startdate, enddate, project_stations.get('table_name'), station_plan,
+                                     cancel_token)
+    station_totals, station_failures, row_count = aggregates
+    if not row_count:
+        return AnalysisResult(project, startdate, enddate, {}, {}, 0)
+
+    fpy = {}
+    failures = {}
+    for station_name in station_plan.names:
+        firstpass_count, total_count = station_totals.get(station_name, (0, 0))
+        fpy[station_name] = firstpass_count / total_count if total_count else 0.0
+        failures[station_name] = station_failures.get(station_name, Counter())
+    if progress:
+        progress(row_count)
+    return AnalysisResult(project, startdate, enddate, fpy, failures, row_count)
+
+# ---------------------- 抽样预览：按序列号的CRC32抽样，给出置信区间 ----------------------
+DEFAULT_SAMPLE_MODULUS = 20    # 预览默认抽取1/20的序列号
+CONFIDENCE_Z = 1.96            # 95%置信水平
+
+def wilson_interval(successes, total, z=CONFIDENCE_Z):
+    """比例的Wilson置信区间，样本少或比例接近0/1时比正态近似可靠"""
+    if not total:
+        return 0.0, 1.0
+    rate = successes / total
+    denominator = 1 + z * z / total
+    centre = (rate + z * z / (2 * total)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+def analyze_preview(project, startdate, enddate, modulus=DEFAULT_SAMPLE_MODULUS, remainder=0, fetch_mode=None,
+                    batch_size=None, progress=None, cancel_token=None):
+    """抽样预览：只读取CRC32(sno) % modulus == remainder的序列号，每个序列号的全部测试记录都在样本中，
+    一次通过按完整记录判断；FPY附带95%置信区间，失败步骤按样本计数排名"""
+    if modulus < 1 or not 0 <= remainder < modulus:
+        raise FPYError(f"抽样参数无效：modulus={modulus}, remainder={remainder}")
+    project_stations, env_file = get_project_stations(project)
+    station_plan = get_station_plan(project)
+    fetch_mode = fetch_mode or project_stations.get('fetch_mode', 'buffered')
+    batch_size = batch_size or project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+    explain = project_stations.getboolean('explain_check', fallback=False)
+    two_phase = project_stations.getboolean('two_phase_fetch', fallback=False)
+    # 样本只有1/modulus，用Python累加器直接取得各工站的序列号数
+    first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+    analyzer = FirstAttemptAnalyzer(station_plan) if first_attempt else ProjectAnalyzer(station_plan)
+    def on_batch(row_count):
+        if progress:
+            progress(row_count)
+    feed_lc_data([analyzer], env_file, startdate, enddate, project_stations.get('table_name'), batch_size, explain,
+                 'stream' if first_attempt else fetch_mode, two_phase, on_batch, cancel_token,
+                 sample=(modulus, remainder), order_by=SNO_ORDER if first_attempt else None)
+    if not analyzer.row_count:
+        return AnalysisResult(project, startdate, enddate, {}, {}, 0, sample_modulus=modulus)
+    with span('result'):
+        result = analyzer.result(project, startdate, enddate)
+        result.sample_modulus = modulus
+        result.intervals = {}
+        for station_name, (firstpass_count, total_count) in analyzer.station_counts().items():
+            if station_name not in station_plan.empty:
+                result.intervals[station_name] = wilson_interval(firstpass_count, total_count)
+    if progress:
+        progress(analyzer.row_count)
+    return result
+
+def preview_note(result):
+    """抽样预览结果的说明行，精确结果返回None"""
+    if not result.sample_modulus:
+        return None
+    return f"抽样预览：1/{result.sample_modulus}的序列号，括号内为95%置信区间，失败次数为样本计数"
+
+def format_station_rate(result, station_name):
+    """工站FPY的显示文本，抽样预览时附带置信区间"""
+    text = format_rate(result.fpy[station_name])
+    if station_name in result.intervals:
+        low, high = result.intervals[station_name]
+        text += f" ({low*100:.2f}%~{high*100:.2f}%)"
+    return text
+
+# ---------------------- 实时监控：按高水位增量读取新数据 ----------------------
+DEFAULT_LIVE_REFRESH_SECONDS = 60
+
+class LiveMonitor:
+    """实时监控：记住已读取数据的高水位（live_id_column配置的自增id，未配置时为timestamp），
+    每次刷新只读取高水位之后的新行，在已有的累加器和失败计数上增量更新，查询量只与新行数有关"""
+
+    def __init__(self, project, startdate):
+        project_stations, self.env_file = get_project_stations(project)
+        self.project = project
+        self.startdate = startdate
+        self.table_name = project_stations.get('table_name')
+        self.fetch_mode = project_stations.get('fetch_mode', 'buffered')
+        self.batch_size = project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+        self.refresh_seconds = project_stations.getint('live_refresh_seconds', fallback=DEFAULT_LIVE_REFRESH_SECONDS)
+        self.mark_column = project_stations.get('live_id_column', '').strip() or 'timestamp'
+        if not self.mark_column.isidentifier():
+            raise FPYError(f"live_id_column必须为字段名，当前为{self.mark_column}")
+        # first_attempt的新行不一定晚于已读取的同一sno的行，按timestamp取最早一次测试
+        self.first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+        self.analyzer_type = EarliestAttemptAnalyzer if self.first_attempt else ProjectAnalyzer
+        self.analyzer = self.analyzer_type(get_station_plan(project))
+        self.mark = None           # 已读取数据的高水位
+        self._boundary = Counter()    # 按timestamp监控时，timestamp等于高水位的已读取行 -> 行数
+        self.new_rows = 0          # 最近一次刷新读取的新行数
+        self.refreshed_at = None
+
+    def _new_rows(self, batch, mark, boundary, skip):
+        """按timestamp监控时跳过上次已读取的、timestamp等于高水位的行；返回新行及更新后的高水位
+        完全相同的行按个数跳过：skip为还需跳过的已读取行 -> 行数，之后插入的相同行仍计入"""
+        marks = batch.get(self.mark_column)
+        if self.mark_column != 'timestamp':
+            # 自增id严格递增，查询条件已排除读过的行
+            top = max(marks, default=None)
+            return batch, top if mark is None or (top is not None and top > mark) else mark, boundary
+        keep = []
+        for index, row_key in enumerate(zip(*(batch.data[name] for name in batch.columns))):
+            row_mark = marks[index]
+            if row_mark == self.mark and skip[row_key]:
+                skip[row_key] -= 1
+                continue
+            keep.append(index)
+            if mark is None or row_mark > mark:
+                mark, boundary = row_mark, Counter({row_key: 1})
+            elif row_mark == mark:
+                boundary[row_key] += 1
+        return (batch if len(keep) == len(batch) else batch.take(keep)), mark, boundary
+
+    def refresh(self, progress=None, cancel_token=None):
+        """读取高水位之后的新行并返回最新结果；出错或取消时已有结果和高水位不变"""
+        delta = self.analyzer_type(self.analyzer.station_plan)
+        mark, boundary, skip = self.mark, Counter(self._boundary), Counter(self._boundary)
+        since = None if self.mark is None else (self.mark_column, self.mark)
+        enddate = max(date.today().isoformat(), self.startdate)
+        extra_columns = (self.mark_column, 'timestamp') if self.first_attempt else (self.mark_column,)
+        columns = LC_COLUMNS + tuple(column for column in dict.fromkeys(extra_columns) if column not in LC_COLUMNS)
+        for rows in iter_lc_rows(self.env_file, self.startdate, enddate, self.table_name, self.batch_size, False,
+                                 self.fetch_mode, columns, cancel_token, since=since):
+            rows, mark, boundary = self._new_rows(rows, mark, boundary, skip)
+            with span('aggregate'):
+                delta.feed(rows)
+            if progress:
+                progress(self.analyzer.row_count + delta.row_count)
+            if cancel_token:
+                cancel_token.check()
+        # 全部新行读取完成后才并入结果
+        self.analyzer.merge(delta)
+        self.mark, self._boundary = mark, boundary
+        self.new_rows = delta.row_count
+        self.refreshed_at = datetime.now()
+        if not self.analyzer.row_count:
+            return AnalysisResult(self.project, self.startdate, enddate, {}, {}, 0)
+        with span('result'):
+            return self.analyzer.result(self.project, self.startdate, enddate)
+
+# ---------------------- FPY趋势：一次查询按天/ISO周分桶 ----------------------
+TREND_BUCKETS = ('day', 'week')
+
+def bucket_label(day, bucket):
+    """把YYYY-MM-DD转换为分桶标签：按天为日期本身，按周为ISO年-周数（周数与WeekQuery的isocalendar()一致）"""
+    if bucket == 'week':
+        iso_year, iso_week, _ = date.fromisoformat(day).isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    return day
+
+class TrendResult:
+    """FPY趋势：每个时间桶一个AnalysisResult，一次通过按桶内的数据计算（与逐天/逐周点击计算一致）"""
+
+    def __init__(self, project, startdate, enddate, bucket, station_names, results):
+        self.project = project
+        self.startdate = startdate
+        self.enddate = enddate
+        self.bucket = bucket                # 'day'或'week'
+        self.station_names = station_names  # 按配置顺序的工站名
+        self.results = results              # 桶标签 -> AnalysisResult，按时间顺序
+
+    @property
+    def buckets(self):
+        return list(self.results)
+
+    @property
+    def row_count(self):
+        return sum(result.row_count for result in self.results.values())
+
+    def matrix(self):
+        """工站×时间桶的FPY矩阵：[(工站名, [各桶FPY，无数据的桶为None])]"""
+        return [(station_name, [result.fpy.get(station_name) if result.row_count else None
+                                for result in self.results.values()])
+                for station_name in self.station_names]
+
+def analyze_trend(project, startdate, enddate, bucket='day', engine=None, fetch_mode=None, batch_size=None,
+                  progress=None, cancel_token=None):
+    """一次查询整个日期范围，按天或ISO周分桶计算各工站FPY；趋势只算FPY，不读取os0
+    progress(已读取行数)报告进度"""
+    if bucket not in TREND_BUCKETS:
+        raise FPYError(f"不支持的趋势分桶方式：{bucket}")
+    project_stations, env_file = get_project_stations(project)
+    station_plan = get_station_plan(project)
+    # 服务端聚合不分桶、多进程引擎不按桶区分，趋势只用Python引擎
+    if engine and engine != 'python':
+        show_warning(f"趋势只使用Python引擎，忽略engine={engine}")
+    # first_attempt按sno, timestamp排序流式读取，每个桶内按桶内的第一次测试判断
+    first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+    fetch_mode = 'stream' if first_attempt else fetch_mode or project_stations.get('fetch_mode', 'buffered')
+    batch_size = batch_size or project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+    explain = project_stations.getboolean('explain_check', fallback=False)
+
+    # 范围内的每个桶都输出，没有数据的桶显示为空
+    day_labels = {day: bucket_label(day, bucket) for day in iter_days(startdate, enddate)}
+    analyzers = {label: FirstAttemptAnalyzer(station_plan) if first_attempt else ProjectAnalyzer(station_plan)
+                 for label in dict.fromkeys(day_labels.values())}
+    row_count = 0
+    for rows in iter_lc_rows(env_file, startdate, enddate, project_stations.get('table_name'), batch_size, explain,
+                             fetch_mode, FPY_COLUMNS + ('timestamp',), cancel_token,
+                             order_by=SNO_ORDER if first_attempt else None):
+        with span('aggregate') as record:
+            for day, rows_of_day in rows.split_by_day().items():
+                label = day_labels.get(day)
+                if label is not None:
+                    analyzers[label].feed(rows_of_day)
+            if record is not None:
+                record['rows'] = len(rows)
+        row_count += len(rows)
+        if progress:
+            progress(row_count)
+        if cancel_token:
+            cancel_token.check()
+
+    results = {}
+    with span('result'):
+        for label, analyzer in analyzers.items():
+            if analyzer.row_count:
+                results[label] = analyzer.result(project, startdate, enddate)
+            else:
+                results[label] = AnalysisResult(project, startdate, enddate, {}, {}, 0)
+    if progress:
+        progress(row_count)
+    return TrendResult(project, startdate, enddate, bucket, list(station_plan.names), results)
+
+def format_rate(rate):
+    """FPY显示为百分比，保留方式与结果输出框一致"""
+    return f"{round(round(rate, 4)*100,4)}%"
+
+def trend_table(trend):
+    """趋势矩阵的表格行（表头、各工站FPY、数据行数），供界面显示和导出共用"""
+    table = [["工站"] + trend.buckets]
+    for station_name, rates in trend.matrix():
+        table.append([station_name] + ["-" if rate is None else format_rate(rate) for rate in rates])
+    table.append(["数据行数"] + [str(result.row_count) for result in trend.results.values()])
+    return table
+
+def format_trend_text(trend):
+    """趋势矩阵的文本，列之间用制表符分隔，可直接粘贴到Excel"""
+    lines = [f"{trend.project}：", f"日期范围: [{trend.startdate}] 至 [{trend.enddate}]", ""]
+    lines.extend("\t".join(row) for row in trend_table(trend))
+    return "\n".join(lines)
+
+def write_trend_csv(trend, file_path):
+    """把趋势矩阵导出为CSV（utf-8-sig编码，Excel直接打开不乱码）"""
+    import csv
+    with open(file_path, "w", encoding="utf-8-sig", newline="") as f:
+        csv.writer(f).writerows(trend_table(trend))
+
+# ---------------------- 逐件直通率：sno -> 各工站一次通过位图 ----------------------
+DEFAULT_ROLLED_MAX_SERIALS = 2_000_000    # 一遍扫描在内存中索引的sno上限，超过时按CRC32(sno)分片多遍扫描
+DEFAULT_ESCAPED_LIMIT = 1000              # 结果中列出的未一次通过序列号数量上限
+
+class RolledYieldOverflow(Exception):
+    """一遍扫描的sno数超过上限，需要增加分片数"""
+
+class RolledYieldAnalyzer:
+    """逐件直通率：每个sno一个整数位图，低位为到过的工站，中间为未一次通过的工站，高位为变种号编码
+    sno在到过的全部工站都一次通过才算直通；内存只与sno数量有关，超过max_serials时抛出RolledYieldOverflow"""
+
+    def __init__(self, station_plan, first_attempt=False, max_serials=DEFAULT_ROLLED_MAX_SERIALS):
+        self.station_plan = station_plan
+        self.first_attempt = first_attempt    # True时按首次测试判断，数据需按sno, timestamp排序
+        self.max_serials = max_serials
+        self.station_bits = {name: 1 << i for i, name in enumerate(station_plan.names)}
+        self.fail_shift = len(station_plan.names)
+        self.artno_shift = 2 * len(station_plan.names)
+        self.states = {}           # sno -> 位图
+        self.artno_index = {}      # artno -> 编码
+        self._pair_bits = {}       # (traceid, test) -> 所属工站的位
+        self.row_count = 0
+
+    def _bits(self, traceid, test):
+        bits = self._pair_bits.get((traceid, test))
+        if bits is None:
+            bits = 0
+            for station_name in self.station_plan.route(traceid, test):
+                bits |= self.station_bits[station_name]
+            self._pair_bits[(traceid, test)] = bits
+        return bits
+
+    def feed(self, rows):
+        batch = as_batch(rows)
+        self.row_count += len(batch)
+        states = self.states
+        artno_index = self.artno_index
+        fail_shift = self.fail_shift
+        artno_shift = self.artno_shift
+        first_attempt = self.first_attempt
+        pair_bits = self._pair_bits
+        for artno, sno, traceid, test, io_value in zip(batch.get('artno'), batch.get('sno'), batch.get('traceid'),
+                                                       batch.get('test'), batch.get('io')):
+            bits = pair_bits.get((traceid, test))
+            if bits is None:
+                bits = self._bits(traceid, test)
+            if not bits:
+                continue
+            state = states.get(sno)
+            if state is None:
+                artno_code = artno_index.setdefault(artno, len(artno_index))
+                state = artno_code << artno_shift
+            new_bits = bits & ~state    # 第一次到这些工站
+            failed = 0 if is_io_pass(io_value) else new_bits
+            if not first_attempt:
+                # 一次通过要求只测试一次，复测的工站记为未一次通过
+                failed |= bits & state
+            states[sno] = state | bits | (failed << fail_shift)
+        if len(states) > self.max_serials:
+            raise RolledYieldOverflow()
+
+    def summarize(self, result, escaped_limit=DEFAULT_ESCAPED_LIMIT):
+        """把本遍的位图汇总到result，之后可释放位图"""
+        station_mask = (1 << self.fail_shift) - 1
+        artnos = list(self.artno_index)
+        names = self.station_plan.names
+        for sno, state in self.states.items():
+            artno = artnos[state >> self.artno_shift]
+            failed = (state >> self.fail_shift) & station_mask
+            result.add_unit(artno, not failed)
+            if failed:
+                result.escaped_count += 1
+                if len(result.escaped) < escaped_limit:
+                    result.escaped.append((sno, artno, [name for i, name in enumerate(names) if failed >> i & 1]))
+        result.row_count += self.row_count
+
+class RolledYieldResult:
+    """逐件直通率结果：直通的sno数/sno总数，按变种号(artno)细分，以及未一次通过的序列号"""
+
+    def __init__(self, project, startdate, enddate):
+        self.project = project
+        self.startdate = startdate
+        self.enddate = enddate
+        self.unit_count = 0
+        self.pass_count = 0
+        self.by_artno = {}        # artno -> [直通sno数, sno总数]
+        self.escaped = []         # [(sno, artno, 未一次通过的工站列表)]，最多DEFAULT_ESCAPED_LIMIT个
+        self.escaped_count = 0
+        self.row_count = 0
+        self.partitions = 1       # 实际使用的sno分片数
+
+    def add_unit(self, artno, passed):
+        counts = self.by_artno.setdefault(artno, [0, 0])
+        counts[1] += 1
+        self.unit_count += 1
+        if passed:
+            counts[0] += 1
+            self.pass_count += 1
+
+    def rolled_yield(self):
+        return self.pass_count / self.unit_count if self.unit_count else 0.0
+
+def analyze_rolled_yield(project, startdate, enddate, max_serials=None, progress=None, cancel_token=None):
+    """逐件直通率：sno在到过的每个工站都一次通过的比例，按变种号细分并列出未一次通过的序列号
+    先查询sno数预估分片数，sno数超过max_serials时按CRC32(sno) % 分片数拆成多遍扫描，每遍只索引一部分sno，内存有上限
+    progress(已读取行数, 已完成分片数, 分片数)报告进度"""
+    project_stations, env_file = get_project_stations(project)
+    station_plan = get_station_plan(project)
+    table_name = project_stations.get('table_name')
+    first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+    if max_serials is None:
+        max_serials = project_stations.getint('rolled_max_serials', fallback=DEFAULT_ROLLED_MAX_SERIALS)
+    batch_size = project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+    explain = project_stations.getboolean('explain_check', fallback=False)
+    serial_count = count_lc_serials(env_file, startdate, enddate, table_name, cancel_token)
+    partitions = 1
+    while serial_count > partitions * max_serials:
+        partitions *= 2
+    # 待扫描的分片(分片数, 余数)；CRC32分片不完全均匀，某片超过上限时只把这一片拆成两片重扫，已完成的分片保留
+    pending = [(partitions, remainder) for remainder in range(partitions)]
+    result = RolledYieldResult(project, startdate, enddate)
+    rows_done = 0
+    partitions_done = 0
+    while pending:
+        modulus, remainder = pending.pop(0)
+        analyzer = RolledYieldAnalyzer(station_plan, first_attempt, max_serials)
+        def on_batch(row_count):
+            if progress:
+                progress(rows_done + row_count, partitions_done, partitions_done + len(pending) + 1)
+        try:
+            feed_lc_data([analyzer], env_file, startdate, enddate, table_name,
+                         batch_size, explain and rows_done == 0, 'stream', False, on_batch, cancel_token,
+                         sample=(modulus, remainder) if modulus > 1 else None,
+                         order_by=SNO_ORDER if first_attempt else None)
+        except RolledYieldOverflow:
+            # CRC32(sno) % modulus == remainder的sno正好是% (2 * modulus)余remainder和remainder + modulus的两片
+            pending[:0] = [(2 * modulus, remainder), (2 * modulus, remainder + modulus)]
+            rows_done += analyzer.row_count
+            continue
+        with span('result'):
+            analyzer.summarize(result)
+        rows_done += analyzer.row_count
+        partitions_done += 1
+    result.partitions = partitions_done
+    return result
+
+def rolled_yield_lines(result):
+    """总体及各变种号的逐件直通率"""
+    lines = [f"逐件直通率: {format_rate(result.rolled_yield())} ({result.pass_count}/{result.unit_count})"]
+    for artno, (pass_count, unit_count) in sorted(result.by_artno.items(), key=lambda item: str(item[0])):
+        lines.append(f"  {artno}: {format_rate(pass_count / unit_count)} ({pass_count}/{unit_count})")
+    return lines
+
+def escaped_lines(result):
+    """未一次通过的序列号：sno、变种号、未一次通过的工站，以制表符分隔"""
+    lines = [f"未一次通过的序列号: {result.escaped_count}"]
+    for sno, artno, station_names in result.escaped:
+        lines.append(f"{sno}\t{artno}\t{','.join(station_names)}")
+    if result.escaped_count > len(result.escaped):
+        lines.append(f"...仅列出前{len(result.escaped)}个")
+    return lines
+
+def format_rolled_text(result):
+    """逐件直通率的命令行文本"""
+    lines = [f"{result.project}：", f"日期范围: [{result.startdate}] 至 [{result.enddate}]", ""]
+    if not result.unit_count:
+        lines.append("未计算出直通率数据，请检查数据库配置或日期范围")
+    else:
+        lines += rolled_yield_lines(result) + [""] + escaped_lines(result)
+    return "\n".join(lines)
+
+# ---------------------- 环比对比：两个日期范围一次查询 ----------------------
+class ComparisonResult:
+    """两个日期范围的对比：上期和本期各一个AnalysisResult"""
+
+    def __init__(self, project, base_range, current_range, station_names, base, current):
+        self.project = project
+        self.base_range = base_range          # 上期(开始日期, 结束日期)
+        self.current_range = current_range    # 本期(开始日期, 结束日期)
+        self.station_names = station_names    # 按配置顺序的工站名
+        self.base = base
+        self.current = current
+
+    @property
+    def row_count(self):
+        return self.base.row_count + self.current.row_count
+
+    def fpy_deltas(self):
+        """[(工站名, 上期FPY, 本期FPY, 变化)]，没有数据的一期FPY和变化为None"""
+        deltas = []
+        for station_name in self.station_names:
+            base_rate = self.base.fpy.get(station_name) if self.base.row_count else None
+            current_rate = self.current.fpy.get(station_name) if self.current.row_count else None
+            delta = None if base_rate is None or current_rate is None else current_rate - base_rate
+            deltas.append((station_name, base_rate, current_rate, delta))
+        return deltas
+
+    def failure_changes(self, station_name, n=5):
+        """本期失败步骤TOP n及其排名变化：[(步骤, 本期排名, 上期排名或None, 本期次数, 上期次数)]"""
+        base_steps = self.base.failures.get(station_name, Counter())
+        base_rank = {step: rank for rank, (step, _) in enumerate(base_steps.most_common(), 1)}
+        return [(step, rank, base_rank.get(step), count, base_steps.get(step, 0))
+                for rank, (step, count) in enumerate(self.current.top_failures(station_name, n), 1)]
+
+    def failure_movers(self, station_name, n=5):
+        """次数变化最大的n个失败步骤：[(步骤, 上期次数, 本期次数, 变化)]"""
+        base_steps = self.base.failures.get(station_name, Counter())
+        current_steps = self.current.failures.get(station_name, Counter())
+        changes = {step: current_steps.get(step, 0) - base_steps.get(step, 0)
+                   for step in dict.fromkeys([*current_steps, *base_steps])}
+        movers = heapq.nlargest(n, (item for item in changes.items() if item[1]), key=lambda item: abs(item[1]))
+        return [(step, base_steps.get(step, 0), current_steps.get(step, 0), change) for step, change in movers]
+
+def analyze_comparison(project, base_range, current_range, engine=None, fetch_mode=None, batch_size=None,
+                       progress=None, cancel_token=None):
+    """上期与本期对比：两个日期范围在一次查询中读取，SQL按范围给每行标上period，按period分别累加
+    progress(已读取行数)报告进度；两个范围不能重叠"""
+    for startdate, enddate in (base_range, current_range):
+        if startdate > enddate:
+            raise FPYError(f"开始日期不能晚于结束日期：{startdate} 至 {enddate}")
+    if base_range[0] <= current_range[1] and current_range[0] <= base_range[1]:
+        raise FPYError("对比的两个日期范围不能重叠")
+    project_stations, env_file = get_project_stations(project)
+    station_plan = get_station_plan(project)
+    first_attempt = first_pass_definition(project_stations) == 'first_attempt'
+    # 服务端聚合和多进程引擎不按范围区分，对比只用Python引擎
+    if engine and engine != 'python':
+        show_warning(f"环比对比只使用Python引擎，忽略engine={engine}")
+    fetch_mode = 'stream' if first_attempt else fetch_mode or project_stations.get('fetch_mode', 'buffered')
+    batch_size = batch_size or project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE)
+    explain = project_stations.getboolean('explain_check', fallback=False)
+
+    periods = [base_range, current_range]
+    analyzers = [FirstAttemptAnalyzer(station_plan) if first_attempt else ProjectAnalyzer(station_plan)
+                 for _ in periods]
+    row_count = 0
+    for rows in iter_lc_rows(env_file, min(base_range[0], current_range[0]), max(base_range[1], current_range[1]),
+                             project_stations.get('table_name'), batch_size, explain, fetch_mode, LC_COLUMNS,
+                             cancel_token, order_by=SNO_ORDER if first_attempt else None, periods=periods):
+        with span('aggregate') as record:
+            for period, rows_of_period in rows.split_by('period').items():
+                analyzers[period].feed(rows_of_period)
+            if record is not None:
+                record['rows'] = len(rows)
+        row_count += len(rows)
+        if progress:
+            progress(row_count)
+        if cancel_token:
+            cancel_token.check()
+
+    results = []
+    with span('result'):
+        for (startdate, enddate), analyzer in zip(periods, analyzers):
+            if analyzer.row_count:
+                results.append(analyzer.result(project, startdate, enddate))
+            else:
+                results.append(AnalysisResult(project, startdate, enddate, {}, {}, 0))
+    if progress:
+        progress(row_count)
+    return ComparisonResult(project, base_range, current_range, list(station_plan.names), *results)
+
+def previous_period(startdate, enddate):
+    """紧接在[startdate, enddate]之前、天数相同的日期范围（如本周对应上周）"""
+    start, end = date.fromisoformat(startdate), date.fromisoformat(enddate)
+    days = end - start + timedelta(days=1)
+    return (start - days).isoformat(), (end - days).isoformat()
+
+def format_delta(delta):
+    """FPY变化显示为带符号的百分点"""
+    return f"{round(delta*100, 2):+}%"
+
+def comparison_table(comparison):
+    """上期、本期FPY及变化并列的表格行"""
+    base_start, base_end = comparison.base_range
+    current_start, current_end = comparison.current_range
+    table = [["工站", f"上期 {base_start}~{base_end}", f"本期 {current_start}~{current_end}", "变化"]]
+    for station_name, base_rate, current_rate, delta in comparison.fpy_deltas():
+        table.append([station_name, "-" if base_rate is None else format_rate(base_rate),
+                      "-" if current_rate is None else format_rate(current_rate),
+                      "-" if delta is None else format_delta(delta)])
+    table.append(["数据行数", str(comparison.base.row_count), str(comparison.current.row_count), ""])
+    return table
+
+def rank_change(rank, base_rank, n=5):
+    """本期排名相对上期的变化：上期不在TOP n时为新进"""
+    if base_rank is None or base_rank > n:
+        return "新进"
+    if base_rank == rank:
+        return "-"
+    return f"↑{base_rank - rank}" if base_rank > rank else f"↓{rank - base_rank}"
+
+def comparison_failure_lines(comparison, n=5):
+    """各工站本期失败TOP n（附上期次数和排名变化）及次数变化最大的步骤"""
+    lines = []
+    station_names = [name for name in comparison.station_names
+                     if comparison.base.failures.get(name) or comparison.current.failures.get(name)]
+    for station_name in station_names:
+        lines.append(f"{station_name}:")
+        for step, rank, base_rank, count, base_count in comparison.failure_changes(station_name, n):
+            lines.append(f"  {rank}. {step}, {count} (上期 {base_count}，{rank_change(rank, base_rank, n)})")
+        movers = comparison.failure_movers(station_name, n)
+        if movers:
+            lines.append("  变化最大: " + "; ".join(f"{step}, {change:+}" for step, _, _, change in movers))
+    return lines
+
+def format_comparison_text(comparison):
+    """环比对比的命令行文本"""
+    lines = [f"{comparison.project}：", ""]
+    if not comparison.row_count:
+        lines.append("未计算出FPY数据，请检查数据库配置或日期范围")
+        return "\n".join(lines)
+    lines.extend("\t".join(row) for row in comparison_table(comparison))
+    lines += ["", "测试失败TOP5对比:"] + comparison_failure_lines(comparison)
+    return "\n".join(lines)
+
+# ---------------------- 全部项目并行计算 ----------------------
+DEFAULT_PROJECT_WORKERS = 4    # 同时计算的项目（查询）数
+
+def fetch_settings(project_stations):
+    """决定如何读取数据的项目配置；只有这些配置都相同的项目才共用一次查询"""
+    partition, fetch_workers = partition_options(project_stations)
+    return (project_stations.get('fetch_mode', 'buffered'),
+            project_stations.getint('batch_size', fallback=DEFAULT_BATCH_SIZE),
+            project_stations.getboolean('explain_check', fallback=False),
+            project_stations.getboolean('two_phase_fetch', fallback=False),
+            partition, fetch_workers)
+
+def analyze_project_group(projects, startdate, enddate, progress=None, cancel_token=None, engine=None):
+    """env_file、table_name和读取配置（fetch_settings）都相同的多个项目共用一次查询，每批数据分别交给各项目的分析器"""
+    stations_config = load_stations_config()
+    first_stations = stations_config[projects[0]]
+    analyzers = {project: analyzer_for(get_station_plan(project), stations_config[project], engine) for project in projects}
+    # 分组时已保证同组项目的读取配置一致
+    fetch_mode, batch_size, explain, two_phase, partition, fetch_workers = fetch_settings(first_stations)
+    def on_batch(row_count):
+        if progress:
+            progress(row_count)
+    feed_lc_data(list(analyzers.values()), first_stations.get('env_file'), startdate, enddate,
+                 first_stations.get('table_name'), batch_size, explain, fetch_mode, two_phase, on_batch,
+                 cancel_token, partition, fetch_workers)
+
+    results = {}
+    with span('result'):
+        for project, analyzer in analyzers.items():
+            if analyzer.row_count:
+                results[project] = analyzer.result(project, startdate, enddate)
+            else:
+                results[project] = AnalysisResult(project, startdate, enddate, {}, {}, 0)
+    return results
+
+def analyze_all_projects(startdate, enddate, max_workers=DEFAULT_PROJECT_WORKERS, on_result=None, progress=None,
+                         cancel_token=None, engine=None):
+    """用有界线程池并行计算配置文件中的全部项目
+    同一env_file/table_name且读取配置相同的项目合并为一次查询，连接按env_file从连接池共享
+    每个项目完成时调用on_result(AnalysisResult)，progress(已读取行数, 已完成项目数, 项目总数)报告进度
+    engine不为空时覆盖各项目配置的engine
+    返回{项目: AnalysisResult}，顺序与配置文件一致"""
+    stations_config = load_stations_config()
+    projects = stations_config.sections()
+
+    # 服务端聚合、多进程分片、使用缓存、按首次测试判断一次通过或按变种号细分的项目单独计算，
+    # 其余按数据表和读取配置分组
+    groups = {}
+    for project in projects:
+        project_stations = stations_config[project]
+        if (not project_stations.get('env_file') or (engine or project_stations.get('engine')) in ('server', 'process')
+                or project_stations.getboolean('cache', fallback=False)
+                or project_stations.get('first_pass', 'single') != 'single'
+                or project_stations.getboolean('by_artno', fallback=False)):
+            groups[(project,)] = [project]
+        else:
+            group_key = (project_stations.get('env_file'), project_stations.get('table_name'),
+                         fetch_settings(project_stations))
+            groups.setdefault(group_key, []).append(project)
+
+    # 线程池中的线程沿用调用方线程的警告转交方式和运行计时
+    warning_handler = getattr(_warning_context, 'handler', None)
+    trace = current_trace()
+    rows_fetched = {}
+    lock = threading.Lock()
+
+    def run_group(group_key, group_projects):
+        def group_progress(row_count, *_):
+            if progress:
+                with lock:
+                    rows_fetched[group_key] = row_count
+                    progress(sum(rows_fetched.values()), len(results), len(projects))
+        with warnings_to(warning_handler), trace_activated(trace):
+            try:
+                if len(group_projects) == 1:
+                    return {group_projects[0]: analyze_project(group_projects[0], startdate, enddate, engine=engine,
+                                                               progress=group_progress, cancel_token=cancel_token)}
+                return analyze_project_group(group_projects, startdate, enddate, group_progress, cancel_token, engine)
+            except FPYError as e:
+                # 一个项目出错不影响其它项目，错误随结果返回
+                return {project: AnalysisResult(project, startdate, enddate, {}, {}, 0, error=str(e))
+                        for project in group_projects}
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_group, group_key, group_projects) for group_key, group_projects in groups.items()]
+        try:
+            for future in as_completed(futures):
+                for project, result in future.result().items():
+                    results[project] = result
+                    if on_result:
+                        on_result(result)
+                if progress:
+                    with lock:
+                        progress(sum(rows_fetched.values()), len(results), len(projects))
+        except BaseException:
+            # 被取消时，未开始的项目不再计算
+            for future in futures:
+                future.cancel()
+            raise
+    return {project: results.get(project) for project in projects}
+
+#定义从LC取数据自动计算FPY的函数
+def calculate_each_project_FPY(project,startdate, enddate):
+    result = analyze_project(project, startdate, enddate)
+    if not result.row_count:
+        return
+    return result.fpy
+
+def extract_failure_info(project, startdate, enddate):
+    result = analyze_project(project, startdate, enddate)
+    if not result.row_count:
+        return None
+    return {station_name: dict(step_counter) for station_name, step_counter in result.failures.items()}
+
+# ---------------------- 命令行：定时任务/CI中不启动界面直接计算 ----------------------
+def total_fpy(result):
+    """各工站FPY（保留4位小数）连乘的总通过率，与界面显示一致"""
+    totally_result = 1.0
+    for rate in result.fpy.values():
+        totally_result *= round(rate, 4)
+    return round(totally_result, 4)
+
+def result_to_dict(result):
+    """AnalysisResult转换为可序列化为JSON的字典"""
+    data = {
+        'project': result.project,
+        'startdate': result.startdate,
+        'enddate': result.enddate,
+        'row_count': result.row_count,
+        'fpy': {station_name: round(rate, 4) for station_name, rate in result.fpy.items()},
+        'totally': total_fpy(result) if result.row_count else None,
+        'top_failures': {station_name: [[step, count] for step, count in result.top_failures(station_name)]
+                         for station_name in result.failures},
+    }
+    if result.sample_modulus:
+        data['sample_modulus'] = result.sample_modulus
+        data['intervals'] = {station_name: [round(low, 4), round(high, 4)]
+                             for station_name, (low, high) in result.intervals.items()}
+    if result.variants:
+        data['variants'] = {}
+        for artno, variant in result.variants.items():
+            variant_data = result_to_dict(variant)
+            data['variants'][str(artno)] = {key: variant_data[key] for key in ('row_count', 'fpy', 'top_failures')}
+    if result.error:
+        data['error'] = result.error
+    return data
+
+def format_result_text(result):
+    """按界面输出框的格式生成文本"""
+    lines = [f"{result.project}：", f"日期范围: [{result.startdate}] 至 [{result.enddate}]", ""]
+    if result.error:
+        lines.append(result.error)
+    elif not result.row_count:
+        lines.append("未计算出FPY数据，请检查数据库配置或日期范围")
+    else:
+        if result.sample_modulus:
+            lines += [preview_note(result), ""]
+        for station_name in result.fpy:
+            lines.append(f"{station_name}: {format_station_rate(result, station_name)}")
+        lines.append(f"Totally: {round(total_fpy(result)*100,4)}%")
+        lines.append("")
+        lines.append("测试失败TOP5:")
+        for station_name in result.failures:
+            top_steps = result.top_failures(station_name)
+            step_str = "; ".join([f"{step}, {count}" for step, count in top_steps]) if top_steps else "无失败数据"
+            lines.append(f"{station_name}: {step_str}")
+        if result.variants:
+            lines += ["", "按变种号细分:"]
+            lines.extend("\t".join(row) for row in variant_table(result))
+            lines += ["", "各变种号测试失败TOP5:"] + variant_failure_lines(result)
+    return "\n".join(lines)
+
+def main(argv=None):
+    """命令行入口，返回进程退出码"""
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog="FPYEngine", description="按stations_config.ini计算LC数据的一次通过率")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--project', help="项目名（stations_config.ini中的节名）")
+    target.add_argument('--all', action='store_true', help="计算配置文件中的全部项目")
+    target.add_argument('--invalidate-cache', action='store_true', help="清除本地按天缓存（可配合--cache-project）")
+    parser.add_argument('--cache-project', help="只清除指定项目的缓存")
+    parser.add_argument('--from', dest='startdate', help="开始日期，YYYY-MM-DD")
+    parser.add_argument('--to', dest='enddate', help="结束日期，YYYY-MM-DD")
+    parser.add_argument('--format', choices=('text', 'json', 'csv'), default='text', help="输出格式（csv只用于--trend）")
+    parser.add_argument('--engine', choices=ENGINES, help="覆盖配置文件中的engine")
+    parser.add_argument('--trend', choices=TREND_BUCKETS, help="按天(day)或ISO周(week)输出FPY趋势矩阵，需配合--project")
+    parser.add_argument('--trace', action='store_true', help=f"把各阶段耗时写入{TRACE_LOG_FILE}并输出到stderr")
+    parser.add_argument('--rolled', action='store_true', help="计算逐件直通率（按变种号细分，列出未一次通过的序列号），需配合--project")
+    parser.add_argument('--compare', action='store_true',
+                        help="与上期对比（--from/--to为本期），两期一次查询，需配合--project")
+    parser.add_argument('--compare-from', help="上期开始日期，默认为本期之前天数相同的范围")
+    parser.add_argument('--compare-to', help="上期结束日期")
+    parser.add_argument('--by-artno', action='store_true', help="同一次扫描中按变种号(artno)细分FPY和失败TOP5，需配合--project")
+    parser.add_argument('--preview', type=int, nargs='?', const=DEFAULT_SAMPLE_MODULUS, metavar='N',
+                        help=f"抽样预览：只计算1/N的序列号并给出置信区间（默认N={DEFAULT_SAMPLE_MODULUS}），需配合--project")
+    args = parser.parse_args(argv)
+    if args.trace:
+        set_tracing(True)
+
+    if args.invalidate_cache:
+        invalidate_cache(args.cache_project)
+        return 0
+    if not args.startdate or not args.enddate:
+        parser.error("--from和--to必须同时指定")
+    try:
+        startdate = date.fromisoformat(args.startdate).isoformat()
+        enddate = date.fromisoformat(args.enddate).isoformat()
+    except ValueError as e:
+        parser.error(f"日期格式错误：{e}")
+    if startdate > enddate:
+        parser.error("开始日期不能晚于结束日期！")
+    if args.trend:
+        if not args.project:
+            parser.error("--trend需要配合--project使用")
+        return trend_main(args, startdate, enddate)
+    if args.format == 'csv':
+        parser.error("csv格式只用于--trend")
+    if args.preview is not None and not args.project:
+        parser.error("--preview需要配合--project使用")
+    if args.by_artno and not args.project:
+        parser.error("--by-artno需要配合--project使用")
+    if args.rolled:
+        if not args.project:
+            parser.error("--rolled需要配合--project使用")
+        return rolled_main(args, startdate, enddate)
+    if args.compare:
+        if not args.project:
+            parser.error("--compare需要配合--project使用")
+        if bool(args.compare_from) != bool(args.compare_to):
+            parser.error("--compare-from和--compare-to必须同时指定")
+        if args.compare_from:
+            try:
+                base_range = (date.fromisoformat(args.compare_from).isoformat(),
+                              date.fromisoformat(args.compare_to).isoformat())
+            except ValueError as e:
+                parser.error(f"日期格式错误：{e}")
+        else:
+            base_range = previous_period(startdate, enddate)
+        return compare_main(args, base_range, (startdate, enddate))
+
+    try:
+        if args.all:
+            with traced_run('all_projects', startdate=startdate, enddate=enddate):
+                results = [result for result in analyze_all_projects(startdate, enddate, engine=args.engine).values()
+                           if result is not None]
+        elif args.preview is not None:
+            if args.engine:
+                show_warning(f"抽样预览只使用Python引擎，忽略--engine {args.engine}")
+            with traced_run('preview', project=args.project, startdate=startdate, enddate=enddate):
+                results = [analyze_preview(args.project, startdate, enddate, args.preview)]
+        else:
+            with traced_run('project', project=args.project, startdate=startdate, enddate=enddate):
+                results = [analyze_project(args.project, startdate, enddate, engine=args.engine,
+                                           by_artno=args.by_artno or None)]
+    except FPYError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        close_connection_pools()
+        print_trace(args.trace)
+
+    if args.format == 'json':
+        data = [result_to_dict(result) for result in results]
+        print(json.dumps(data if args.all else data[0], ensure_ascii=False, indent=2))
+    else:
+        print("\n\n".join(format_result_text(result) for result in results))
+    # 全部项目模式下任一项目出错时退出码为1
+    return 1 if any(result.error for result in results) else 0
+
+def print_trace(enabled):
+    """--trace时把本次运行的各阶段耗时输出到stderr，不影响stdout中的结果"""
+    import sys
+    trace = last_run_trace()
+    if enabled and trace is not None:
+        print(trace.breakdown_text(), file=sys.stderr)
+
+def trend_main(args, startdate, enddate):
+    """命令行趋势模式"""
+    import sys
+    try:
+        with traced_run('trend', project=args.project, startdate=startdate, enddate=enddate, bucket=args.trend):
+            trend = analyze_trend(args.project, startdate, enddate, args.trend, engine=args.engine)
+    except FPYError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        close_connection_pools()
+        print_trace(args.trace)
+    if args.format == 'json':
+        data = {
+            'project': trend.project,
+            'startdate': trend.startdate,
+            'enddate': trend.enddate,
+            'bucket': trend.bucket,
+            'buckets': trend.buckets,
+            'row_counts': [result.row_count for result in trend.results.values()],
+            'fpy': {station_name: [None if rate is None else round(rate, 4) for rate in rates]
+                    for station_name, rates in trend.matrix()},
+        }
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    elif args.format == 'csv':
+        import csv
+        csv.writer(sys.stdout).writerows(trend_table(trend))
+    else:
+        print(format_trend_text(trend))
+    return 0
+
+def rolled_main(args, startdate, enddate):
+    """命令行逐件直通率模式"""
+    import sys
+    if args.engine:
+        show_warning(f"逐件直通率只使用Python引擎，忽略--engine {args.engine}")
+    try:
+        with traced_run('rolled', project=args.project, startdate=startdate, enddate=enddate):
+            result = analyze_rolled_yield(args.project, startdate, enddate)
+    except FPYError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        close_connection_pools()
+        print_trace(args.trace)
+    if args.format == 'json':
+        data = {
+            'project': result.project,
+            'startdate': result.startdate,
+            'enddate': result.enddate,
+            'row_count': result.row_count,
+            'unit_count': result.unit_count,
+            'pass_count': result.pass_count,
+            'rolled_yield': round(result.rolled_yield(), 4),
+            'by_artno': {str(artno): counts for artno, counts in result.by_artno.items()},
+            'escaped_count': result.escaped_count,
+            'escaped': [[sno, artno, station_names] for sno, artno, station_names in result.escaped],
+        }
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        print(format_rolled_text(result))
+    return 0
+
+def compare_main(args, base_range, current_range):
+    """命令行环比对比模式"""
+    import sys
+    try:
+        with traced_run('compare', project=args.project, startdate=current_range[0], enddate=current_range[1],
+                        base_range=list(base_range)):
+            comparison = analyze_comparison(args.project, base_range, current_range, engine=args.engine)
+    except FPYError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        close_connection_pools()
+        print_trace(args.trace)
+    if args.format == 'json':
+        data = {
+            'project': comparison.project,
+            'base': result_to_dict(comparison.base),
+            'current': result_to_dict(comparison.current),
+            'fpy_deltas': {station_name: None if delta is None else round(delta, 4)
+                           for station_name, _, _, delta in comparison.fpy_deltas()},
+            'failure_changes': {station_name: [[step, rank, base_rank, count, base_count]
+                                               for step, rank, base_rank, count, base_count
+                                               in comparison.failure_changes(station_name)]
+                                for station_name in comparison.station_names},
+            'failure_movers': {station_name: [list(mover) for mover in comparison.failure_movers(station_name)]
+                               for station_name in comparison.station_names},
+        }
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        print(format_comparison_text(comparison))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -2,311 +2,48 @@
 import tkinter as tk
 import tkcalendar
 from tkinter import ttk,messagebox,filedialog
-import pymysql
-from pymysql.err import ProgrammingError
-from dotenv import load_dotenv, dotenv_values
-from collections import Counter
-import configparser
-
-# 定义加载各产品数据库.env文件的函数用于配置不同产品的不同数据库信息
-def get_env_config(env_filename):
-    """读取指定.env文件,返回配置字典"""
-    # dotenv_values直接读取文件为字典
-    env_dict = dotenv_values(env_filename)
-    # 转换并构建数据库配置
-    db_config = {
-        'host': env_dict.get('DB_HOST'),
-        'port': int(env_dict.get('DB_PORT', 3306)),
-        'user': env_dict.get('DB_USER'),
-        'password': env_dict.get('DB_PASSWORD'),
-        'database': env_dict.get('DB_NAME'),
-        'charset': 'utf8mb4'
-    }
-    return db_config
-
-def load_stations_config(config_file="stations_config.ini"):
-    """从.ini文件读取工站配置"""
-    config = configparser.ConfigParser()
-    config.optionxform = str
-    config.read(config_file, encoding='utf-8')
-    return config
-
-def parse_station_value(value):
-    """解析工站配置值，支持单个值和逗号分隔的多个值"""
-    if ',' in value:
-        return [int(v.strip()) for v in value.split(',')]   #多值处理：分割→去空格→转整数，返回整数列表
-    else:
-        try:
-            return int(value)   #单值处理：转整数，返回整数
-        except ValueError:
-            return value.strip()
+import queue
+import threading
+import time
+# 计算引擎不依赖tkinter，命令行/定时任务可直接使用FPYEngine
+from FPYEngine import (
+    FPYError, AnalysisCancelled, CancelToken, warnings_to,
+    load_stations_config, analyze_project, analyze_all_projects, invalidate_cache,
+    analyze_trend, trend_table, write_trend_csv, analyze_preview, preview_note, format_station_rate, LiveMonitor,
+    analyze_rolled_yield, rolled_yield_lines, escaped_lines, variant_table, variant_failure_lines,
+    analyze_comparison, previous_period, comparison_table, comparison_failure_lines,
+    start_run_trace, trace_activated, set_tracing, tracing_enabled, last_run_trace, TRACE_LOG_FILE,
+)
+# 原先定义在本文件中的函数，保留导入以兼容已有脚本
+from FPYEngine import (
+    get_env_config, parse_station_value, query_lc_data, calculate_each_project_FPY, extract_failure_info,
+)
 
 def check_date(start_date,end_date): #定义检查输入日期前后逻辑的函数
     if start_date > end_date:
         messagebox.showwarning("警告", "开始日期不能晚于结束日期！")
         return False
     return True
-    
-def query_lc_data(env_file,start_date, end_date):      #封装从数据库获取的数据
-    table_name="" 
-    # 获取数据库配置
-    db_config = get_env_config(env_file)
-    
-    # 从stations_config.ini中获取table_name
-    stations_config = load_stations_config()
-    table_name = None
-    for project_name in stations_config.sections():
-        project_config = stations_config[project_name]
-        if project_config.get('env_file') == env_file:
-            table_name = project_config.get('table_name')
-            break
-    
-    if not table_name:
-        messagebox.showwarning("警告", f"未找到{env_file}对应的table_name配置")
-        return
-
-    # 连接数据库并执行查询
-    connection = None
-    try:
-        # 建立数据库连接
-        connection = pymysql.connect(**db_config)
-        # 使用字典游标，结果以{字段名: 值}返回，更易读取
-        cursor = connection.cursor(pymysql.cursors.DictCursor)
-
-        # 先测试表是否存在
-        cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-        table_exists = cursor.fetchone()
-        
-        if not table_exists:
-            messagebox.showwarning("警告", f"表 {table_name} 不存在")
-            return []
-        
-        # SQL数据读取：截取timestamp前10位（yyyy-mm-dd）做日期筛选，取出变种号artno，序列号sno，设备编号traceid，测试类型test，测试结果io
-        # 反引号包裹timestamp（MySQL关键字）和表名，避免语法错误
-        sql = """
-            SELECT artno,sno,traceid,test,io,os0        
-            FROM `{table}` 
-            WHERE LEFT(`timestamp`, 10) BETWEEN %s AND %s 
-        """.format(table=table_name)
-
-        # 执行参数化查询（避免SQL注入，安全规范）
-        cursor.execute(sql, (start_date, end_date))
-        
-        # 获取查询结果
-        results = cursor.fetchall()
-        return results
-
-    except pymysql.MySQLError as e:
-        # 捕获数据库错误并提示
-        if e.args[0] == 1049:
-            messagebox.showwarning("警告", f"找不到指定的数据库！请检查.env文件中的DB_NAME配置是否正确: {e}")
-        elif e.args[0] == 1146:
-            messagebox.showwarning("警告", f"找不到表{table_name}！请确认表名是否正确。详情：{e}")
-        else:
-            messagebox.showwarning("警告", f"数据库查询失败：{e}")
-        return []
-    finally:
-        # 确保连接关闭
-        if connection:
-            connection.close()
-
-#定义从LC取数据自动计算FPY的函数
-def calculate_each_project_FPY(project,startdate, enddate):
-    stations_config = load_stations_config()    # 从.ini文件加载工站配置
-    
-    # 检查项目是否在配置文件中
-    if project not in stations_config:
-        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的工站配置")
-        return
-    
-    # 从配置文件中获取env_file
-    env_file = stations_config[project].get('env_file')
-    if not env_file:
-        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的env_file配置")
-        return
-
-    data_list= query_lc_data(env_file, startdate, enddate)   #一次性从LC数据库获取符合条件的数据，避免多次从数据库取数据导致响应时间长
-
-    if not data_list:
-        messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
-        return
-    else:
-        result_dict = {}       
-        project_stations = stations_config[project]        # 获取该项目的所有工站配置        
-        # 构建工站列表
-        stations = []
-        for station_name in project_stations:
-            if station_name == 'env_file' or station_name == 'table_name':
-                continue
-            station_value = project_stations[station_name]
-            parsed_value = parse_station_value(station_value)
-            stations.append((station_name, parsed_value))
-
-        # 定义工站数据提取函数
-        def extract_station_data(station_value):
-            if isinstance(station_value, list):
-                return [data for data in data_list if data.get('traceid') in [int(v) for v in station_value]]
-            elif isinstance(station_value, int):
-                return [data for data in data_list if data.get('traceid') == station_value]
-            else:
-                return [data for data in data_list if data.get('test') == station_value]
-
-        # 定义判断测试是否通过的函数
-        def is_io_pass(io_value):
-            if io_value == "-1" or io_value == -1:
-                return True
-            elif isinstance(io_value, str) and io_value.strip() == "-1":
-                return True
-            return False
-
-        for station_name, station_name_LC in stations:        # 遍历每个工位计算通过率
-            if not station_name_LC:
-                result_dict[station_name] = 0.0
-                continue
-            
-            if station_name == 'Function':
-                if isinstance(station_name_LC, list):
-                    function_data = [data for data in data_list if data.get('traceid') in [int(v) for v in station_name_LC]]
-                elif isinstance(station_name_LC, int):
-                    function_data = [data for data in data_list if data.get('traceid') == station_name_LC]
-                else:
-                    function_data = [data for data in data_list if data.get('test') == station_name_LC]
-                
-                if not function_data:
-                    result_dict['PRE'] = 0.0
-                    result_dict['EOL'] = 0.0
-                    continue
-                
-                pre_data = [data for data in function_data if data.get('test') == 'PRE']
-                eol_data = [data for data in function_data if data.get('test') == 'EOL']
-                
-                for test_type, test_data in [('PRE', pre_data), ('EOL', eol_data)]:
-                    if not test_data:
-                        result_dict[test_type] = 0.0
-                        continue
-                    
-                    sno_count = Counter([data['sno'] for data in test_data])
-                    
-                    sno_list_firstpass = [data['sno'] for data in test_data if is_io_pass(data.get('io')) and sno_count[data['sno']] == 1]
-                    sno_unique_pass_count = len(set(sno_list_firstpass))
-                    
-                    sno_list_total = [data['sno'] for data in test_data]
-                    sno_unique_total_count = len(set(sno_list_total))
-                    
-                    if sno_unique_total_count == 0:
-                        result_dict[test_type] = 0.0
-                    else:
-                        result_dict[test_type] = sno_unique_pass_count / sno_unique_total_count
-            else:
-                station_data = extract_station_data(station_name_LC)
-                if not station_data:
-                    result_dict[station_name] = 0.0
-                    continue
-                
-                sno_count = Counter([data['sno'] for data in station_data])
-                
-                sno_list_firstpass = [data['sno'] for data in station_data if is_io_pass(data.get('io')) and sno_count[data['sno']] == 1]
-                sno_unique_pass_count = len(set(sno_list_firstpass))
-                
-                sno_list_total = [data['sno'] for data in extract_station_data(station_name_LC)]
-                sno_unique_total_count = len(set(sno_list_total))
-                
-                if sno_unique_total_count == 0:
-                    result_dict[station_name] = 0.0
-                else:
-                    result_dict[station_name] = sno_unique_pass_count / sno_unique_total_count        
-        return result_dict
 
-def extract_failure_info(project, startdate, enddate):
-    stations_config = load_stations_config()
-    
-    if project not in stations_config:
-        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的工站配置")
-        return
-    
-    env_file = stations_config[project].get('env_file')
-    if not env_file:
-        messagebox.showwarning("警告", f"配置文件中未找到项目{project}的env_file配置")
-        return
-
-    data_list = query_lc_data(env_file, startdate, enddate)    
-    if not data_list:
-        return None
-    
-    project_stations = stations_config[project]
-    stations = []
-    for station_name in project_stations:
-        if station_name == 'env_file' or station_name == 'table_name':
-            continue
-        station_value = project_stations[station_name]
-        parsed_value = parse_station_value(station_value)
-        stations.append((station_name, parsed_value))
-    
-    def extract_station_data(station_value):
-        if isinstance(station_value, list):
-            return [data for data in data_list if data.get('traceid') in [int(v) for v in station_value]]
-        elif isinstance(station_value, int):
-            return [data for data in data_list if data.get('traceid') == station_value]
-        else:
-            return [data for data in data_list if data.get('test') == station_value]
-    failure_dict = {}
-    
-    for station_name, station_name_LC in stations:
-        if station_name == 'Function':
-            if isinstance(station_name_LC, list):
-                function_data = [data for data in data_list if data.get('traceid') in [int(v) for v in station_name_LC]]
-            elif isinstance(station_name_LC, int):
-                function_data = [data for data in data_list if data.get('traceid') == station_name_LC]
-            else:
-                function_data = [data for data in data_list if data.get('test') == station_name_LC]
-            
-            pre_data = [data for data in function_data if data.get('test') == 'PRE']
-            eol_data = [data for data in function_data if data.get('test') == 'EOL']
-            
-            for test_type, test_data in [('PRE', pre_data), ('EOL', eol_data)]:
-                failure_dict[test_type] = {}
-                for data in test_data:
-                    os0_value = data.get('os0', '')
-                    if os0_value and isinstance(os0_value, str):
-                        if 'Test Step: ' in os0_value:
-                            idx = os0_value.index('Test Step: ')
-                            if idx + 10 <= len(os0_value):
-                                step_info = os0_value[idx+10:idx+19]
-                                if step_info in failure_dict[test_type]:
-                                    failure_dict[test_type][step_info] += 1
-                                else:
-                                    failure_dict[test_type][step_info] = 1
-                        elif 'Fail Step: ' in os0_value:
-                            idx = os0_value.index('Fail Step: ')
-                            if idx + 10 <= len(os0_value):
-                                step_info = os0_value[idx+10:idx+19]
-                                if step_info in failure_dict[test_type]:
-                                    failure_dict[test_type][step_info] += 1
-                                else:
-                                    failure_dict[test_type][step_info] = 1
-        else:
-            station_data = extract_station_data(station_name_LC)
-            failure_dict[station_name] = {}
-            for data in station_data:
-                os0_value = data.get('os0', '')
-                if os0_value and isinstance(os0_value, str):
-                    if 'Test Step: ' in os0_value:
-                        idx = os0_value.index('Test Step: ')
-                        if idx + 10 <= len(os0_value):
-                            step_info = os0_value[idx+10:idx+19]
-                            if step_info in failure_dict[station_name]:
-                                failure_dict[station_name][step_info] += 1
-                            else:
-                                failure_dict[station_name][step_info] = 1
-                    elif 'Fail Step: ' in os0_value:
-                        idx = os0_value.index('Fail Step: ')
-                        if idx + 10 <= len(os0_value):
-                            step_info = os0_value[idx+10:idx+19]
-                            if step_info in failure_dict[station_name]:
-                                failure_dict[station_name][step_info] += 1
-                            else:
-                                failure_dict[station_name][step_info] = 1
-    return failure_dict
+# 界面任务中表示“全部项目”的项目名
+ALL_PROJECTS = "全部项目"
+# 趋势分桶下拉框选项 -> 引擎的分桶方式
+TREND_BUCKET_NAMES = {"按天": 'day', "按周": 'week'}
+# 抽样预览任务：只预览 / 预览后在后台继续计算精确结果
+PREVIEW_ONLY = 'preview'
+PREVIEW_THEN_EXACT = 'preview_exact'
+# 实时监控的刷新任务
+LIVE_MODE = 'live'
+# 逐件直通率任务
+ROLLED_MODE = 'rolled'
+# 按变种号细分的项目计算任务
+VARIANT_MODE = 'artno'
+# 环比对比任务：(COMPARE_MODE, 上期开始日期, 上期结束日期)，本期为选择的日期范围
+COMPARE_MODE = 'compare'
+
+def is_comparison(mode):
+    #环比对比任务的mode为(COMPARE_MODE, 上期开始日期, 上期结束日期)
+    return isinstance(mode, tuple) and mode[0] == COMPARE_MODE
 
 '''通过TKinter创建FPY_LC类及按钮/输出框等各种控件并调用函数输出结果'''
 class FPY_LC:
@@ -353,8 +90,58 @@ class FPY_LC:
         if project_list:
             self.combo_project.set(project_list[0])  # 默认选中第一个项目
 
-        # 生成FPY数据按钮
-        self.btn_transfer = ttk.Button(FPY_operation_frame, text="点击生成数据", command=self.calculate_and_generate_FPY, style="Accent.TButton").pack(anchor=tk.W, pady=20)
+        # 生成FPY数据按钮、取消按钮及进度显示
+        run_frame = ttk.Frame(FPY_operation_frame)
+        run_frame.pack(fill=tk.X, pady=20)
+        self.btn_transfer = ttk.Button(run_frame, text="点击生成数据", command=self.calculate_and_generate_FPY, style="Accent.TButton")
+        self.btn_transfer.pack(side=tk.LEFT)
+        self.btn_cancel = ttk.Button(run_frame, text="取消", command=self.cancel_analysis, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, padx=10)
+        # 同一次查询中按变种号(artno)细分FPY和失败TOP5
+        self.split_artno = tk.BooleanVar(value=False)
+        ttk.Checkbutton(run_frame, text="按变种号细分", variable=self.split_artno).pack(side=tk.LEFT)
+        ttk.Button(run_frame, text="全部项目生成数据", command=self.calculate_all_projects, style="Accent.TButton").pack(side=tk.LEFT, padx=10)
+        # 抽样预览：按序列号抽样快速给出带置信区间的FPY，可选在后台继续计算精确结果
+        ttk.Button(run_frame, text="快速预览", command=self.calculate_preview).pack(side=tk.LEFT, padx=10)
+        self.refine_preview = tk.BooleanVar(value=True)
+        ttk.Checkbutton(run_frame, text="预览后计算精确结果", variable=self.refine_preview).pack(side=tk.LEFT)
+        # 实时监控：定时只读取新数据，增量更新结果
+        self.btn_live = ttk.Button(run_frame, text="实时监控", command=self.toggle_live)
+        self.btn_live.pack(side=tk.LEFT, padx=10)
+        # 逐件直通率：sno在到过的每个工站都一次通过的比例，列出未一次通过的序列号
+        ttk.Button(run_frame, text="逐件直通率", command=self.calculate_rolled).pack(side=tk.LEFT, padx=10)
+        self.live_monitor = None     # 实时监控中的LiveMonitor，未监控时为None
+        self.live_timer = None       # 下一次刷新的after任务
+        self.progress_text = tk.StringVar(value="")
+        ttk.Label(run_frame, textvariable=self.progress_text, font=self.font).pack(side=tk.LEFT, padx=10)
+
+        # FPY趋势：一次查询按天/按周输出工站×时间的矩阵
+        trend_frame = ttk.Frame(FPY_operation_frame)
+        trend_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(trend_frame, text="FPY趋势:", font=self.font).pack(side=tk.LEFT)
+        self.combo_bucket = ttk.Combobox(trend_frame, values=list(TREND_BUCKET_NAMES), width=6, state="readonly")
+        self.combo_bucket.set("按天")
+        self.combo_bucket.pack(side=tk.LEFT, padx=5)
+        ttk.Button(trend_frame, text="生成趋势", command=self.calculate_trend, style="Accent.TButton").pack(side=tk.LEFT, padx=5)
+        ttk.Button(trend_frame, text="导出趋势CSV", command=self.export_trend_csv).pack(side=tk.LEFT, padx=5)
+        self.last_trend = None       # 最近一次生成的趋势，用于导出
+
+        # 环比对比：上面选择的日期范围为本期，与这里选择的上期在一次查询中对比
+        compare_frame = ttk.Frame(FPY_operation_frame)
+        compare_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(compare_frame, text="对比上期:", font=self.font).pack(side=tk.LEFT)
+        self.cal_compare1 = tkcalendar.DateEntry(compare_frame,width=12,date_pattern="yyyy-mm-dd")
+        self.cal_compare1.pack(side=tk.LEFT, padx=5)
+        self.cal_compare2 = tkcalendar.DateEntry(compare_frame,width=12,date_pattern="yyyy-mm-dd")
+        self.cal_compare2.pack(side=tk.LEFT, padx=5)
+        ttk.Button(compare_frame, text="上一周期", command=self.fill_previous_period).pack(side=tk.LEFT, padx=5)
+        ttk.Button(compare_frame, text="生成对比", command=self.calculate_comparison, style="Accent.TButton").pack(side=tk.LEFT, padx=5)
+
+        # 后台分析任务状态
+        self.running_job = None      # 正在计算的(项目, 开始日期, 结束日期, 趋势分桶/预览方式或None)
+        self.pending_job = None      # 计算期间最后一次点击的请求，完成后再计算
+        self.cancel_token = None
+        self.analysis_events = None  # 后台线程发给界面线程的消息队列
 
         # 创建双输出框
         output_frame = ttk.Frame(FPY_operation_frame)
@@ -383,6 +170,10 @@ class FPY_LC:
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(fill=tk.X, pady=5)
         ttk.Button(btn_frame, text="清空所有", command=self.clear_all).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="清除缓存", command=self.clear_cache).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="调试面板", command=self.open_debug_panel).pack(side=tk.LEFT, padx=5)
+        self.debug_text = None       # 调试面板打开时显示最近一次运行各阶段耗时的文本框
+        self.run_trace = None        # 正在计算的运行计时，未开启计时时为None
         ttk.Button(btn_frame, text="退出", command=root.quit).pack(side=tk.LEFT, padx=5)
 
         # 设置按钮样式（美化）
@@ -390,86 +181,443 @@ class FPY_LC:
         style.configure("Accent.TButton", font=self.font, padding=5)
      
     def calculate_and_generate_FPY(self):
-        #计算并显示计算结果
+        #在后台线程计算，界面不卡顿
         project=self.combo_project.get()
         startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
         enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
-        self.FPY_result.delete("1.0", tk.END)
-        self.Fail_result.delete("1.0", tk.END)
-        self.FPY_result.insert(tk.END, f"{project}：\n")
-        self.FPY_result.insert(tk.END, f"日期范围: [{startdate}] 至 [{enddate}]\n\n")
+        if not check_date(startdate,enddate):
+            return
+        if project not in load_stations_config().sections():
+            return
+        self.submit_analysis((project, startdate, enddate, VARIANT_MODE if self.split_artno.get() else None))
 
+    def calculate_trend(self):
+        #一次查询整个日期范围，按天或按周输出各工站FPY趋势
+        project=self.combo_project.get()
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
         if not check_date(startdate,enddate):
             return
+        if project not in load_stations_config().sections():
+            return
+        self.submit_analysis((project, startdate, enddate, TREND_BUCKET_NAMES[self.combo_bucket.get()]))
+
+    def calculate_preview(self):
+        #抽样预览当前项目，勾选时预览后继续计算精确结果
+        project=self.combo_project.get()
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
+        if not check_date(startdate,enddate):
+            return
+        if project not in load_stations_config().sections():
+            return
+        mode = PREVIEW_THEN_EXACT if self.refine_preview.get() else PREVIEW_ONLY
+        self.submit_analysis((project, startdate, enddate, mode))
+
+    def toggle_live(self):
+        #开始/停止实时监控：从开始日期起累计，之后每次刷新只读取新数据
+        if self.live_monitor is not None:
+            self.stop_live()
+            return
+        project=self.combo_project.get()
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        if project not in load_stations_config().sections():
+            return
+        try:
+            self.live_monitor = LiveMonitor(project, startdate)
+        except FPYError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        self.btn_live.config(text="停止实时监控")
+        self.submit_analysis((project, startdate, None, LIVE_MODE))
+
+    def stop_live(self):
+        self.live_monitor = None
+        # 排队中的刷新不再执行
+        if self.pending_job is not None and self.pending_job[3] == LIVE_MODE:
+            self.pending_job = None
+        if self.live_timer is not None:
+            self.root.after_cancel(self.live_timer)
+            self.live_timer = None
+        self.btn_live.config(text="实时监控")
+
+    def refresh_live(self):
+        #定时刷新：有其它计算正在进行时排在其后
+        self.live_timer = None
+        if self.live_monitor is not None:
+            self.submit_analysis((self.live_monitor.project, self.live_monitor.startdate, None, LIVE_MODE))
+
+    def calculate_rolled(self):
+        #计算当前项目的逐件直通率
+        project=self.combo_project.get()
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
+        if not check_date(startdate,enddate):
+            return
+        if project not in load_stations_config().sections():
+            return
+        self.submit_analysis((project, startdate, enddate, ROLLED_MODE))
+
+    def fill_previous_period(self):
+        #上期设为本期之前天数相同的日期范围（本周对应上周）
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
+        if not check_date(startdate,enddate):
+            return
+        base_start, base_end = previous_period(startdate, enddate)
+        self.cal_compare1.set_date(base_start)
+        self.cal_compare2.set_date(base_end)
+
+    def calculate_comparison(self):
+        #本期与上期在一次查询中读取，输出各工站FPY变化和失败TOP5排名变化
+        project=self.combo_project.get()
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
+        base_start=self.cal_compare1.get_date().strftime('%Y-%m-%d')
+        base_end=self.cal_compare2.get_date().strftime('%Y-%m-%d')
+        if not check_date(startdate,enddate) or not check_date(base_start,base_end):
+            return
+        if project not in load_stations_config().sections():
+            return
+        self.submit_analysis((project, startdate, enddate, (COMPARE_MODE, base_start, base_end)))
+
+    def calculate_all_projects(self):
+        #并行计算配置文件中的全部项目，每个项目完成后立即输出
+        startdate=self.cal_select1.get_date().strftime('%Y-%m-%d')
+        enddate=self.cal_select2.get_date().strftime('%Y-%m-%d')
+        if not check_date(startdate,enddate):
+            return
+        self.submit_analysis((ALL_PROJECTS, startdate, enddate, None))
+
+    def submit_analysis(self, job):
+        #计算期间重复点击只保留最后一次请求，不重复排队
+        if self.running_job is None:
+            self.start_analysis(job)
+        elif job != self.running_job:
+            self.pending_job = job
+
+    def start_analysis(self, job):
+        project, startdate, enddate, mode = job
+        if mode == LIVE_MODE and self.live_monitor is None:
+            # 实时监控已停止，不再刷新
+            self.pending_job = None
+            return
+        self.running_job = job
+        self.pending_job = None
+        # 实时监控刷新期间保留上次结果，读完新数据后再替换
+        if mode != LIVE_MODE:
+            self.reset_output(job)
+        self.progress_text.set("正在查询数据...")
+        self.btn_cancel.config(state=tk.NORMAL)
+
+        self.cancel_token = CancelToken()
+        self.analysis_events = queue.Queue()
+        if mode in TREND_BUCKET_NAMES.values():
+            kind = 'trend'
+        elif mode in (PREVIEW_ONLY, PREVIEW_THEN_EXACT):
+            kind = 'preview'
+        elif mode == LIVE_MODE:
+            kind = 'live'
+        elif mode == ROLLED_MODE:
+            kind = 'rolled'
+        elif is_comparison(mode):
+            kind = 'compare'
         else:
-            stations_config = load_stations_config()
-            project_list = stations_config.sections()
-            if project in project_list:              
-                # 计算各工站一次通过率并输出显示
-                results = []            
-                fpy_results = calculate_each_project_FPY(project, startdate, enddate)
-                if fpy_results:
-                    if project in ['ICCU1', 'ICCU2']:
-                        eol_value = None
-                        for station_name, project_result in fpy_results.items():
-                            if station_name == 'EOL':
-                                eol_value = (station_name, project_result)
-                            else:
-                                rate = round(project_result, 4)
-                                results.append(rate)
-                                self.FPY_result.insert(tk.END, f"{station_name}: {round(rate*100,4)}%\n")
-                        
-                        if eol_value:
-                            station_name, project_result = eol_value
-                            rate = round(project_result, 4)
-                            results.append(rate)
-                            self.FPY_result.insert(tk.END, f"{station_name}: {round(rate*100,4)}%\n")
-                    else:
-                        for station_name, project_result in fpy_results.items():
-                            rate = round(project_result, 4)
-                            results.append(rate)
-                            self.FPY_result.insert(tk.END, f"{station_name}: {round(rate*100,4)}%\n")
-                    
-                    # 计算总通过率并输出显示
-                    totally_result = 1.0
-                    for rate in results:
-                        totally_result *= rate
-                    totally_result = round(totally_result, 4)
-                    self.FPY_result.insert(tk.END, f"Totally: {round(totally_result*100,4)}%")
+            kind = 'all_projects' if project == ALL_PROJECTS else 'project'
+        self.run_trace = start_run_trace(kind, project=project, startdate=startdate, enddate=enddate)
+        threading.Thread(target=self.run_analysis, args=(job, self.cancel_token, self.analysis_events, self.run_trace,
+                                                         self.live_monitor), daemon=True).start()
+        self.root.after(100, self.poll_analysis)
+
+    def reset_output(self, job):
+        #清空输出框并显示项目和日期范围
+        project, startdate, enddate, mode = job
+        self.FPY_result.delete("1.0", tk.END)
+        self.Fail_result.delete("1.0", tk.END)
+        # 趋势矩阵和对比表按行显示不换行，其它结果保持自动换行
+        self.FPY_result.config(wrap=tk.NONE if mode in TREND_BUCKET_NAMES.values() or is_comparison(mode) else tk.CHAR)
+        if mode == LIVE_MODE:
+            self.FPY_result.insert(tk.END, f"{project}：\n")
+            self.FPY_result.insert(tk.END, f"日期范围: [{startdate}] 至今（实时监控）\n\n")
+        elif is_comparison(mode):
+            self.FPY_result.insert(tk.END, f"{project}：\n")
+            self.FPY_result.insert(tk.END, f"上期: [{mode[1]}] 至 [{mode[2]}]，本期: [{startdate}] 至 [{enddate}]\n\n")
+        elif project != ALL_PROJECTS:
+            self.FPY_result.insert(tk.END, f"{project}：\n")
+            self.FPY_result.insert(tk.END, f"日期范围: [{startdate}] 至 [{enddate}]\n\n")
+
+    def run_analysis(self, job, cancel_token, events, run_trace=None, live_monitor=None):
+        #后台线程：不直接操作Tk控件，结果、进度和警告都放入消息队列
+        project, startdate, enddate, mode = job
+        def project_progress(rows_fetched):
+            events.put(('progress', f"已读取 {rows_fetched} 行"))
+        try:
+            with warnings_to(lambda message: events.put(('warning', message))), trace_activated(run_trace):
+                if mode in TREND_BUCKET_NAMES.values():
+                    trend = analyze_trend(project, startdate, enddate, mode, progress=project_progress,
+                                          cancel_token=cancel_token)
+                    events.put(('done', trend))
+                elif mode == LIVE_MODE:
+                    events.put(('done', live_monitor.refresh(project_progress, cancel_token)))
+                elif is_comparison(mode):
+                    events.put(('done', analyze_comparison(project, mode[1:], (startdate, enddate),
+                                                           progress=project_progress, cancel_token=cancel_token)))
+                elif mode == ROLLED_MODE:
+                    def rolled_progress(rows_fetched, partitions_done, partitions_total):
+                        events.put(('progress', f"已读取 {rows_fetched} 行，已完成分片 {partitions_done}/{partitions_total}"))
+                    events.put(('done', analyze_rolled_yield(project, startdate, enddate, progress=rolled_progress,
+                                                             cancel_token=cancel_token)))
+                elif mode in (PREVIEW_ONLY, PREVIEW_THEN_EXACT):
+                    analysis = analyze_preview(project, startdate, enddate, progress=project_progress,
+                                               cancel_token=cancel_token)
+                    if mode == PREVIEW_THEN_EXACT and analysis.row_count:
+                        # 先显示预览，再用同一线程计算精确结果
+                        events.put(('preview', analysis))
+                        analysis = analyze_project(project, startdate, enddate, progress=project_progress,
+                                                   cancel_token=cancel_token)
+                    events.put(('done', analysis))
+                elif project == ALL_PROJECTS:
+                    def all_progress(rows_fetched, projects_done, projects_total):
+                        events.put(('progress', f"已读取 {rows_fetched} 行，已完成项目 {projects_done}/{projects_total}"))
+                    analyze_all_projects(startdate, enddate, on_result=lambda analysis: events.put(('result', analysis)),
+                                         progress=all_progress, cancel_token=cancel_token)
+                    events.put(('done', None))
                 else:
-                    self.FPY_result.insert(tk.END, f"未计算出FPY数据，请检查数据库配置或日期范围")
-                
-                # 获取失败信息TOP5
-                failure_results = extract_failure_info(project, startdate, enddate)
-                if failure_results:
-                    self.Fail_result.insert(tk.END, f"{project}：\n")
-                    self.Fail_result.insert(tk.END, f"日期范围: [{startdate}] 至 [{enddate}]\n\n")
-                    
-                    # 先显示除EOL外的工站
-                    eol_data = None
-                    for station_name, step_dict in failure_results.items():
-                        if station_name == 'EOL':
-                            eol_data = (station_name, step_dict)
-                        else:
-                            if step_dict:
-                                sorted_steps = sorted(step_dict.items(), key=lambda x: x[1], reverse=True)[:5]
-                                step_str = "; ".join([f"{step}, {count}" for step, count in sorted_steps])
-                                self.Fail_result.insert(tk.END, f"{station_name}: {step_str}\n")
-                            else:
-                                self.Fail_result.insert(tk.END, f"{station_name}: 无失败数据\n")
-                    
-                    # 最后显示EOL工站
-                    if eol_data:
-                        station_name, step_dict = eol_data
-                        if step_dict:
-                            sorted_steps = sorted(step_dict.items(), key=lambda x: x[1], reverse=True)[:5]
-                            step_str = "; ".join([f"{step}, {count}" for step, count in sorted_steps])
-                            self.Fail_result.insert(tk.END, f"{station_name}: {step_str}\n\n")
-                        else:
-                            self.Fail_result.insert(tk.END, f"{station_name}: 无失败数据\n\n")
+                    analysis = analyze_project(project, startdate, enddate, progress=project_progress,
+                                               cancel_token=cancel_token, by_artno=mode == VARIANT_MODE or None)
+                    events.put(('done', analysis))
+        except AnalysisCancelled:
+            events.put(('cancelled', None))
+        except Exception as e:
+            events.put(('error', e))
+
+    def poll_analysis(self):
+        #界面线程定时读取后台线程的消息
+        events = self.analysis_events
+        finished = False
+        while not finished:
+            try:
+                kind, value = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.progress_text.set(value)
+            elif kind == 'warning':
+                messagebox.showwarning("警告", value)
+            elif kind == 'result':
+                # 全部项目模式：每个项目完成后追加输出
+                self.FPY_result.insert(tk.END, f"{value.project}：\n")
+                self.FPY_result.insert(tk.END, f"日期范围: [{value.startdate}] 至 [{value.enddate}]\n\n")
+                if value.error:
+                    self.FPY_result.insert(tk.END, value.error)
                 else:
-                    self.Fail_result.insert(tk.END, f"未获取到失败信息数据")
+                    self.render(self.show_analysis, value)
+                self.FPY_result.insert(tk.END, "\n\n")
+                self.Fail_result.insert(tk.END, "\n")
+            elif kind == 'preview':
+                # 预览结果先显示，精确结果算完后替换
+                self.render(self.show_analysis, value)
+                self.progress_text.set("预览完成，正在计算精确结果...")
+            elif kind == 'done':
+                if self.running_job[3] in TREND_BUCKET_NAMES.values():
+                    self.render(self.show_trend, value)
+                elif self.running_job[3] == ROLLED_MODE:
+                    self.render(self.show_rolled, value)
+                elif is_comparison(self.running_job[3]):
+                    self.render(self.show_comparison, value)
+                elif self.running_job[0] != ALL_PROJECTS:
+                    if self.running_job[3] == LIVE_MODE or (self.running_job[3] == PREVIEW_THEN_EXACT
+                                                           and not value.sample_modulus):
+                        self.reset_output(self.running_job)
+                    # 实时监控暂无数据时不弹窗，等待下次刷新
+                    if not value.row_count and self.running_job[3] != LIVE_MODE:
+                        messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
+                    self.render(self.show_analysis, value)
+                self.progress_text.set("计算完成")
+                if self.running_job[3] == LIVE_MODE and self.live_monitor is not None:
+                    monitor = self.live_monitor
+                    self.progress_text.set(f"实时监控：新增 {monitor.new_rows} 行，"
+                                           f"更新于 {monitor.refreshed_at:%H:%M:%S}，{monitor.refresh_seconds} 秒后刷新")
+                    self.live_timer = self.root.after(monitor.refresh_seconds * 1000, self.refresh_live)
+                finished = True
+            elif kind == 'cancelled':
+                self.FPY_result.insert(tk.END, "已取消计算")
+                self.progress_text.set("已取消")
+                finished = True
+            elif isinstance(value, FPYError):
+                # 配置或数据库错误：提示后显示无数据
+                messagebox.showwarning("警告", str(value))
+                self.show_analysis(None)
+                self.progress_text.set("计算失败")
+                finished = True
+            else:
+                messagebox.showwarning("警告", f"计算失败：{value}")
+                self.progress_text.set("计算失败")
+                finished = True
+        if not finished:
+            self.root.after(100, self.poll_analysis)
+            return
+        # 实时监控刷新被取消或出错时停止监控
+        if self.running_job[3] == LIVE_MODE and kind != 'done' and self.live_monitor is not None:
+            self.stop_live()
+        self.running_job = None
+        self.btn_cancel.config(state=tk.DISABLED)
+        if self.run_trace is not None:
+            self.run_trace.finish(status=kind)
+            self.run_trace = None
+            self.refresh_debug_panel()
+        if self.pending_job is not None:
+            self.start_analysis(self.pending_job)
+
+    def cancel_analysis(self):
+        #取消正在进行的计算，KILL QUERY需要新建连接，放到后台线程执行
+        if self.cancel_token is not None and self.running_job is not None:
+            self.pending_job = None
+            self.progress_text.set("正在取消...")
+            threading.Thread(target=self.cancel_token.cancel, daemon=True).start()
+
+    def render(self, show, value):
+        #输出结果，开启运行计时时记录界面显示的耗时
+        start = time.perf_counter()
+        show(value)
+        if self.run_trace is not None:
+            self.run_trace.add('render', time.perf_counter() - start)
+
+    def open_debug_panel(self):
+        #调试面板：开关运行计时，显示最近一次运行各阶段的耗时、行数和传输字节数
+        if self.debug_text is not None:
+            self.debug_text.winfo_toplevel().lift()
+            return
+        panel = tk.Toplevel(self.root)
+        panel.title("调试面板")
+        panel.geometry("640x360")
+        tracing = tk.BooleanVar(value=tracing_enabled())
+        ttk.Checkbutton(panel, text=f"记录运行计时（写入{TRACE_LOG_FILE}）", variable=tracing,
+                        command=lambda: set_tracing(tracing.get())).pack(anchor=tk.W, padx=10, pady=5)
+        self.debug_text = tk.Text(panel, font=("Consolas", 11))
+        self.debug_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        def close_panel():
+            self.debug_text = None
+            panel.destroy()
+        panel.protocol("WM_DELETE_WINDOW", close_panel)
+        self.refresh_debug_panel()
+
+    def refresh_debug_panel(self):
+        #调试面板打开时显示最近一次运行的计时
+        if self.debug_text is None:
+            return
+        trace = last_run_trace()
+        self.debug_text.delete("1.0", tk.END)
+        if trace is None:
+            self.debug_text.insert(tk.END, "暂无运行计时，勾选上方选项后重新计算")
+        else:
+            self.debug_text.insert(tk.END, trace.breakdown_text())
+
+    def show_analysis(self, analysis):
+        #将分析结果输出到FPY和失败TOP5两个输出框
+        if analysis is None or not analysis.row_count:
+            self.FPY_result.insert(tk.END, f"未计算出FPY数据，请检查数据库配置或日期范围")
+            self.Fail_result.insert(tk.END, f"未获取到失败信息数据")
+            return
+        project = analysis.project
+
+        # ICCU项目EOL工站放在最后显示
+        station_names = list(analysis.fpy)
+        if project in ['ICCU1', 'ICCU2'] and 'EOL' in station_names:
+            station_names.remove('EOL')
+            station_names.append('EOL')
+
+        # 抽样预览时说明抽样比例和置信区间
+        if analysis.sample_modulus:
+            self.FPY_result.insert(tk.END, f"{preview_note(analysis)}\n\n")
+
+        # 计算各工站一次通过率并输出显示
+        results = []
+        for station_name in station_names:
+            rate = round(analysis.fpy[station_name], 4)
+            results.append(rate)
+            self.FPY_result.insert(tk.END, f"{station_name}: {format_station_rate(analysis, station_name)}\n")
+
+        # 计算总通过率并输出显示
+        totally_result = 1.0
+        for rate in results:
+            totally_result *= rate
+        totally_result = round(totally_result, 4)
+        self.FPY_result.insert(tk.END, f"Totally: {round(totally_result*100,4)}%")
+
+        # 失败信息TOP5
+        self.Fail_result.insert(tk.END, f"{project}：\n")
+        self.Fail_result.insert(tk.END, f"日期范围: [{analysis.startdate}] 至 [{analysis.enddate}]\n\n")
+        # 先显示除EOL外的工站，最后显示EOL工站
+        station_names = [name for name in analysis.failures if name != 'EOL']
+        if 'EOL' in analysis.failures:
+            station_names.append('EOL')
+        for station_name in station_names:
+            end = "\n\n" if station_name == 'EOL' else "\n"
+            top_steps = analysis.top_failures(station_name)
+            if top_steps:
+                step_str = "; ".join([f"{step}, {count}" for step, count in top_steps])
+                self.Fail_result.insert(tk.END, f"{station_name}: {step_str}{end}")
+            else:
+                self.Fail_result.insert(tk.END, f"{station_name}: 无失败数据{end}")
+
+        # 按变种号细分：工站×变种号的FPY表，列之间用制表符分隔
+        if analysis.variants:
+            self.FPY_result.insert(tk.END, "\n\n按变种号细分:\n")
+            self.FPY_result.insert(tk.END, "\n".join("\t".join(row) for row in variant_table(analysis)))
+            self.Fail_result.insert(tk.END, "\n各变种号测试失败TOP5:\n")
+            self.Fail_result.insert(tk.END, "\n".join(variant_failure_lines(analysis)))
     
+    def show_trend(self, trend):
+        #趋势矩阵输出到FPY输出框，列之间用制表符分隔，可直接粘贴到Excel
+        self.last_trend = trend
+        if not trend.row_count:
+            messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
+        self.FPY_result.insert(tk.END, "\n".join("\t".join(row) for row in trend_table(trend)))
+        self.Fail_result.insert(tk.END, f"{trend.project}：\n")
+        self.Fail_result.insert(tk.END, f"日期范围: [{trend.startdate}] 至 [{trend.enddate}]\n\n")
+        self.Fail_result.insert(tk.END, "趋势模式只计算FPY，失败TOP5请点击生成数据")
+
+    def show_rolled(self, result):
+        #逐件直通率输出到FPY输出框，未一次通过的序列号输出到右侧输出框
+        if not result.unit_count:
+            messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
+            self.FPY_result.insert(tk.END, f"未计算出直通率数据，请检查数据库配置或日期范围")
+            return
+        self.FPY_result.insert(tk.END, "\n".join(rolled_yield_lines(result)))
+        self.Fail_result.insert(tk.END, f"{result.project}：\n")
+        self.Fail_result.insert(tk.END, f"日期范围: [{result.startdate}] 至 [{result.enddate}]\n\n")
+        self.Fail_result.insert(tk.END, "\n".join(escaped_lines(result)))
+
+    def show_comparison(self, comparison):
+        #上期、本期FPY及变化并列输出，列之间用制表符分隔；失败TOP5附上期次数和排名变化
+        if not comparison.row_count:
+            messagebox.showwarning("警告", f"未查询到符合条件的数据，请检查日期范围或数据库配置")
+        self.FPY_result.insert(tk.END, "\n".join("\t".join(row) for row in comparison_table(comparison)))
+        self.Fail_result.insert(tk.END, f"{comparison.project}：\n")
+        self.Fail_result.insert(tk.END, "本期相对上期的失败TOP5变化\n\n")
+        self.Fail_result.insert(tk.END, "\n".join(comparison_failure_lines(comparison)) or "无失败数据")
+
+    def export_trend_csv(self):
+        #将最近一次生成的趋势矩阵导出为CSV
+        if self.last_trend is None:
+            messagebox.showwarning("警告", "请先生成趋势")
+            return
+        trend = self.last_trend
+        file_path = filedialog.asksaveasfilename(
+        defaultextension=".csv",
+        filetypes=[("csv文件", "*.csv"), ("所有文件", "*.*")],
+        initialfile=f"{trend.project} FPY trend {trend.startdate}_{trend.enddate}.csv",
+        title="选择CSV文件保存位置")
+        if not file_path:
+            return
+        try:
+            write_trend_csv(trend, file_path)
+            messagebox.showinfo("提示","趋势已成功导出")
+        except IOError as e:
+            messagebox.showwarning("警告", f"写入文件时出错:{e}")
+
       #定义数据存储为txt文件，~~作者太懒了~~想存excel格式的话下次再补充代码   
     def store_file_txt(self):
         file=None
@@ -502,6 +650,12 @@ class FPY_LC:
         self.FPY_result.delete("1.0", tk.END)
         self.Fail_result.delete("1.0", tk.END)
 
+    def clear_cache(self):
+        #清除本地按天缓存的FPY部分结果，下次计算重新从数据库读取
+        if messagebox.askyesno("提示", "确定清除所有项目的本地缓存吗？"):
+            invalidate_cache()
+            messagebox.showinfo("提示", "本地缓存已清除")
+
 if __name__ == "__main__":    # 创建主窗口并运行
     root = tk.Tk()
     app = FPY_LC(root)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# 测试共用的模拟LC数据库：替换pymysql.connect，按FPYEngine发出的SQL从内存中的行返回数据，不需要MySQL服务
+import itertools
+import os
+import random
+import re
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FPYEngine
+
+STATIONS_CONFIG = """[P1]
+env_file = p1.env
+table_name = lc_p1
+batch_size = 777
+Function = 101,102
+Hipot = 201
+Burn = BURN
+Vis = 301
+Empty =
+"""
+
+ENV = """DB_HOST=test.invalid
+DB_PORT=3306
+DB_USER=test
+DB_PASSWORD=test
+DB_NAME=test
+"""
+
+START_DATE = "2026-10-01"
+END_DATE = "2026-10-09"
+
+def generate_rows(count, seed=1):
+    """按固定种子生成LC数据行：sno会在多个工站和多天里重复出现，io和os0覆盖各种通过/失败写法
+    timestamp各不相同，按首次测试判断时没有并列；id按timestamp顺序递增"""
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        day = rng.randint(1, 9)
+        rows.append({
+            'artno': rng.choice(['A1', 'A2']),
+            'sno': 'SN%05d' % rng.randint(0, count // 3),
+            'traceid': rng.choice([101, 102, 103, 201, 202, 301, None]),
+            'test': rng.choice(['PRE', 'EOL', 'HIPOT', 'BURN', 'VIS']),
+            'io': rng.choice(['-1', '-1', '-1', -1, ' -1', '-1\t', '0', 0, None]),
+            'os0': rng.choice(['', None, 'xx Test Step: 12.3.4.5 failed', 'abc Fail Step: 99.88.77 zz',
+                               'Test Step: 1', 'Fail Step: 5.5 then Test Step: 6.6.6.6']),
+            'timestamp': '2026-10-%02d %02d:%02d:%02d' % (day, index // 3600, index // 60 % 60, index % 60),
+        })
+    rows.sort(key=lambda row: row['timestamp'])
+    for index, row in enumerate(rows):
+        row['id'] = index + 1
+    return rows
+
+class FakeCursor:
+    """与pymysql的游标一样：普通游标在execute中生成全部结果行，fetchall返回_rows本身，
+    游标和连接（_result）都保留引用；服务端游标（SSCursor）在fetch时才逐行生成"""
+
+    def __init__(self, connection, as_dict, unbuffered):
+        self.connection = connection
+        self.database = connection.database
+        self.as_dict = as_dict
+        self.unbuffered = unbuffered
+        self._rows = None
+        self.rownumber = 0
+
+    def execute(self, sql, params=None):
+        self.database.queries.append(sql)
+        rows = self.database.select(sql, params)
+        if not self.as_dict and rows and 'SELECT' in sql:
+            # 元组游标按SELECT字段顺序返回
+            select_list = sql.split("SELECT", 1)[1].split("FROM", 1)[0]
+            columns = [column.strip() for column in select_list.split(",") if column.strip().isidentifier()]
+            if " AS step" in select_list:
+                columns.append('step')
+            if " AS period" in select_list:
+                columns.append('period')
+            rows = (tuple(row.get(column) for column in columns) for row in rows)
+        if self.unbuffered:
+            self._rows = iter(rows)
+        else:
+            self._rows = list(rows)
+            self.connection._result = self._rows
+        self.rownumber = 0
+        return 0 if self.unbuffered else len(self._rows)
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size):
+        if self.unbuffered:
+            return list(itertools.islice(self._rows, size))
+        rows = self._rows[self.rownumber:self.rownumber + size]
+        self.rownumber += len(rows)
+        return rows
+
+    def fetchall(self):
+        if self.unbuffered:
+            return list(self._rows)
+        rows = self._rows[self.rownumber:] if self.rownumber else self._rows
+        self.rownumber = len(self._rows)
+        return rows
+
+    def close(self):
+        # 与pymysql一样，关闭游标不释放已读取的结果
+        if self.unbuffered:
+            self._rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+        self.open = True
+        self._result = None
+
+    def cursor(self, cursor_class=None):
+        name = cursor_class.__name__ if cursor_class is not None else ''
+        return FakeCursor(self, 'Dict' in name, name.startswith('SS'))
+
+    def ping(self, reconnect=False):
+        pass
+
+    def thread_id(self):
+        return 1
+
+    def close(self):
+        self.open = False
+
+class FakeLCDatabase:
+    """内存中的LC表：rows为字典行，queries记录收到的SQL"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def write_config(self, extra=""):
+        """写入工站配置，extra为追加到[P1]的配置行"""
+        with open("stations_config.ini", "w", encoding="utf-8") as f:
+            f.write(STATIONS_CONFIG + extra + "\n")
+        FPYEngine._stations_config_cache.clear()
+
+    def select(self, sql, params):
+        if sql.startswith("SHOW TABLES"):
+            return [{'Tables_in_test': 'lc_p1'}]
+        if sql.startswith("KILL") or params is None:
+            return []
+        if "GROUP BY" in sql:
+            return self.aggregate(sql, params)
+        params = list(params)
+        periods = []
+        if " AS period" in sql:
+            # 多个日期范围：CASE中的各范围参数在日期参数之前，WHERE中再列出一次
+            period_count = sql.count(" THEN ")
+            periods = [tuple(params[2 * index:2 * index + 2]) for index in range(period_count)]
+            params = params[2 * period_count:-2 * period_count]
+        start, end = params.pop(0), params.pop(0)
+        rows = [row for row in self.rows if start <= row['timestamp'][:10] < end]
+        if periods:
+            rows = [dict(row, period=index) for row in rows for index, (period_start, period_end) in enumerate(periods)
+                    if period_start <= row['timestamp'][:10] < period_end]
+        if "MOD(CRC32(sno)" in sql:
+            modulus, remainder = params.pop(0), params.pop(0)
+            rows = [row for row in rows if zlib.crc32(row['sno'].encode()) % modulus == remainder]
+        since = re.search(r"AND `(\w+)` (>=|>) %s", sql)
+        if since:
+            column, operator, mark = since.group(1), since.group(2), params.pop(0)
+            rows = [row for row in rows if row[column] > mark or (operator == '>=' and row[column] == mark)]
+        if "AS row_count" in sql:
+            return [{'row_count': len(rows)}]
+        if "AS serial_count" in sql:
+            return [{'serial_count': len({row['sno'] for row in rows})}]
+        if "ORDER BY BINARY `sno`, `timestamp`" in sql:
+            rows = sorted(rows, key=lambda row: (row['sno'].encode(), row['timestamp']))
+        if " AS step" in sql:
+            # 服务端截取失败步骤与默认解析器一致
+            rows = [dict(row, step=FPYEngine.extract_failure_step(row['os0'])) for row in rows
+                    if row['os0'] and ('Test Step: ' in row['os0'] or 'Fail Step: ' in row['os0'])]
+        return rows
+
+    def aggregate(self, sql, params):
+        """服务端聚合查询：改写为SQLite语法后在内存数据库中执行，检查的是SQL本身的计算结果
+        SQLite的比较、GROUP BY和LOCATE都区分大小写，对应MySQL中的BINARY和utf8mb4_bin"""
+        import sqlite3
+        columns = ('artno', 'sno', 'traceid', 'test', 'io', 'os0', 'timestamp', 'id')
+        connection = sqlite3.connect(":memory:")
+        connection.create_function("LOCATE", 2, lambda part, text: None if text is None else text.find(part) + 1)
+        connection.create_function("CHAR_LENGTH", 1, lambda value: None if value is None else len(str(value)))
+        # 不声明字段类型：整数和字符串原样保存，与MySQL中io等字段取到的Python值一致
+        connection.execute(f"CREATE TABLE lc_p1 ({', '.join(columns)})")
+        connection.executemany(f"INSERT INTO lc_p1 VALUES ({', '.join('?' * len(columns))})",
+                               [tuple(row.get(column) for column in columns) for row in self.rows])
+        sql = re.sub(r"_utf8mb4('[^']*') COLLATE utf8mb4_bin", r"\1", sql)
+        sql = re.sub(r"CHAR\((\d+) USING utf8mb4\)",
+                     lambda match: "char(%d)" % ord(int(match.group(1)).to_bytes(4, 'big').lstrip(b'\0').decode()), sql)
+        sql = re.sub(r"CAST\((\w+) AS BINARY\)", r"CAST(\1 AS BLOB)", sql)
+        sql = sql.replace("BINARY ", "").replace("%s", "?").replace("%%", "%")
+        cursor = connection.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor]
+        connection.close()
+        return rows
+
+@pytest.fixture
+def lc_db(tmp_path, monkeypatch):
+    """在临时目录中写好配置文件，pymysql.connect返回模拟连接；每个测试的缓存和连接池都是新的"""
+    import pymysql
+    monkeypatch.chdir(tmp_path)
+    with open("p1.env", "w", encoding="utf-8") as f:
+        f.write(ENV)
+    database = FakeLCDatabase(generate_rows(6000))
+    database.write_config()
+    monkeypatch.setattr(pymysql, "connect", lambda **kwargs: FakeConnection(database))
+    FPYEngine._env_config_cache.clear()
+    FPYEngine._table_exists_cache.clear()
+    FPYEngine._explain_checked_tables.clear()
+    FPYEngine.close_connection_pools()
+    FPYEngine._connection_pools.clear()
+    yield database
+    FPYEngine.close_connection_pools()
+    FPYEngine._connection_pools.clear()
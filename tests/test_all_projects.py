@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# 全部项目并行计算：同一数据表且读取配置相同的项目共用一次查询，结果与逐个项目计算一致，一个项目出错不影响其它项目
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+MORE_PROJECTS = """
+[P2]
+env_file = p1.env
+table_name = lc_p1
+batch_size = 777
+Hipot = 201
+Vis = VIS
+
+[P3]
+env_file = p1.env
+table_name = lc_p1
+fetch_mode = stream
+Burn = 201,301
+
+[BROKEN]
+env_file = p1.env
+table_name = lc_p1
+partition = month
+Hipot = 201
+"""
+
+def data_scans(queries):
+    return sum(query.lstrip().startswith("SELECT") for query in queries)
+
+def test_all_projects_match_single_project_runs(lc_db):
+    lc_db.write_config(MORE_PROJECTS)
+    singles = {project: FPYEngine.analyze_project(project, START_DATE, END_DATE) for project in ("P1", "P2", "P3")}
+    lc_db.queries.clear()
+    finished = []
+    results = FPYEngine.analyze_all_projects(START_DATE, END_DATE, on_result=finished.append)
+    assert list(results) == ["P1", "P2", "P3", "BROKEN"]
+    for project, single in singles.items():
+        assert results[project].fpy == single.fpy
+        assert results[project].failures == single.failures
+        assert results[project].row_count == single.row_count
+        assert results[project].error is None
+    # P1和P2共用一次查询，P3的读取方式不同单独查询，BROKEN在查询前出错
+    assert data_scans(lc_db.queries) == 2
+    assert sorted(result.project for result in finished) == sorted(results)
+
+def test_failing_project_is_reported_without_stopping_others(lc_db):
+    lc_db.write_config(MORE_PROJECTS)
+    results = FPYEngine.analyze_all_projects(START_DATE, END_DATE)
+    assert "partition" in results["BROKEN"].error
+    assert results["BROKEN"].fpy == {}
+    assert all(results[project].fpy for project in ("P1", "P2", "P3"))
+
+def test_progress_reports_completed_projects(lc_db):
+    lc_db.write_config(MORE_PROJECTS)
+    reports = []
+    FPYEngine.analyze_all_projects(START_DATE, END_DATE, progress=lambda *report: reports.append(report))
+    assert reports[-1][1:] == (4, 4)
+    assert max(rows for rows, _, _ in reports) > 0
+
+@pytest.mark.parametrize("engine", ["server", "process"])
+def test_engine_override_applies_to_every_project(lc_db, engine):
+    lc_db.write_config(MORE_PROJECTS)
+    python = FPYEngine.analyze_all_projects(START_DATE, END_DATE, engine="python")
+    other = FPYEngine.analyze_all_projects(START_DATE, END_DATE, engine=engine)
+    for project in ("P1", "P2", "P3"):
+        assert other[project].fpy == pytest.approx(python[project].fpy)
+        assert other[project].row_count == python[project].row_count
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# 按变种号细分（by_artno）：各变种号的结果与只用该变种号的数据逐行计算一致，Python引擎和多进程分片引擎结果相同
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+from test_equivalence import assert_same, brute_force, in_range
+
+@pytest.mark.parametrize("engine", ["python", "process"])
+@pytest.mark.parametrize("settings", ["", "two_phase_fetch = true"])
+def test_variants_match_brute_force_per_artno(lc_db, engine, settings):
+    lc_db.write_config(settings + "\nprocess_workers = 3")
+    result = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine=engine, by_artno=True)
+    rows = in_range(lc_db.rows)
+    assert list(result.variants) == ['A1', 'A2']
+    for artno, variant in result.variants.items():
+        variant_rows = [row for row in rows if row['artno'] == artno]
+        expected_fpy, expected_failures = brute_force(variant_rows)
+        assert_same(variant, {name: expected_fpy[name] for name in variant.fpy}, expected_failures)
+        assert variant.row_count == len(variant_rows)
+    assert sum(variant.row_count for variant in result.variants.values()) == result.row_count
+
+def test_process_variants_equal_python_variants(lc_db):
+    lc_db.write_config("process_workers = 2")
+    python, process = [FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine=engine, by_artno=True)
+                       for engine in ("python", "process")]
+    for artno in python.variants:
+        assert process.variants[artno].fpy == pytest.approx(python.variants[artno].fpy)
+        assert [process.variants[artno].top_failures(name) for name in python.fpy] == \
+               [python.variants[artno].top_failures(name) for name in python.fpy]
+
+def test_variant_omits_stations_it_never_tested(lc_db):
+    lc_db.rows = [row for row in lc_db.rows if not (row['artno'] == 'A2' and row['test'] == 'BURN')]
+    result = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine="process", by_artno=True)
+    assert 'Burn' in result.variants['A1'].fpy
+    assert 'Burn' not in result.variants['A2'].fpy
+    # 配置值为空的工站总是输出0
+    assert result.variants['A2'].fpy['Empty'] == 0.0
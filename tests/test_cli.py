@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# 命令行模式：不导入tkinter，出错时返回退出码和错误信息而不是弹窗
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_loads_no_gui_or_database_modules():
+    code = ("import sys, FPYEngine; "
+            "print([name for name in sys.modules if name.split('.')[0] in "
+            "('tkinter', 'tkcalendar', 'pymysql', 'dotenv', 'multiprocessing')])")
+    output = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+def test_json_output_matches_analysis(lc_db, capsys):
+    expected = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert FPYEngine.main(["--project", "P1", "--from", START_DATE, "--to", END_DATE, "--format", "json"]) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data['project'] == "P1"
+    assert data['row_count'] == expected.row_count
+    assert data['fpy'] == {name: round(rate, 4) for name, rate in expected.fpy.items()}
+    assert data['top_failures'] == {name: [list(item) for item in expected.top_failures(name)]
+                                    for name in expected.failures}
+
+def test_text_output_lists_every_station(lc_db, capsys):
+    assert FPYEngine.main(["--project", "P1", "--from", START_DATE, "--to", END_DATE]) == 0
+    out = capsys.readouterr().out
+    for station_name in FPYEngine.get_station_plan("P1").names:
+        assert station_name in out
+
+def test_all_projects_json(lc_db, capsys):
+    assert FPYEngine.main(["--all", "--from", START_DATE, "--to", END_DATE, "--format", "json"]) == 0
+    assert [item['project'] for item in json.loads(capsys.readouterr().out)] == ["P1"]
+
+def test_configuration_error_goes_to_stderr(lc_db, capsys):
+    assert FPYEngine.main(["--project", "NOPE", "--from", START_DATE, "--to", END_DATE]) == 1
+    captured = capsys.readouterr()
+    assert "NOPE" in captured.err
+    assert captured.out == ""
+
+@pytest.mark.parametrize("argv", [
+    ["--project", "P1", "--from", END_DATE, "--to", START_DATE],
+    ["--project", "P1", "--from", "2026-13-01", "--to", END_DATE],
+    ["--project", "P1", "--from", START_DATE],
+    ["--all", "--from", START_DATE, "--to", END_DATE, "--trend", "day"],
+])
+def test_invalid_arguments_exit_with_usage_error(lc_db, argv):
+    with pytest.raises(SystemExit) as exc_info:
+        FPYEngine.main(argv)
+    assert exc_info.value.code == 2
+
+def test_module_runs_as_script(lc_db, tmp_path):
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    output = subprocess.run([sys.executable, "-m", "FPYEngine", "--project", "NOPE", "--from", START_DATE,
+                             "--to", END_DATE], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert output.returncode == 1
+    assert "NOPE" in output.stderr
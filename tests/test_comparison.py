@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# 环比对比：两个日期范围一次查询读取，各期结果与分别计算一致，FPY变化和失败步骤排名变化按两期结果计算
+import json
+
+import pytest
+
+import FPYEngine
+
+BASE = ("2026-10-01", "2026-10-04")
+CURRENT = ("2026-10-06", "2026-10-09")
+
+@pytest.mark.parametrize("first_pass", ["single", "first_attempt"])
+def test_each_period_matches_a_separate_run(lc_db, first_pass):
+    lc_db.write_config(f"first_pass = {first_pass}")
+    separate = [FPYEngine.analyze_project("P1", *date_range) for date_range in (BASE, CURRENT)]
+    lc_db.queries.clear()
+    comparison = FPYEngine.analyze_comparison("P1", BASE, CURRENT)
+    assert sum(query.lstrip().startswith("SELECT") for query in lc_db.queries) == 1
+    for result, expected in zip((comparison.base, comparison.current), separate):
+        assert result.fpy == expected.fpy
+        assert result.failures == expected.failures
+        assert result.row_count == expected.row_count
+    assert comparison.row_count == sum(result.row_count for result in separate)
+
+def test_fpy_deltas_and_rank_changes(lc_db):
+    comparison = FPYEngine.analyze_comparison("P1", BASE, CURRENT)
+    for station_name, base_rate, current_rate, delta in comparison.fpy_deltas():
+        assert base_rate == comparison.base.fpy[station_name]
+        assert current_rate == comparison.current.fpy[station_name]
+        assert delta == pytest.approx(current_rate - base_rate)
+    for station_name in comparison.station_names:
+        base_ranks = [step for step, _ in comparison.base.failures[station_name].most_common()]
+        changes = comparison.failure_changes(station_name)
+        assert [step for step, *_ in changes] == [step for step, _ in comparison.current.top_failures(station_name)]
+        for step, rank, base_rank, count, base_count in changes:
+            assert count == comparison.current.failures[station_name][step]
+            assert base_count == comparison.base.failures[station_name][step]
+            assert base_rank == (base_ranks.index(step) + 1 if step in base_ranks else None)
+        for step, base_count, current_count, change in comparison.failure_movers(station_name):
+            assert change == current_count - base_count != 0
+
+def test_empty_period_has_no_rates(lc_db):
+    comparison = FPYEngine.analyze_comparison("P1", ("2026-09-01", "2026-09-05"), CURRENT)
+    assert comparison.base.row_count == 0
+    for _, base_rate, current_rate, delta in comparison.fpy_deltas():
+        assert base_rate is None and delta is None
+        assert current_rate is not None
+
+@pytest.mark.parametrize("base_range, current_range", [
+    (("2026-10-01", "2026-10-06"), CURRENT),
+    (("2026-10-05", "2026-10-01"), CURRENT),
+])
+def test_invalid_ranges_are_rejected(lc_db, base_range, current_range):
+    with pytest.raises(FPYEngine.FPYError):
+        FPYEngine.analyze_comparison("P1", base_range, current_range)
+
+def test_rank_change_labels():
+    assert FPYEngine.rank_change(1, None) == "新进"
+    assert FPYEngine.rank_change(2, 7) == "新进"
+    assert FPYEngine.rank_change(2, 2) == "-"
+    assert FPYEngine.rank_change(1, 3) == "↑2"
+    assert FPYEngine.rank_change(4, 1) == "↓3"
+
+def test_previous_period_has_the_same_length():
+    assert FPYEngine.previous_period("2026-10-05", "2026-10-09") == ("2026-09-30", "2026-10-04")
+
+def test_cli_compares_with_the_previous_period(lc_db, capsys):
+    assert FPYEngine.main(["--project", "P1", "--from", CURRENT[0], "--to", CURRENT[1], "--compare",
+                           "--compare-from", BASE[0], "--compare-to", BASE[1], "--format", "json"]) == 0
+    data = json.loads(capsys.readouterr().out)
+    comparison = FPYEngine.analyze_comparison("P1", BASE, CURRENT)
+    assert data['base']['row_count'] == comparison.base.row_count
+    assert data['fpy_deltas'] == {station_name: round(delta, 4) for station_name, _, _, delta in comparison.fpy_deltas()}
+    assert FPYEngine.main(["--project", "P1", "--from", CURRENT[0], "--to", CURRENT[1], "--compare"]) == 0
+    assert "上期" in capsys.readouterr().out
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# 各计算路径的等价性：不同引擎、读取方式、分区合并、首次测试判断、实时监控与逐件直通率都应与逐行暴力计算一致
+from collections import Counter, defaultdict
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+def data_scans(queries):
+    """读取LC数据行的查询次数（不含计数等汇总查询）"""
+    return sum(query.lstrip().startswith("SELECT") and " AS " not in query for query in queries)
+
+def in_range(rows, startdate=START_DATE, enddate=END_DATE):
+    return [row for row in rows if startdate <= row['timestamp'][:10] <= enddate]
+
+# 暴力计算按改造前（基线24faa60）的extract_station_data等逻辑逐工站筛选数据行，不使用FPYEngine的工站索引和解析器
+def baseline_station_value(value):
+    """基线的parse_station_value：含逗号为traceid列表，能转为整数为traceid，否则为test"""
+    if ',' in value:
+        return [int(v.strip()) for v in value.split(',')]
+    try:
+        return int(value)
+    except ValueError:
+        return value.strip()
+
+def baseline_station_rows(rows, project="P1"):
+    """工站名 -> 属于该工站的数据行；Function按test拆分为PRE和EOL，配置值为空的工站为None"""
+    stations = {}
+    for station_name, value in FPYEngine.load_stations_config()[project].items():
+        if station_name in FPYEngine.NON_STATION_KEYS:
+            continue
+        value = baseline_station_value(value)
+        if not value:
+            stations[station_name] = None
+            continue
+        if isinstance(value, list):
+            station_rows = [row for row in rows if row['traceid'] in value]
+        elif isinstance(value, int):
+            station_rows = [row for row in rows if row['traceid'] == value]
+        else:
+            station_rows = [row for row in rows if row['test'] == value]
+        if station_name == 'Function':
+            for test in ('PRE', 'EOL'):
+                stations[test] = [row for row in station_rows if row['test'] == test]
+        else:
+            stations[station_name] = station_rows
+    return stations
+
+def baseline_is_pass(io_value):
+    return io_value == "-1" or io_value == -1 or (isinstance(io_value, str) and io_value.strip() == "-1")
+
+def baseline_failure_step(os0_value):
+    """先找'Test Step: '再找'Fail Step: '，取标记后第10到19个字符"""
+    if os0_value and isinstance(os0_value, str):
+        for marker in ('Test Step: ', 'Fail Step: '):
+            if marker in os0_value:
+                idx = os0_value.index(marker)
+                return os0_value[idx + 10:idx + 19]
+    return None
+
+def first_passed(tests, first_attempt):
+    """tests为一个sno在工站的[(timestamp, 是否通过)]：single为只测试一次且通过，first_attempt为第一次测试通过"""
+    return min(tests)[1] if first_attempt else len(tests) == 1 and tests[0][1]
+
+def brute_force(rows, first_attempt=False):
+    """逐工站计算FPY和失败计数"""
+    fpy = {}
+    failures = {}
+    for station_name, station_rows in baseline_station_rows(rows).items():
+        failures[station_name] = Counter()
+        if not station_rows:
+            fpy[station_name] = 0.0
+            continue
+        attempts = defaultdict(list)    # sno -> [(timestamp, 是否通过)]
+        for row in station_rows:
+            attempts[row['sno']].append((row['timestamp'], baseline_is_pass(row['io'])))
+            step = baseline_failure_step(row['os0'])
+            if step is not None:
+                failures[station_name][step] += 1
+        fpy[station_name] = sum(first_passed(tests, first_attempt) for tests in attempts.values()) / len(attempts)
+    return fpy, failures
+
+def assert_same(result, expected_fpy, expected_failures):
+    assert result.fpy == pytest.approx(expected_fpy)
+    assert {name: dict(steps) for name, steps in result.failures.items()} == \
+           {name: dict(steps) for name, steps in expected_failures.items()}
+
+@pytest.mark.parametrize("engine", ["python", "process"])
+@pytest.mark.parametrize("settings", ["", "fetch_mode = stream", "two_phase_fetch = true"])
+def test_engines_match_brute_force(lc_db, engine, settings):
+    lc_db.write_config(settings + "\nprocess_workers = 3")
+    result = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine=engine)
+    expected_fpy, expected_failures = brute_force(in_range(lc_db.rows))
+    assert_same(result, expected_fpy, expected_failures)
+    assert result.row_count == len(in_range(lc_db.rows))
+
+def test_top_failures_order_matches_across_engines(lc_db):
+    results = [FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine=engine)
+               for engine in ("python", "process")]
+    tops = [[result.top_failures(name) for name in result.fpy] for result in results]
+    assert tops[0] == tops[1]
+
+@pytest.mark.parametrize("partition", ["day", "week"])
+def test_partitioned_fetch_merges_to_unpartitioned_result(lc_db, partition):
+    whole = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    lc_db.write_config(f"partition = {partition}\nfetch_workers = 3")
+    lc_db.queries.clear()
+    merged = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert merged.fpy == whole.fpy
+    assert merged.failures == whole.failures
+    assert merged.row_count == whole.row_count
+    if partition == "day":
+        assert data_scans(lc_db.queries) > 1
+
+def test_day_cache_matches_uncached(lc_db):
+    uncached = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    first = FPYEngine.analyze_project("P1", START_DATE, END_DATE, use_cache=True)
+    lc_db.queries.clear()
+    cached = FPYEngine.analyze_project("P1", START_DATE, END_DATE, use_cache=True)
+    for result in (first, cached):
+        assert result.fpy == uncached.fpy
+        assert result.failures == uncached.failures
+    assert not data_scans(lc_db.queries)
+
+@pytest.mark.parametrize("settings", ["", "two_phase_fetch = true"])
+def test_first_attempt_matches_brute_force(lc_db, settings):
+    lc_db.write_config("first_pass = first_attempt\n" + settings)
+    result = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    expected_fpy, expected_failures = brute_force(in_range(lc_db.rows), first_attempt=True)
+    assert_same(result, expected_fpy, expected_failures)
+
+def test_first_attempt_trend_uses_first_test_in_each_bucket(lc_db):
+    lc_db.write_config("first_pass = first_attempt")
+    trend = FPYEngine.analyze_trend("P1", START_DATE, END_DATE)
+    for day, result in trend.results.items():
+        rows = in_range(lc_db.rows, day, day)
+        if rows:
+            assert result.fpy == pytest.approx(brute_force(rows, first_attempt=True)[0])
+
+def test_first_attempt_orders_sno_by_binary_value(lc_db):
+    lc_db.write_config("first_pass = first_attempt")
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert any("ORDER BY BINARY `sno`, `timestamp`" in query for query in lc_db.queries)
+
+@pytest.mark.parametrize("mark", ["", "live_id_column = id"])
+@pytest.mark.parametrize("first_pass", ["single", "first_attempt"])
+def test_live_monitor_matches_full_recompute(lc_db, mark, first_pass):
+    all_rows = lc_db.rows
+    lc_db.write_config(f"{mark}\nfirst_pass = {first_pass}")
+    monitor = FPYEngine.LiveMonitor("P1", START_DATE)
+    for cut in (1000, 1000, 2500, 4001, 6000):
+        lc_db.rows = all_rows[:cut]
+        live = monitor.refresh()
+        full = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+        assert live.fpy == full.fpy
+        assert live.failures == full.failures
+        assert live.row_count == full.row_count == cut
+
+def test_live_monitor_counts_identical_rows_at_the_boundary(lc_db):
+    rows = [{key: value for key, value in row.items() if key != 'id'} for row in lc_db.rows[:3000]]
+    lc_db.rows = rows
+    monitor = FPYEngine.LiveMonitor("P1", START_DATE)
+    monitor.refresh()
+    # 与上次读到的最后一行完全相同的新行
+    duplicate = dict(max(rows, key=lambda row: row['timestamp']))
+    for _ in range(2):
+        rows.append(dict(duplicate))
+        live = monitor.refresh()
+        assert monitor.new_rows == 1
+        full = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+        assert live.fpy == full.fpy
+        assert live.row_count == full.row_count == len(rows)
+    monitor.refresh()
+    assert monitor.new_rows == 0
+
+def brute_force_rolled(rows, first_attempt=False):
+    """sno -> 未一次通过的工站集合"""
+    attempts = defaultdict(lambda: defaultdict(list))
+    for station_name, station_rows in baseline_station_rows(rows).items():
+        for row in station_rows or ():
+            attempts[row['sno']][station_name].append((row['timestamp'], baseline_is_pass(row['io'])))
+    return {sno: {name for name, tests in stations.items() if not first_passed(tests, first_attempt)}
+            for sno, stations in attempts.items()}
+
+@pytest.mark.parametrize("first_pass", ["single", "first_attempt"])
+@pytest.mark.parametrize("max_serials", [None, 300])
+def test_rolled_yield_partitions_match_single_pass(lc_db, first_pass, max_serials):
+    lc_db.write_config(f"first_pass = {first_pass}")
+    result = FPYEngine.analyze_rolled_yield("P1", START_DATE, END_DATE, max_serials=max_serials)
+    expected = brute_force_rolled(in_range(lc_db.rows), first_attempt=first_pass == "first_attempt")
+    assert result.unit_count == len(expected)
+    assert result.pass_count == sum(not stations for stations in expected.values())
+    assert result.escaped_count == sum(bool(stations) for stations in expected.values())
+    for sno, _, station_names in result.escaped:
+        assert set(station_names) == expected[sno]
+    if max_serials:
+        # 先按sno数预估分片数，每个分片只扫描一遍
+        assert result.partitions > 1
+        assert data_scans(lc_db.queries) == result.partitions
+
+def test_rolled_yield_splits_only_the_overflowing_partition(lc_db, monkeypatch):
+    # 预估的sno数偏小时，超过上限的分片拆成两片重扫，已完成的分片不重扫
+    monkeypatch.setattr(FPYEngine, "count_lc_serials", lambda *args, **kwargs: 1)
+    result = FPYEngine.analyze_rolled_yield("P1", START_DATE, END_DATE, max_serials=600)
+    expected = brute_force_rolled(in_range(lc_db.rows))
+    assert result.unit_count == len(expected)
+    assert result.pass_count == sum(not stations for stations in expected.values())
+    assert result.partitions > 1
+    # 每次拆分多扫一遍，扫描次数为拆分树的节点数
+    assert data_scans(lc_db.queries) == 2 * result.partitions - 1
+
+def test_unknown_engine_falls_back_to_python(lc_db):
+    lc_db.write_config("engine = numpy")
+    with pytest.warns(UserWarning, match="numpy"):
+        result = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert result.fpy == pytest.approx(brute_force(in_range(lc_db.rows))[0])
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# 界面任务排队：实时监控停止后，排队中的刷新不再执行（不创建Tk窗口，只检查任务状态）
+import pytest
+
+pytest.importorskip("tkinter")
+pytest.importorskip("tkcalendar")
+
+import FPYFromLC_V2
+from FPYFromLC_V2 import LIVE_MODE
+
+class FakeWidget:
+    def config(self, **options):
+        pass
+
+class FakeRoot:
+    def __init__(self):
+        self.cancelled = []
+
+    def after_cancel(self, timer):
+        self.cancelled.append(timer)
+
+def make_gui():
+    gui = FPYFromLC_V2.FPY_LC.__new__(FPYFromLC_V2.FPY_LC)
+    gui.root = FakeRoot()
+    gui.btn_live = FakeWidget()
+    gui.live_monitor = None
+    gui.live_timer = None
+    gui.running_job = None
+    gui.pending_job = None
+    return gui
+
+def test_stop_live_drops_pending_refresh():
+    gui = make_gui()
+    gui.live_monitor = type('Monitor', (), {'project': 'P1', 'startdate': '2026-10-01'})()
+    gui.running_job = ('P1', '2026-10-01', '2026-10-09', None)
+    gui.refresh_live()
+    assert gui.pending_job == ('P1', '2026-10-01', None, LIVE_MODE)
+    gui.stop_live()
+    assert gui.live_monitor is None
+    assert gui.pending_job is None
+
+def test_stop_live_keeps_other_pending_job():
+    gui = make_gui()
+    gui.pending_job = ('P1', '2026-10-01', '2026-10-09', None)
+    gui.stop_live()
+    assert gui.pending_job == ('P1', '2026-10-01', '2026-10-09', None)
+
+def test_live_job_is_skipped_after_monitor_stopped():
+    gui = make_gui()
+    gui.pending_job = ('P1', '2026-10-01', None, LIVE_MODE)
+    gui.start_analysis(gui.pending_job)
+    assert gui.running_job is None
+    assert gui.pending_job is None
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# 数据读取层：元组行转为列式LCBatch，两种读取方式结果相同，读完后不保留元组行
+import sys
+import tracemalloc
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE, generate_rows
+
+def read_batches(fetch_mode, batch_size=500):
+    return FPYEngine.read_lc_batches("p1.env", START_DATE, END_DATE, "lc_p1", fetch_mode, batch_size)
+
+def test_buffered_and_stream_return_the_same_rows(lc_db):
+    buffered = list(read_batches('buffered'))
+    stream = list(read_batches('stream'))
+    assert len(buffered) == 1
+    assert len(stream) > 1
+    assert buffered[0].to_dicts() == [row for batch in stream for row in batch.to_dicts()]
+    assert len(buffered[0]) == sum(START_DATE <= row['timestamp'][:10] <= END_DATE for row in lc_db.rows)
+
+def test_repeated_values_share_one_object(lc_db):
+    batch = next(read_batches('buffered'))
+    snos = {}
+    for sno in batch.get('sno'):
+        assert snos.setdefault(sno, sno) is sno
+
+def test_buffered_read_releases_tuple_rows(lc_db):
+    # 模拟游标与pymysql一样在游标和连接上保留普通游标的全部结果；交出数据时只应占用列式数据
+    # （每行每列一个引用）、去重字典和元组空闲链表等固定开销，不应再为每行占用一个元组
+    lc_db.rows = generate_rows(30000)
+    list(read_batches('buffered'))    # 先完成模块导入和连接池初始化
+    batches = read_batches('buffered')
+    tracemalloc.start()
+    try:
+        batch = next(batches)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    tuple_bytes = len(batch) * sys.getsizeof(tuple(range(len(batch.columns))))
+    column_bytes = sum(sys.getsizeof(values) for values in batch.data.values())
+    assert current < column_bytes + tuple_bytes / 2
+    batches.close()
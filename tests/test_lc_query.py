@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# LC数据查询：timestamp按半开区间比较以便使用索引，表存在检查按表缓存，explain_check在缺少可用索引时提示
+import warnings
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+def test_query_compares_timestamp_without_wrapping_it(lc_db):
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    data_queries = [query for query in lc_db.queries if query.lstrip().startswith("SELECT")]
+    assert data_queries
+    for query in data_queries:
+        assert "`timestamp` >= %s AND `timestamp` < %s" in query
+        assert "LEFT(" not in query
+    # 结束日期当天的数据也在范围内
+    assert FPYEngine.date_range_params("2026-10-01", "2026-10-31") == ("2026-10-01", "2026-11-01")
+
+def test_show_tables_runs_once_per_table(lc_db):
+    for _ in range(3):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert sum(query.startswith("SHOW TABLES") for query in lc_db.queries) == 1
+
+def test_missing_table_is_not_cached(lc_db, monkeypatch):
+    select = lc_db.select
+    monkeypatch.setattr(lc_db, "select", lambda sql, params: [] if sql.startswith("SHOW TABLES") else select(sql, params))
+    for _ in range(2):
+        with pytest.raises(FPYEngine.LCDataError, match="lc_p1"):
+            FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert sum(query.startswith("SHOW TABLES") for query in lc_db.queries) == 2
+
+def plan_database(lc_db, monkeypatch, index_rows, plan_rows):
+    """SHOW INDEX和EXPLAIN返回给定的行"""
+    select = lc_db.select
+
+    def planned_select(sql, params):
+        if sql.startswith("SHOW INDEX"):
+            return index_rows
+        if sql.startswith("EXPLAIN"):
+            return plan_rows
+        return select(sql, params)
+    monkeypatch.setattr(lc_db, "select", planned_select)
+
+def test_explain_warns_once_when_timestamp_has_no_index(lc_db):
+    lc_db.write_config("explain_check = true")
+    with pytest.warns(UserWarning, match="timestamp列没有索引"):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    # 每张表只检查一次
+    lc_db.queries.clear()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert not any(query.startswith(("SHOW INDEX", "EXPLAIN")) for query in lc_db.queries)
+
+@pytest.mark.parametrize("index_rows", [
+    [{'Column_name': 'timestamp', 'Seq_in_index': 1}],
+    # timestamp不是索引首列时不能用于范围查询
+    [{'Column_name': 'sno', 'Seq_in_index': 1}, {'Column_name': 'timestamp', 'Seq_in_index': 2}],
+])
+def test_explain_warns_on_full_table_scan(lc_db, monkeypatch, index_rows):
+    lc_db.write_config("explain_check = true")
+    plan_database(lc_db, monkeypatch, index_rows, [{'type': 'ALL'}])
+    with pytest.warns(UserWarning, match="全表扫描"):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+
+def test_explain_is_quiet_when_index_is_used(lc_db, monkeypatch):
+    lc_db.write_config("explain_check = true")
+    plan_database(lc_db, monkeypatch, [{'Column_name': 'timestamp', 'Seq_in_index': 1}], [{'type': 'range'}])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert any(query.startswith("EXPLAIN") for query in lc_db.queries)
+
+def test_no_explain_unless_configured(lc_db):
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert not any(query.startswith(("SHOW INDEX", "EXPLAIN")) for query in lc_db.queries)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# 连接池与配置缓存：连接跨查询复用并做健康检查，.env和工站配置只在文件修改后重新解析
+import os
+
+import pymysql
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE, FakeConnection
+
+def counting_connect(lc_db, monkeypatch):
+    """pymysql.connect改为记录每次新建的连接"""
+    created = []
+
+    def connect(**kwargs):
+        created.append(FakeConnection(lc_db))
+        return created[-1]
+    monkeypatch.setattr(pymysql, "connect", connect)
+    return created
+
+def touch_later(filename):
+    """把文件修改时间推后，保证与上次解析时不同"""
+    mtime = os.path.getmtime(filename) + 10
+    os.utime(filename, (mtime, mtime))
+
+def test_connection_is_reused_across_analyses(lc_db, monkeypatch):
+    created = counting_connect(lc_db, monkeypatch)
+    for _ in range(3):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert len(created) == 1
+    assert created[0].open
+
+def test_broken_idle_connection_is_replaced(lc_db, monkeypatch):
+    created = counting_connect(lc_db, monkeypatch)
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+
+    def broken_ping(reconnect=False):
+        raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+    created[0].ping = broken_ping
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert len(created) == 2
+    assert not created[0].open
+
+def test_idle_timeout_closes_stale_connection(lc_db, monkeypatch):
+    created = counting_connect(lc_db, monkeypatch)
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    FPYEngine.get_connection_pool("p1.env").idle_timeout = -1
+    FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert len(created) == 2
+    assert not created[0].open
+
+def test_pool_size_is_bounded(lc_db):
+    pool = FPYEngine.ConnectionPool(FPYEngine.get_env_config("p1.env"), max_size=1, acquire_timeout=0.05)
+    connection = pool.acquire()
+    with pytest.raises(FPYEngine.FPYError, match="连接超时"):
+        pool.acquire()
+    pool.release(connection)
+    assert pool.acquire() is connection
+
+def test_failed_query_does_not_return_connection(lc_db, monkeypatch):
+    created = counting_connect(lc_db, monkeypatch)
+    with pytest.raises(RuntimeError):
+        with FPYEngine.pooled_connection("p1.env"):
+            raise RuntimeError("query failed")
+    assert not created[0].open
+    with FPYEngine.pooled_connection("p1.env") as connection:
+        assert connection is created[1]
+
+def test_env_file_is_parsed_once_until_modified(lc_db, monkeypatch):
+    import dotenv
+    calls = []
+    dotenv_values = dotenv.dotenv_values
+    monkeypatch.setattr(dotenv, "dotenv_values", lambda filename: calls.append(filename) or dotenv_values(filename))
+    for _ in range(3):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert len(calls) == 1
+    pool = FPYEngine.get_connection_pool("p1.env")
+    with open("p1.env", "a", encoding="utf-8") as f:
+        f.write("DB_HOST=other.invalid\n")
+    touch_later("p1.env")
+    assert FPYEngine.get_env_config("p1.env")['host'] == "other.invalid"
+    assert len(calls) == 2
+    # 数据库配置变化后连接池重建
+    assert FPYEngine.get_connection_pool("p1.env") is not pool
+
+def test_station_plan_is_rebuilt_only_after_config_changes(lc_db):
+    config = FPYEngine.load_stations_config()
+    plan = FPYEngine.get_station_plan("P1")
+    assert FPYEngine.load_stations_config() is config
+    assert FPYEngine.get_station_plan("P1") is plan
+    with open("stations_config.ini", "a", encoding="utf-8") as f:
+        f.write("Extra = 999\n")
+    touch_later("stations_config.ini")
+    new_plan = FPYEngine.get_station_plan("P1")
+    assert new_plan is not plan
+    assert new_plan.names[-1] == "Extra"
+    assert new_plan.route(999, None) == ("Extra",)
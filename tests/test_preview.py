@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# 抽样预览：只读取CRC32(sno)落在样本中的序列号，结果与对样本逐行计算一致，并附带置信区间
+from collections import Counter
+import json
+import zlib
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+from test_equivalence import assert_same, brute_force, in_range
+
+def sampled(rows, modulus, remainder):
+    return [row for row in rows if zlib.crc32(row['sno'].encode()) % modulus == remainder]
+
+@pytest.mark.parametrize("settings", ["", "two_phase_fetch = true", "first_pass = first_attempt"])
+def test_preview_matches_brute_force_on_the_sample(lc_db, settings):
+    lc_db.write_config(settings)
+    result = FPYEngine.analyze_preview("P1", START_DATE, END_DATE, modulus=5, remainder=2)
+    rows = sampled(in_range(lc_db.rows), 5, 2)
+    expected_fpy, expected_failures = brute_force(rows, first_attempt="first_attempt" in settings)
+    assert_same(result, expected_fpy, expected_failures)
+    assert result.row_count == len(rows)
+    assert result.sample_modulus == 5
+    assert all("MOD(CRC32(sno), %s) = %s" in query for query in lc_db.queries if query.lstrip().startswith("SELECT"))
+
+def test_intervals_contain_sample_and_exact_rates(lc_db):
+    exact = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    result = FPYEngine.analyze_preview("P1", START_DATE, END_DATE, modulus=4)
+    # 配置值为空的工站没有置信区间
+    assert set(result.intervals) == set(result.fpy) - {"Empty"}
+    for station_name, (low, high) in result.intervals.items():
+        assert 0.0 <= low <= result.fpy[station_name] <= high <= 1.0
+        assert low <= exact.fpy[station_name] <= high
+
+def test_samples_partition_the_serials(lc_db):
+    exact = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    previews = [FPYEngine.analyze_preview("P1", START_DATE, END_DATE, modulus=3, remainder=remainder)
+                for remainder in range(3)]
+    assert sum(preview.row_count for preview in previews) == exact.row_count
+    for station_name, failures in exact.failures.items():
+        assert sum((preview.failures[station_name] for preview in previews), Counter()) == failures
+
+def test_wilson_interval():
+    assert FPYEngine.wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = FPYEngine.wilson_interval(0, 10)
+    assert low == 0.0 and 0.0 < high < 0.5
+    narrow = FPYEngine.wilson_interval(900, 1000)
+    wide = FPYEngine.wilson_interval(9, 10)
+    assert wide[0] < narrow[0] < 0.9 < narrow[1] < wide[1]
+
+@pytest.mark.parametrize("modulus, remainder", [(0, 0), (5, 5), (5, -1)])
+def test_invalid_sample_is_rejected(lc_db, modulus, remainder):
+    with pytest.raises(FPYEngine.FPYError, match="抽样参数无效"):
+        FPYEngine.analyze_preview("P1", START_DATE, END_DATE, modulus, remainder)
+
+def test_preview_text_and_json(lc_db, capsys):
+    result = FPYEngine.analyze_preview("P1", START_DATE, END_DATE, modulus=5)
+    assert "1/5" in FPYEngine.preview_note(result)
+    assert FPYEngine.preview_note(FPYEngine.analyze_project("P1", START_DATE, END_DATE)) is None
+    assert "~" in FPYEngine.format_station_rate(result, "Hipot")
+    assert FPYEngine.main(["--project", "P1", "--from", START_DATE, "--to", END_DATE, "--preview", "5",
+                           "--format", "json"]) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data['sample_modulus'] == 5
+    assert data['intervals']['Hipot'] == [round(bound, 4) for bound in result.intervals['Hipot']]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# 多进程分片引擎：各子进程只查询自己分片的序列号，子进程出错或异常退出时抛出FPYError而不是一直等待
+import multiprocessing
+import os
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+def test_each_worker_reads_only_its_shard(lc_db, monkeypatch):
+    lc_db.write_config("process_workers = 3")
+    samples = []
+    feed_lc_data = FPYEngine.feed_lc_data
+
+    def recording_feed(analyzers, *args, **kwargs):
+        row_count = feed_lc_data(analyzers, *args, **kwargs)
+        FPYEngine.show_warning("%d %d %d" % (*kwargs['sample'], row_count))
+        return row_count
+    monkeypatch.setattr(FPYEngine, "feed_lc_data", recording_feed)
+    with FPYEngine.warnings_to(samples.append):
+        result = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine="process")
+    # 子进程的警告转交到主进程
+    shards = sorted(tuple(map(int, sample.split())) for sample in samples)
+    assert [(modulus, shard) for modulus, shard, _ in shards] == [(3, 0), (3, 1), (3, 2)]
+    assert sum(row_count for _, _, row_count in shards) == result.row_count
+    assert all(row_count < result.row_count for _, _, row_count in shards)
+
+def test_dead_worker_raises_instead_of_hanging(lc_db, monkeypatch):
+    lc_db.write_config("process_workers = 2")
+    monkeypatch.setattr(FPYEngine.ShardAnalyzer, "summary", lambda self: os._exit(3))
+    with pytest.raises(FPYEngine.FPYError, match="异常退出"):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine="process")
+
+def test_worker_error_is_raised_in_parent(lc_db, monkeypatch):
+    lc_db.write_config("process_workers = 2")
+
+    def broken_feed(self, rows):
+        raise ValueError("bad row")
+    monkeypatch.setattr(FPYEngine.ShardAnalyzer, "feed", broken_feed)
+    with pytest.raises(FPYEngine.FPYError, match="bad row"):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine="process")
+    assert not multiprocessing.active_children()
+
+def test_cancel_stops_workers(lc_db):
+    lc_db.write_config("process_workers = 2")
+    token = FPYEngine.CancelToken()
+    token.cancel()
+    with pytest.raises(FPYEngine.AnalysisCancelled):
+        FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine="process", cancel_token=token)
+    assert not multiprocessing.active_children()
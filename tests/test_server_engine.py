@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# 服务端聚合引擎：SQL在模拟数据库中改写为SQLite执行，结果应与Python引擎完全一致
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+def server_scans(queries):
+    return [query for query in queries if "GROUP BY" in query]
+
+def assert_same_as_python(lc_db):
+    python = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine='python')
+    lc_db.queries.clear()
+    server = FPYEngine.analyze_project("P1", START_DATE, END_DATE, engine='server')
+    assert server.fpy == python.fpy
+    assert server.failures == python.failures
+    assert server.row_count == python.row_count
+    for station_name in python.fpy:
+        assert server.top_failures(station_name) == python.top_failures(station_name)
+    return server
+
+def test_server_engine_matches_python_engine(lc_db):
+    server = assert_same_as_python(lc_db)
+    assert server.fpy['Empty'] == 0.0
+    # FPY和失败步骤各一次扫描，不按工站重复扫描日期范围
+    scans = server_scans(lc_db.queries)
+    assert len(scans) == 2
+    assert all(scan.count("FROM `lc_p1`") == 1 for scan in scans)
+
+def test_server_top_failures_keep_first_occurrence_order_for_ties(lc_db):
+    # 每个工站中两个步骤次数相同，先出现的（按步骤文本排在后面的）排在前面
+    rows = lc_db.rows
+    for first, second in zip(rows[0::2], rows[1::2]):
+        second['traceid'], second['test'] = first['traceid'], first['test']
+        first['os0'], second['os0'] = 'x Test Step: 2.2.2.2', 'x Test Step: 1.1.1.1'
+    server = assert_same_as_python(lc_db)
+    assert server.top_failures('Hipot') == [(' 2.2.2.2', server.failures['Hipot'][' 2.2.2.2']),
+                                            (' 1.1.1.1', server.failures['Hipot'][' 1.1.1.1'])]
+
+@pytest.mark.parametrize("io_value", ["-1", -1, " -1", "-1\t", "\xa0-1", "-1　", " -1\x1c", "- 1", "-1.0", "", None])
+def test_server_io_pass_matches_str_strip(lc_db, io_value):
+    for index, row in enumerate(lc_db.rows):
+        if index % 3 == 0:
+            row['io'] = io_value
+    assert_same_as_python(lc_db)
+
+def test_is_io_pass_strips_unicode_whitespace():
+    assert FPYEngine.is_io_pass("\xa0-1　")
+    assert FPYEngine.is_io_pass(" -1\n")
+    assert not FPYEngine.is_io_pass("- 1")
+    assert not FPYEngine.is_io_pass(None)
+
+def test_sql_whitespace_set_matches_str_strip():
+    assert FPYEngine.STR_WHITESPACE == "".join(char for char in map(chr, range(0x110000)) if char.isspace())
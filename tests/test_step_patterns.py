@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# 自定义失败步骤格式（step_patterns）的解析
+from collections import Counter
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+@pytest.mark.parametrize("pattern, prefix", [
+    ("Test Step:( .{0,8})", "Test Step:"),
+    ("Err?or (\\d+)", "Er"),
+    ("Error|Fault (\\d+)", ""),
+    ("(?:Error|Fault) (\\d+)", ""),
+    ("Step[|]( \\d+)", "Step"),
+    ("Step\\|( \\d+)", "Step"),
+])
+def test_literal_prefix(pattern, prefix):
+    assert FPYEngine.literal_prefix(pattern) == prefix
+
+def test_top_level_alternation_matches_every_branch():
+    parser = FPYEngine.StepParser(["Error|Fault (\\d+)"])
+    assert parser("Fault 12") == "12"
+    assert parser("xx Fault 7 Fault 8") == "7"
+    assert parser("Error") is None
+
+def test_default_parser_keeps_baseline_slice():
+    # 与原实现一致：从标记最后的空格起取9个字符，Test Step优先
+    assert FPYEngine.extract_failure_step("xx Fail Step: 1.2 Test Step: 12.3.4.5 failed") == " 12.3.4.5"
+    assert FPYEngine.extract_failure_step("Test Step: 1") == " 1"
+    assert FPYEngine.extract_failure_step("no step") is None
+    assert FPYEngine.extract_failure_step(None) is None
+
+def test_invalid_step_pattern_raises_fpy_error():
+    with pytest.raises(FPYEngine.FPYError):
+        FPYEngine.StepParser(["Step (\\d+"])
+    with pytest.raises(FPYEngine.FPYError):
+        FPYEngine.StepParser(["Step \\d+"])
+
+def test_custom_step_patterns_count_failures(lc_db):
+    lc_db.write_config("step_patterns =\n    Fail Step: (\\d+)\n    Test Step: (\\d+)")
+    result = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    station_plan = FPYEngine.get_station_plan("P1")
+    parser = FPYEngine.StepParser(["Fail Step: (\\d+)", "Test Step: (\\d+)"])
+    expected = {name: Counter() for name in station_plan.names}
+    for row in lc_db.rows:
+        step = parser(row['os0'])
+        if step is not None and START_DATE <= row['timestamp'][:10] <= END_DATE:
+            for station_name in station_plan.route(row['traceid'], row['test']):
+                expected[station_name][step] += 1
+    assert result.failures == expected
+    assert result.failures['Hipot']['99'] > 0
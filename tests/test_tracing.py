@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# 运行计时：开启时各阶段的耗时、行数和字节数写入轮转的JSON lines日志，关闭时不记录也不创建日志文件
+import json
+import logging
+import os
+
+import pytest
+
+import FPYEngine
+from conftest import END_DATE, START_DATE
+
+@pytest.fixture
+def tracing(lc_db, monkeypatch):
+    """开启计时，日志写到本测试的临时目录"""
+    monkeypatch.setattr(FPYEngine, "_trace_logger", None)
+    enabled = FPYEngine.tracing_enabled()
+    FPYEngine.set_tracing(True)
+    yield lc_db
+    FPYEngine.set_tracing(enabled)
+    logger = logging.getLogger("FPYEngine.runs")
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+def read_log():
+    with open(FPYEngine.TRACE_LOG_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_run_is_logged_with_span_breakdown(tracing):
+    with FPYEngine.traced_run('project', project="P1", startdate=START_DATE, enddate=END_DATE):
+        result = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    [record] = read_log()
+    assert record['kind'] == 'project'
+    assert record['project'] == "P1"
+    assert record['status'] == 'ok'
+    spans = record['spans']
+    for name in ('connect', 'show_tables', 'query', 'fetch', 'aggregate', 'result'):
+        assert spans[name]['count'] >= 1
+    assert spans['fetch']['rows'] == spans['aggregate']['rows'] == result.row_count
+    assert spans['fetch']['bytes'] > 0
+    assert record['total_seconds'] >= max(span['seconds'] for span in spans.values())
+    assert FPYEngine.last_run_trace().to_dict() == record
+    assert "fetch" in FPYEngine.last_run_trace().breakdown_text()
+
+def test_spans_from_partition_threads_are_recorded(tracing):
+    tracing.write_config("partition = day\nfetch_workers = 3")
+    with FPYEngine.traced_run('project', project="P1"):
+        result = FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    [record] = read_log()
+    assert record['spans']['fetch']['rows'] == result.row_count
+    assert record['spans']['query']['count'] > 1
+    assert record['spans']['merge']['count'] == 1
+
+def test_failed_run_is_logged_as_error(tracing):
+    with pytest.raises(FPYEngine.FPYError):
+        with FPYEngine.traced_run('project', project="NOPE"):
+            FPYEngine.analyze_project("NOPE", START_DATE, END_DATE)
+    assert read_log()[-1]['status'] == 'error'
+
+def test_log_rotates(tracing, monkeypatch):
+    monkeypatch.setattr(FPYEngine, "TRACE_LOG_MAX_BYTES", 500)
+    for _ in range(4):
+        with FPYEngine.traced_run('project', project="P1"):
+            FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert os.path.exists(FPYEngine.TRACE_LOG_FILE + ".1")
+
+def test_disabled_tracing_records_nothing(lc_db, monkeypatch):
+    monkeypatch.setattr(FPYEngine, "_trace_logger", None)
+    FPYEngine.set_tracing(False)
+    with FPYEngine.traced_run('project', project="P1") as trace:
+        with FPYEngine.span('query') as record:
+            FPYEngine.analyze_project("P1", START_DATE, END_DATE)
+    assert trace is None and record is None
+    assert FPYEngine.current_trace() is None
+    assert not os.path.exists(FPYEngine.TRACE_LOG_FILE)
+
+def test_cli_trace_prints_breakdown(tracing, capsys):
+    assert FPYEngine.main(["--project", "P1", "--from", START_DATE, "--to", END_DATE, "--trace"]) == 0
+    captured = capsys.readouterr()
+    assert "fetch" in captured.err
+    assert "fetch" not in captured.out